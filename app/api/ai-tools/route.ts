@@ -1,9 +1,16 @@
 import { NextRequest, NextResponse } from 'next/server'
+import { randomUUID } from 'crypto'
+import { promisify } from 'util'
+import { gzip } from 'zlib'
 
 // Force dynamic rendering
 export const dynamic = 'force-dynamic'
 
 const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://127.0.0.1:5004/api'
+// Request bodies at least this large are gzipped before being sent to Flask
+const AI_COMPRESS_MIN_BYTES = parseInt(process.env.AI_COMPRESS_MIN_BYTES || '16384', 10)
+
+const gzipAsync = promisify(gzip)
 
 export async function POST(request: NextRequest) {
   try {
@@ -19,15 +26,38 @@ export async function POST(request: NextRequest) {
 
     console.log('🤖 AI Tool Request:', { action, data })
 
-    // Call the Flask AI service
+    // Call the Flask AI service. Large study group notes compress 5-10x, so
+    // they are sent gzipped; the reply is compressed too when it is large.
+    const payload = Buffer.from(JSON.stringify({ action, ...data }))
+    // The request ID tags every trace span Flask records for this request
+    const requestId = request.headers.get('x-request-id') || randomUUID()
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/json',
+      'Accept-Encoding': 'gzip',
+      'X-Request-ID': requestId,
+    }
+    let requestBody: Buffer = payload
+    if (payload.length >= AI_COMPRESS_MIN_BYTES) {
+      requestBody = await gzipAsync(payload)
+      headers['Content-Encoding'] = 'gzip'
+      console.log(`🗜️ Compressed AI request ${payload.length} → ${requestBody.length} bytes`)
+    }
+
     const response = await fetch(AI_SERVICE_URL, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({ action, ...data }),
+      headers,
+      body: requestBody,
     })
 
+    // Streamed question/flashcard batches are passed through as they arrive;
+    // the stream ends with a {"type": "error"} line if generation fails
+    if (response.headers.get('content-type')?.includes('application/x-ndjson')) {
+      return new Response(response.body, {
+        status: response.status,
+        headers: { 'Content-Type': 'application/x-ndjson', 'X-Request-ID': requestId },
+      })
+    }
+
     if (!response.ok) {
       const errorData = await response.json()
       console.error('❌ AI Service Error:', errorData)
@@ -1,5 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { exec } from 'child_process'
+import { randomUUID } from 'crypto'
 import { promisify } from 'util'
 import path from 'path'
 import fs from 'fs'
@@ -73,7 +74,11 @@ export async function POST(request: NextRequest) {
       const command = `python3 "${pythonScript}" "${expandedPath}" ${maxPages} ${maxChars}`
 
       try {
-        const { stdout, stderr } = await execAsync(command)
+        // The extractor tags its trace spans with this request's ID
+        const requestId = request.headers.get('x-request-id') || randomUUID()
+        const { stdout, stderr } = await execAsync(command, {
+          env: { ...process.env, TRACE_REQUEST_ID: requestId },
+        })
         
         if (stderr) {
           console.warn('PDF extraction warnings:', stderr)
@@ -4,6 +4,8 @@ import { make_file } from '../../../make_file'
 // Force dynamic rendering
 export const dynamic = 'force-dynamic'
 
+const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://127.0.0.1:5004/api'
+
 export async function POST(request: NextRequest) {
   try {
     const body = await request.json()
@@ -29,6 +31,14 @@ export async function POST(request: NextRequest) {
     
     // Call the make_file function
     const result = make_file(body)
+
+    // Precompute the summary, keywords and starter questions in the background.
+    // Registration doesn't wait for it, and a stopped AI service is not an error here.
+    fetch(`${AI_SERVICE_URL}/ingest`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ filePath: body['File path'] }),
+    }).catch((error) => console.warn('⚠️ Could not queue document ingest:', error.message))
     
     return NextResponse.json({ 
       success: true, 
@@ -20,6 +20,10 @@ import { createStudyGroup, getUserStudyGroups, devStudyGroups, StudyGroup, leave
 type MeetingWithGroupName = Meeting & { groupName: string }
 import { hasRealAWSConfig, checkDynamoDBConfigFromBrowser, isElectron } from '@/lib/aws-config'
 import { getUserProfile, UserProfile } from '@/lib/aws-user-profiles'
+import { mapWithConcurrency } from '@/lib/concurrency'
+
+// Documents extracted at once when compiling notes for an AI tool
+const DOCUMENT_LOAD_CONCURRENCY = 4
 
 type AuthView = 'login' | 'signup' | 'confirm' | 'forgot'
 
@@ -738,6 +742,49 @@ export default function Home() {
     return filteredDocs
   }
 
+  // Reads an NDJSON reply from /api/ai-tools, showing each batch of questions or
+  // flashcards as it arrives; resolves to the same shape as a JSON reply
+  const readItemStream = async (body: ReadableStream<Uint8Array>, flashcards: boolean) => {
+    const reader = body.getReader()
+    const decoder = new TextDecoder()
+    const lines: string[] = []
+    let buffered = ''
+    let result: any = null
+
+    const handleLine = (line: string) => {
+      if (!line.trim()) return
+      const event = JSON.parse(line)
+      if (event.type === 'error') {
+        result = { success: false, error: event.error }
+      } else if (event.done) {
+        result = { success: true, ...event }
+      } else {
+        for (const item of event.items) {
+          lines.push(flashcards ? `${item.question}\n${item.answer}` : item)
+        }
+        console.log(`📥 Received ${event.received}/${event.requested} items`)
+        setAiResult(lines.join('\n'))
+        if (flashcards) {
+          setShowFlashcardDeck(true)
+        } else {
+          setShowAIResultModal(true)
+        }
+      }
+    }
+
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffered += decoder.decode(value, { stream: true })
+      const complete = buffered.split('\n')
+      buffered = complete.pop() || ''
+      complete.forEach(handleLine)
+    }
+    handleLine(buffered + decoder.decode())
+
+    return result || { success: false, error: 'The AI service stream ended early' }
+  }
+
   const generateAIContent = async () => {
     if (selectedStudyGroups.length === 0) {
       alert('Please select at least one study group')
@@ -770,14 +817,12 @@ export default function Home() {
         return
       }
 
-      // Compile all content from selected documents into one comprehensive string
-      let notesContent = ''
-      let pdfCount = 0
-      let textCount = 0
-      
+      // Compile all content from selected documents into one comprehensive string.
+      // Documents are loaded concurrently (a few extractions at a time) and the
+      // sections joined once, in selection order.
       console.log('📚 Compiling content from all selected documents...')
-      
-      for (const doc of selectedDocuments) {
+
+      const loadDocument = async (doc: any): Promise<{ section: string, kind: 'pdf' | 'text' }> => {
         const fileName = doc.fileName || doc.originalFileName || 'Unknown file'
         const description = doc.description || 'No description available'
         const studyGroupName = doc.studyGroupName || 'Unknown group'
@@ -814,20 +859,16 @@ export default function Home() {
             const result = await response.json()
             
             if (result.success && result.text) {
-              notesContent += `=== ${fileName} (PDF from ${studyGroupName} - ${className}) ===\n${result.text}\n\n`
-              pdfCount++
               console.log('✅ PDF content extracted successfully, length:', result.text.length)
-            } else {
-              // Fallback to description if PDF extraction fails
-              notesContent += `=== ${fileName} (PDF - extraction failed, using description) ===\n${description}\n\n`
-              textCount++
-              console.log('⚠️ PDF extraction failed, using description')
+              return { section: `=== ${fileName} (PDF from ${studyGroupName} - ${className}) ===\n${result.text}\n\n`, kind: 'pdf' }
             }
+            // Fallback to description if PDF extraction fails
+            console.log('⚠️ PDF extraction failed, using description')
+            return { section: `=== ${fileName} (PDF - extraction failed, using description) ===\n${description}\n\n`, kind: 'text' }
           } catch (error) {
             console.error('❌ PDF extraction error:', error)
             // Fallback to description
-            notesContent += `=== ${fileName} (PDF - error, using description) ===\n${description}\n\n`
-            textCount++
+            return { section: `=== ${fileName} (PDF - error, using description) ===\n${description}\n\n`, kind: 'text' }
           }
         } else if (isTextFile && doc.filePath) {
           try {
@@ -848,27 +889,26 @@ export default function Home() {
             const result = await response.json()
             
             if (result.success && result.text) {
-              notesContent += `=== ${fileName} (Text file from ${studyGroupName} - ${className}) ===\n${result.text}\n\n`
-              textCount++
               console.log('✅ Text file content read successfully, length:', result.text.length)
-            } else {
-              // Fallback to description if text file reading fails
-              notesContent += `=== ${fileName} (Text file - reading failed, using description) ===\n${description}\n\n`
-              textCount++
-              console.log('⚠️ Text file reading failed, using description')
+              return { section: `=== ${fileName} (Text file from ${studyGroupName} - ${className}) ===\n${result.text}\n\n`, kind: 'text' }
             }
+            // Fallback to description if text file reading fails
+            console.log('⚠️ Text file reading failed, using description')
+            return { section: `=== ${fileName} (Text file - reading failed, using description) ===\n${description}\n\n`, kind: 'text' }
           } catch (error) {
             console.error('❌ Text file reading error:', error)
             // Fallback to description
-            notesContent += `=== ${fileName} (Text file - error, using description) ===\n${description}\n\n`
-            textCount++
+            return { section: `=== ${fileName} (Text file - error, using description) ===\n${description}\n\n`, kind: 'text' }
           }
-        } else {
-          // For other files, use description
-          notesContent += `=== ${fileName} (Other file from ${studyGroupName} - ${className}) ===\n${description}\n\n`
-          textCount++
         }
+        // For other files, use description
+        return { section: `=== ${fileName} (Other file from ${studyGroupName} - ${className}) ===\n${description}\n\n`, kind: 'text' }
       }
+
+      const loaded = await mapWithConcurrency(selectedDocuments, DOCUMENT_LOAD_CONCURRENCY, loadDocument)
+      const notesContent = loaded.map(item => item.section).join('')
+      const pdfCount = loaded.filter(item => item.kind === 'pdf').length
+      const textCount = loaded.length - pdfCount
       
       console.log('📊 Content compilation complete:', {
         totalDocuments: selectedDocuments.length,
@@ -900,7 +940,12 @@ export default function Home() {
       const requestData: any = {
         action,
         notesContent,
-        query: enhancedQuery
+        query: enhancedQuery,
+        // Without a custom topic, documents ingested ahead of time are answered instantly
+        filePaths: selectedDocuments.map(doc => doc.filePath).filter(Boolean),
+        usePrecomputed: !aiQuery,
+        // Questions and flashcards arrive in batches, shown as soon as each one lands
+        stream: selectedAITool === 'flashcards' || selectedAITool === 'practice-questions'
       }
 
       // Add tool-specific parameters
@@ -937,10 +982,15 @@ export default function Home() {
         throw new Error(`API request failed: ${response.status} ${response.statusText}`)
       }
       
-      const responseText = await response.text()
-      console.log('📡 API Response text (first 500 chars):', responseText.substring(0, 500))
-      
-      const result = JSON.parse(responseText)
+      let result: any
+      if (response.headers.get('content-type')?.includes('application/x-ndjson') && response.body) {
+        result = await readItemStream(response.body, selectedAITool === 'flashcards')
+      } else {
+        const responseText = await response.text()
+        console.log('📡 API Response text (first 500 chars):', responseText.substring(0, 500))
+
+        result = JSON.parse(responseText)
+      }
       console.log('📡 API Response result:', result)
 
       console.log('🤖 AI Service Response:', result)
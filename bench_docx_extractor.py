@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark streaming DOCX extraction against the python-docx path used by
+generateContent.getContents (doc.paragraphs joined with newlines).
+
+Runs every measurement in a fresh process so peak RSS is comparable, on
+AI/results/EnglishFinalEssay.docx and on synthetic documents built by
+repeating its body N times.
+
+Usage:
+    python3 bench_docx_extractor.py                # scales 1, 10, 100
+    python3 bench_docx_extractor.py --scales 1 500
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+SOURCE_DOCX = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AI", "results", "EnglishFinalEssay.docx")
+
+
+def build_synthetic_docx(source: str, target: str, scale: int):
+    """Write a copy of source whose body is repeated `scale` times, streaming the XML out."""
+    with zipfile.ZipFile(source) as src:
+        document = src.read("word/document.xml").decode("utf-8")
+        body_start = document.index("<w:body>") + len("<w:body>")
+        body_end = document.rindex("<w:sectPr")
+        head, body, tail = document[:body_start], document[body_start:body_end], document[body_end:]
+
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as dst:
+            for item in src.infolist():
+                if item.filename != "word/document.xml":
+                    dst.writestr(item, src.read(item.filename))
+            with dst.open("word/document.xml", "w") as out:
+                out.write(head.encode("utf-8"))
+                encoded_body = body.encode("utf-8")
+                for _ in range(scale):
+                    out.write(encoded_body)
+                out.write(tail.encode("utf-8"))
+
+
+def _python_docx(file_path: str) -> str:
+    import docx
+    doc = docx.Document(file_path)
+    return "\n".join(para.text for para in doc.paragraphs)
+
+
+def _streaming(file_path: str) -> str:
+    from docx_extractor import extract_text_from_docx
+    return extract_text_from_docx(file_path)
+
+
+BACKENDS = {"python-docx": _python_docx, "streaming": _streaming}
+
+
+def _measure(backend: str, file_path: str):
+    """Runs in a fresh worker process: (seconds, peak RSS in MB, output chars)."""
+    started = time.perf_counter()
+    text = BACKENDS[backend](file_path)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return elapsed, peak_mb, len(text or "")
+
+
+def measure(backend: str, file_path: str):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_measure, backend, file_path).result()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--source", default=SOURCE_DOCX)
+    args = parser.parse_args(argv)
+
+    print(f"{'document':<28}{'size MB':>9}  {'backend':<12}{'seconds':>9}{'peak RSS MB':>13}{'chars':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in args.scales:
+            if scale == 1:
+                file_path = args.source
+            else:
+                file_path = os.path.join(tmp_dir, f"synthetic_x{scale}.docx")
+                build_synthetic_docx(args.source, file_path, scale)
+            size_mb = os.path.getsize(file_path) / (1024 * 1024)
+            label = os.path.basename(file_path)
+            for backend in BACKENDS:
+                elapsed, peak_mb, chars = measure(backend, file_path)
+                print(f"{label:<28}{size_mb:>9.1f}  {backend:<12}{elapsed:>9.3f}{peak_mb:>13.1f}{chars:>12}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
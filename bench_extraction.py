@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Regression-gated benchmark of document extraction.
+
+Measures every extraction backend on a fixed corpus (the AI/results PDFs and
+DOCX plus synthetic large documents built from them) and reports, for each
+document and backend: the time (best of --repeat runs), time per page or per
+MB of input, peak RSS, and output size. Each measurement runs in a fresh
+process so peak RSS is comparable.
+
+Backends:
+    pdf   pipeline     pdf_extractor.extract_text_from_pdf, all pages, cold page cache
+                       (pdfplumber, PyPDF2 fallback, OCR of image-only pages)
+          pypdf2       the PyPDF2 fallback on its own
+          pymupdf      the PyMuPDF path of generateContent.getContents (if installed)
+    docx  streaming    docx_extractor.extract_text_from_docx
+          python-docx  the python-docx path of generateContent.getContents
+    txt   bulk         bulk_extractor.extract_file_text
+
+Results are compared with the baselines in --baseline (written by
+--save-baseline on the same machine). The run fails (exit 1) when a
+measurement regresses beyond its threshold: time or peak RSS growing by more
+than --time-threshold / --memory-threshold, or output shrinking by more than
+OUTPUT_THRESHOLD (text lost).
+
+Usage:
+    python3 bench_extraction.py --save-baseline      # on the commit to compare against
+    python3 bench_extraction.py                      # fails on regressions
+    python3 bench_extraction.py --only docx txt --json results.json
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AI", "results")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_extraction_baseline.json")
+
+# Allowed growth before a measurement counts as a regression. Small absolute
+# slack keeps sub-100 ms timings and allocator noise from failing the run.
+TIME_THRESHOLD = 0.20
+TIME_SLACK_SECONDS = 0.05
+MEMORY_THRESHOLD = 0.15
+MEMORY_SLACK_MB = 10.0
+OUTPUT_THRESHOLD = 0.01
+
+# Synthetic documents: the first SYNTHETIC_PDF_PAGES pages of the PDF repeated
+# to SYNTHETIC_PDF_SCALE times that many pages, the DOCX body repeated
+# SYNTHETIC_DOCX_SCALE times, and the notes repeated to SYNTHETIC_TEXT_MB
+SYNTHETIC_PDF_PAGES = 20
+SYNTHETIC_PDF_SCALE = 10
+SYNTHETIC_DOCX_SCALE = 20
+SYNTHETIC_TEXT_MB = 16
+
+
+# --- Backends (imported in the worker process, so RSS covers the import) ---
+
+def _pipeline(file_path: str) -> str:
+    import incremental_extractor
+    import ocr_extractor
+    from pdf_extractor import extract_text_from_pdf
+    # Cold page and OCR caches, so every run measures a full extraction (and
+    # nothing is written to the user's own caches)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        incremental_extractor.PAGE_CACHE_DIR = os.path.join(cache_dir, "pages")
+        ocr_extractor.OCR_CACHE_DIR = os.path.join(cache_dir, "ocr")
+        return extract_text_from_pdf(file_path, max_pages=None) or ""
+
+
+def _pypdf2(file_path: str) -> str:
+    import PyPDF2
+    with open(file_path, "rb") as f:
+        return "\n".join(page.extract_text() or "" for page in PyPDF2.PdfReader(f).pages)
+
+
+def _pymupdf(file_path: str) -> str:
+    import fitz
+    with fitz.open(file_path) as doc:
+        return "\n".join(page.get_text() for page in doc)
+
+
+def _streaming_docx(file_path: str) -> str:
+    from docx_extractor import extract_text_from_docx
+    return extract_text_from_docx(file_path)
+
+
+def _python_docx(file_path: str) -> str:
+    import docx
+    return "\n".join(para.text for para in docx.Document(file_path).paragraphs)
+
+
+def _bulk_text(file_path: str) -> str:
+    from bulk_extractor import extract_file_text
+    return extract_file_text(file_path)[0]
+
+
+def _installed(module: str) -> bool:
+    import importlib.util
+    return importlib.util.find_spec(module) is not None
+
+
+BACKENDS = {
+    ".pdf": {"pipeline": _pipeline, "pypdf2": _pypdf2, "pymupdf": _pymupdf},
+    ".docx": {"streaming": _streaming_docx, "python-docx": _python_docx},
+    ".txt": {"bulk": _bulk_text},
+}
+OPTIONAL_BACKENDS = {"pymupdf": "fitz"}
+
+
+# --- Corpus ---
+
+def build_synthetic_pdf(source: str, target: str, pages: int, scale: int):
+    """Write a PDF of the first `pages` pages of source, repeated `scale` times."""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(source)
+    writer = PyPDF2.PdfWriter()
+    for _ in range(scale):
+        for page in reader.pages[:pages]:
+            writer.add_page(page)
+    with open(target, "wb") as f:
+        writer.write(f)
+
+
+def build_synthetic_text(source: str, target: str, size_mb: float):
+    with open(source, "r", encoding="utf-8") as f:
+        text = f.read()
+    size = int(size_mb * 1024 * 1024)
+    with open(target, "w", encoding="utf-8") as f:
+        f.write((text * (size // len(text) + 1))[:size])
+
+
+def build_corpus(work_dir: str) -> Dict[str, str]:
+    """Document name -> path: the AI/results documents plus the synthetic ones."""
+    from bench_docx_extractor import build_synthetic_docx
+
+    source_pdf = os.path.join(RESULTS_DIR, "YouDreamedOfEmpires.pdf")
+    source_docx = os.path.join(RESULTS_DIR, "EnglishFinalEssay.docx")
+    corpus = {name: os.path.join(RESULTS_DIR, name)
+              for name in sorted(os.listdir(RESULTS_DIR)) if name.lower().endswith((".pdf", ".docx"))}
+
+    synthetic = {
+        f"synthetic_{SYNTHETIC_PDF_PAGES * SYNTHETIC_PDF_SCALE}_pages.pdf":
+            lambda path: build_synthetic_pdf(source_pdf, path, SYNTHETIC_PDF_PAGES, SYNTHETIC_PDF_SCALE),
+        f"synthetic_x{SYNTHETIC_DOCX_SCALE}.docx":
+            lambda path: build_synthetic_docx(source_docx, path, SYNTHETIC_DOCX_SCALE),
+        f"synthetic_{SYNTHETIC_TEXT_MB}mb.txt":
+            lambda path: build_synthetic_text(os.path.join(RESULTS_DIR, "englishNotes.txt"), path, SYNTHETIC_TEXT_MB),
+    }
+    for name, build in synthetic.items():
+        path = os.path.join(work_dir, name)
+        build(path)
+        corpus[name] = path
+    return corpus
+
+
+def count_pages(file_path: str) -> Optional[int]:
+    if not file_path.lower().endswith(".pdf"):
+        return None
+    import PyPDF2
+    return len(PyPDF2.PdfReader(file_path).pages)
+
+
+# --- Measurement ---
+
+def _measure(extension: str, backend: str, file_path: str, repeat: int):
+    """Runs in a fresh worker process: (best seconds, peak RSS in MB, output chars)."""
+    best, chars = None, 0
+    # The extractors report progress on stdout
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            text = BACKENDS[extension][backend](file_path)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+            chars = len(text or "")
+    return best, peak_rss_mb(), chars
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process. On Linux ru_maxrss survives exec (it would
+    report the parent's peak in a spawned worker), so VmHWM is read instead."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(extension: str, backend: str, file_path: str, repeat: int = 1) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        seconds, peak_mb, chars = pool.submit(_measure, extension, backend, file_path, repeat).result()
+
+    pages = count_pages(file_path)
+    size_mb = os.path.getsize(file_path) / (1024 * 1024)
+    return {
+        "seconds": round(seconds, 4),
+        "ms_per_page": round(seconds * 1000 / pages, 3) if pages else None,
+        "ms_per_mb": round(seconds * 1000 / size_mb, 3),
+        "peak_rss_mb": round(peak_mb, 1),
+        "output_chars": chars,
+    }
+
+
+def run(corpus: Dict[str, str], only: Optional[List[str]] = None, repeat: int = 1) -> Dict[str, Dict]:
+    """Measure every backend on every document. Keys are "<document> <backend>"."""
+    results = {}
+    for name, file_path in corpus.items():
+        extension = os.path.splitext(name)[1].lower()
+        if only and extension.lstrip(".") not in only:
+            continue
+        for backend in BACKENDS.get(extension, {}):
+            module = OPTIONAL_BACKENDS.get(backend)
+            if module and not _installed(module):
+                continue
+            results[f"{name} {backend}"] = measure(extension, backend, file_path, repeat)
+    return results
+
+
+# --- Regression gate ---
+
+def compare(results: Dict[str, Dict], baselines: Dict[str, Dict], time_threshold: float = TIME_THRESHOLD,
+            memory_threshold: float = MEMORY_THRESHOLD) -> List[str]:
+    """A description of every regression against the baselines (empty if none)."""
+    regressions = []
+    for key, current in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        if current["seconds"] > baseline["seconds"] * (1 + time_threshold) + TIME_SLACK_SECONDS:
+            regressions.append(f"{key}: {current['seconds']:.3f}s vs {baseline['seconds']:.3f}s baseline "
+                               f"(+{current['seconds'] / baseline['seconds'] - 1:.0%})")
+        if current["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + memory_threshold) + MEMORY_SLACK_MB:
+            regressions.append(f"{key}: peak RSS {current['peak_rss_mb']:.1f} MB vs "
+                               f"{baseline['peak_rss_mb']:.1f} MB baseline")
+        if current["output_chars"] < baseline["output_chars"] * (1 - OUTPUT_THRESHOLD):
+            regressions.append(f"{key}: output {current['output_chars']} chars vs "
+                               f"{baseline['output_chars']} baseline")
+    return regressions
+
+
+def load_baselines(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(path: str, results: Dict[str, Dict]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _change(current: float, baseline: Optional[Dict], field: str) -> str:
+    if not baseline or not baseline.get(field):
+        return ""
+    return f"{current / baseline[field] - 1:+.0%}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="record this run as the baseline")
+    parser.add_argument("--only", nargs="+", choices=["pdf", "docx", "txt"], help="only these document types")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per measurement (the best is kept)")
+    parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=MEMORY_THRESHOLD)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines(args.baseline)
+    with tempfile.TemporaryDirectory() as work_dir:
+        corpus = build_corpus(work_dir)
+        print(f"{'document':<32}{'backend':<13}{'seconds':>9}{'ms/page':>9}{'ms/MB':>9}"
+              f"{'peak MB':>9}{'chars':>10}{'time':>7}{'RSS':>7}")
+        results = {}
+        for key, result in run(corpus, args.only, args.repeat).items():
+            results[key] = result
+            name, backend = key.rsplit(" ", 1)
+            baseline = baselines.get(key)
+            per_page = f"{result['ms_per_page']:.1f}" if result["ms_per_page"] is not None else "-"
+            print(f"{name:<32}{backend:<13}{result['seconds']:>9.3f}{per_page:>9}"
+                  f"{result['ms_per_mb']:>9.1f}{result['peak_rss_mb']:>9.1f}{result['output_chars']:>10}"
+                  f"{_change(result['seconds'], baseline, 'seconds'):>7}"
+                  f"{_change(result['peak_rss_mb'], baseline, 'peak_rss_mb'):>7}")
+
+    if args.json:
+        save_baselines(args.json, results)
+    if args.save_baseline:
+        save_baselines(args.baseline, {**baselines, **results})
+        print(f"📏 Baseline saved to {args.baseline}")
+        return 0
+    if not baselines:
+        print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+        return 0
+
+    regressions = compare(results, baselines, args.time_threshold, args.memory_threshold)
+    for regression in regressions:
+        print(f"❌ {regression}")
+    if regressions:
+        return 1
+    print("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
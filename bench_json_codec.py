@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the JSON paths of a notes request: parsing the /api request body,
+building the Bedrock request body for the calls made on the same notes, and
+encoding the reply.
+
+Compares the standard library path app.py used before (json.loads,
+json.dumps(body).encode per call) with json_codec (orjson when installed,
+with encoded notes reused across calls). Notes are built by repeating
+AI/results/englishNotes.txt up to each size.
+
+Usage:
+    python3 bench_json_codec.py                 # 1, 4 and 16 MB of notes
+    python3 bench_json_codec.py --sizes 1 64 --calls 3 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import json_codec
+from app import SYSTEM_PROMPT
+
+SOURCE_NOTES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AI", "results", "englishNotes.txt")
+
+
+def build_notes(source: str, size_mb: float) -> str:
+    with open(source, "r", encoding="utf-8") as f:
+        text = f.read()
+    target = int(size_mb * 1024 * 1024)
+    return (text * (target // len(text) + 1))[:target]
+
+
+def stdlib_request(raw_request: bytes, calls: int) -> int:
+    body = json.loads(raw_request)
+    notes = body["notesContent"]
+    total = 0
+    for _ in range(calls):
+        messages = [
+            {"role": "user", "content": notes},
+            {"role": "assistant", "content": "Okay, I have received the notes. What should I do with them?"},
+            {"role": "user", "content": "Summarize them."},
+        ]
+        payload = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "system": SYSTEM_PROMPT,
+            "messages": messages,
+            "max_tokens": 2048,
+            "temperature": 0.2,
+        }
+        total += len(json.dumps(payload).encode("utf-8"))
+    return total + len(json.dumps({"reply": notes[: len(notes) // 3]}).encode("utf-8"))
+
+
+def codec_request(raw_request: bytes, calls: int) -> int:
+    json_codec._encode_short_string.cache_clear()
+    body = json_codec.loads(raw_request)
+    notes = body["notesContent"]
+    total = 0
+    for _ in range(calls):
+        messages = [
+            {"role": "user", "content": notes},
+            {"role": "assistant", "content": "Okay, I have received the notes. What should I do with them?"},
+            {"role": "user", "content": "Summarize them."},
+        ]
+        total += len(json_codec.bedrock_request_body(SYSTEM_PROMPT, messages, 2048, temperature=0.2))
+    return total + len(json_codec.dumps({"reply": notes[: len(notes) // 3]}))
+
+
+BACKENDS = {"stdlib": stdlib_request, json_codec.CODEC_NAME + "+reuse": codec_request}
+
+
+def measure(function, raw_request: bytes, calls: int, repeat: int) -> float:
+    """Best-of-repeat wall time in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(raw_request, calls)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="notes size in MB")
+    parser.add_argument("--calls", type=int, default=3, help="Bedrock calls per request on the same notes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--source", default=SOURCE_NOTES)
+    args = parser.parse_args(argv)
+
+    print(f"{'notes MB':>9}  {'backend':<16}{'ms':>10}{'speedup':>9}")
+    for size_mb in args.sizes:
+        notes = build_notes(args.source, size_mb)
+        raw_request = json.dumps({"action": "getSummary", "notesContent": notes, "query": "themes"}).encode("utf-8")
+        baseline = None
+        for backend, function in BACKENDS.items():
+            elapsed = measure(function, raw_request, args.calls, args.repeat)
+            baseline = baseline or elapsed
+            print(f"{size_mb:>9.1f}  {backend:<16}{elapsed * 1000:>10.1f}{baseline / elapsed:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+Bulk document extraction.
+
+Walks directories, globs and individual files, extracts .pdf, .docx and .txt
+documents in a bounded pool of worker processes, and streams one JSONL record
+per document. When writing to a file, an interrupted run can be resumed: files
+whose path, size and mtime already appear in the output are skipped.
+
+Usage:
+    python3 bulk_extractor.py ~/Documents "notes/**/*.pdf" -o index.jsonl -j 4
+    python3 pdf_extractor.py --bulk ~/Documents -o index.jsonl
+"""
+
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import tracing
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def discover_files(inputs: Iterable[str], include_hidden: bool = False) -> Iterator[str]:
+    """
+    Expand directories, glob patterns and file paths into supported documents.
+
+    Directories are walked recursively; hidden files and directories (such as
+    ~/Documents/.ai_helper) are skipped unless include_hidden is set. Each
+    document is yielded once, as an absolute path, in sorted order per input.
+    """
+    seen = set()
+
+    def _candidates(item: str) -> List[str]:
+        expanded = os.path.expanduser(item)
+        if os.path.isdir(expanded):
+            found = []
+            for root, dirs, files in os.walk(expanded):
+                if not include_hidden:
+                    dirs[:] = [d for d in dirs if not d.startswith('.')]
+                    files = [f for f in files if not f.startswith('.')]
+                found.extend(os.path.join(root, f) for f in files)
+            return sorted(found)
+        if os.path.isfile(expanded):
+            return [expanded]
+        return sorted(glob.glob(expanded, recursive=True))
+
+    for item in inputs:
+        for path in _candidates(item):
+            path = os.path.abspath(path)
+            if path in seen or not os.path.isfile(path):
+                continue
+            if not path.lower().endswith(SUPPORTED_EXTENSIONS):
+                continue
+            seen.add(path)
+            yield path
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash a file in fixed-size blocks so large files never sit in memory."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_file_text(file_path: str) -> Tuple[str, Optional[int]]:
+    """Extract the full text of one document. Returns (text, page_count)."""
+    extension = os.path.splitext(file_path)[1].lower()
+    with tracing.span("extract_file", type=extension.lstrip('.'), bytes=os.path.getsize(file_path)) as extract_span:
+        text, page_count = _extract_file_text(file_path, extension)
+        extract_span.set(chars=len(text), pages=page_count)
+    return text, page_count
+
+
+def _extract_file_text(file_path: str, extension: str) -> Tuple[str, Optional[int]]:
+    if extension == '.txt':
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read(), None
+
+    if extension == '.docx':
+        from docx_extractor import iter_docx_blocks, TABLE_ROW
+        lines = [
+            '\t'.join(content) if block_type == TABLE_ROW else content
+            for block_type, content in iter_docx_blocks(file_path)
+        ]
+        return '\n'.join(lines), None
+
+    if extension == '.pdf':
+        from incremental_extractor import extract_pdf_incremental
+        extraction = extract_pdf_incremental(file_path)
+        if not any(extraction["pages"]):
+            raise ValueError("No text could be extracted from the PDF")
+        return extraction["text"], len(extraction["pages"])
+
+    raise ValueError(f"Unsupported file type: {extension}")
+
+
+def extract_document(file_path: str, max_chars: Optional[int] = None) -> Dict:
+    """
+    Build the JSONL record for a single document.
+
+    Never raises: failures are reported in the record's "error" field so one
+    corrupt file cannot stop a bulk run.
+    """
+    started = time.perf_counter()
+    record = {
+        "path": file_path,
+        "type": os.path.splitext(file_path)[1].lower().lstrip('.'),
+        "size": None,
+        "mtime": None,
+        "sha256": None,
+        "pages": None,
+        "chars": 0,
+        "text": "",
+        "truncated": False,
+        "timings": {},
+        "error": None,
+    }
+
+    try:
+        stat = os.stat(file_path)
+        record["size"] = stat.st_size
+        record["mtime"] = stat.st_mtime
+
+        hash_started = time.perf_counter()
+        record["sha256"] = file_sha256(file_path)
+        record["timings"]["hash_ms"] = round((time.perf_counter() - hash_started) * 1000, 2)
+
+        extract_started = time.perf_counter()
+        # Backend progress messages go to stderr so stdout stays valid JSONL
+        with contextlib.redirect_stdout(sys.stderr):
+            text, pages = extract_file_text(file_path)
+        record["timings"]["extract_ms"] = round((time.perf_counter() - extract_started) * 1000, 2)
+
+        record["pages"] = pages
+        record["chars"] = len(text)
+        if max_chars is not None and len(text) > max_chars:
+            text = text[:max_chars]
+            record["truncated"] = True
+        record["text"] = text
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+
+    record["timings"]["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return record
+
+
+def load_completed(output_path: str) -> Dict[str, Tuple[int, float]]:
+    """
+    Read an existing JSONL output and return {path: (size, mtime)} for every
+    document that was extracted without error.
+
+    A partially written last line (from an interrupted run) is ignored. When a
+    path appears more than once, the latest record wins.
+    """
+    completed = {}
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            path = record.get("path")
+            if not path:
+                continue
+            if record.get("error") is None:
+                completed[path] = (record.get("size"), record.get("mtime"))
+            else:
+                completed.pop(path, None)
+    return completed
+
+
+def _is_unchanged(file_path: str, completed: Dict[str, Tuple[int, float]]) -> bool:
+    if file_path not in completed:
+        return False
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return False
+    return completed[file_path] == (stat.st_size, stat.st_mtime)
+
+
+def _ends_with_newline(file_path: str) -> bool:
+    with open(file_path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def run_bulk(
+    inputs: Iterable[str],
+    out,
+    workers: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    completed: Optional[Dict[str, Tuple[int, float]]] = None,
+    include_hidden: bool = False,
+) -> Dict[str, int]:
+    """
+    Extract every discovered document and write one JSON line per document to out.
+
+    At most 2 * workers documents are in flight at any time, and each record is
+    written and flushed as soon as it completes, so memory stays bounded no
+    matter how many files are discovered. Returns counts for the run.
+    """
+    workers = workers or os.cpu_count() or 1
+    completed = completed or {}
+    stats = {"extracted": 0, "failed": 0, "skipped": 0}
+    max_in_flight = workers * 2
+
+    def _write(record: Dict):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        stats["failed" if record["error"] else "extracted"] += 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for path in discover_files(inputs, include_hidden=include_hidden):
+            if _is_unchanged(path, completed):
+                stats["skipped"] += 1
+                continue
+
+            pending.add(pool.submit(extract_document, path, max_chars))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _write(future.result())
+
+        for future in wait(pending).done:
+            _write(future.result())
+
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Extract .pdf, .docx and .txt documents in bulk to JSONL."
+    )
+    parser.add_argument("inputs", nargs="+", help="Directories, glob patterns or files")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout). Runs resume from it.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--max-chars", type=int, default=None, help="Truncate each document's text to this length")
+    parser.add_argument("--no-resume", action="store_true", help="Re-extract everything and overwrite the output")
+    parser.add_argument("--include-hidden", action="store_true", help="Also walk hidden files and directories")
+    args = parser.parse_args(argv)
+
+    if args.output:
+        completed = {} if args.no_resume else load_completed(args.output)
+        mode = 'w' if args.no_resume else 'a'
+        with open(args.output, mode, encoding='utf-8') as out:
+            if mode == 'a' and out.tell() > 0 and not _ends_with_newline(args.output):
+                # Terminate the partial record left by an interrupted run
+                out.write("\n")
+            stats = run_bulk(args.inputs, out, args.workers, args.max_chars, completed, args.include_hidden)
+    else:
+        stats = run_bulk(args.inputs, sys.stdout, args.workers, args.max_chars, include_hidden=args.include_hidden)
+
+    print(
+        f"✅ Bulk extraction finished: {stats['extracted']} extracted, "
+        f"{stats['failed']} failed, {stats['skipped']} skipped",
+        file=sys.stderr,
+    )
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
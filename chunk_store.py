@@ -0,0 +1,241 @@
+"""
+Content-addressed, reference-counted store for notes text.
+
+Members of a study group send the same documents in their own notesContent,
+so concurrent requests used to each hold a private copy of the same
+megabytes. Here notes are cut into content-defined chunks (boundaries depend
+only on nearby lines, so the same document yields the same chunks whatever
+else was selected with it), each chunk is stored once under its hash, and a
+request holds a StoredNotes: a list of chunk keys. Memory scales with unique
+content, not users x documents.
+
+Notes are chunked straight from the request's string; normalization, when
+asked for, is applied one document at a time on the way in, so a request never
+holds a second full copy. Each chunk also caches its JSON-encoded form and
+token estimate, so building Bedrock bodies and checking budgets for shared
+content is done once.
+"""
+
+import hashlib
+import threading
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional
+
+from json_codec import dumps
+from text_normalizer import DOCUMENT_HEADER
+from token_budget import estimate_tokens
+
+# Chunk sizes in characters. Past CHUNK_MIN_CHARS, a chunk ends after any line
+# whose CRC is divisible by CHUNK_BOUNDARY_MODULUS (~every 8 lines).
+CHUNK_MIN_CHARS = 1024
+CHUNK_MAX_CHARS = 16384
+CHUNK_BOUNDARY_MODULUS = 8
+
+
+def _lines(text: str) -> Iterator[str]:
+    """text.splitlines(keepends=True) for '\\n' line ends, without building the whole list."""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start) + 1 or len(text)
+        yield text[start:end]
+        start = end
+
+
+def _is_header(line: str) -> bool:
+    return bool(DOCUMENT_HEADER.match(line.strip()))
+
+
+def split_sections(text: str) -> Iterator[str]:
+    """Cut text before every '=== Title ===' header, into pieces that concatenate back to it."""
+    start = position = 0
+    for line in _lines(text):
+        if position > start and _is_header(line):
+            yield text[start:position]
+            start = position
+        position += len(line)
+    if position > start:
+        yield text[start:position]
+
+
+def split_chunks(text: str) -> Iterator[str]:
+    """
+    Cut text into content-defined chunks that concatenate back to the text.
+
+    A chunk always starts at a '=== Title ===' document header, and otherwise
+    ends after a line chosen by its content, or at CHUNK_MAX_CHARS.
+    """
+    current, size = [], 0
+    for line in _lines(text):
+        if current and _is_header(line):
+            yield "".join(current)
+            current, size = [], 0
+        while len(line) > CHUNK_MAX_CHARS:
+            # One enormous line (e.g. text extracted without newlines)
+            if current:
+                yield "".join(current)
+                current, size = [], 0
+            yield line[:CHUNK_MAX_CHARS]
+            line = line[CHUNK_MAX_CHARS:]
+        current.append(line)
+        size += len(line)
+        if size >= CHUNK_MAX_CHARS or (
+                size >= CHUNK_MIN_CHARS and zlib.crc32(line.encode("utf-8")) % CHUNK_BOUNDARY_MODULUS == 0):
+            yield "".join(current)
+            current, size = [], 0
+    if current:
+        yield "".join(current)
+
+
+class _Chunk:
+    __slots__ = ("text", "refs", "_encoded", "_tokens")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.refs = 0
+        self._encoded = None
+        self._tokens = None
+
+
+class ChunkStore:
+    """Thread-safe map of chunk hash -> chunk, freed when the last reference goes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chunks: Dict[str, _Chunk] = {}
+        self._logical_chars = 0
+
+    @staticmethod
+    def chunk_key(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def put(self, text: str) -> str:
+        """Store a chunk (or add a reference to the identical stored one). Returns its key."""
+        key = self.chunk_key(text)
+        with self._lock:
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                chunk = self._chunks[key] = _Chunk(text)
+            chunk.refs += 1
+            self._logical_chars += len(chunk.text)
+        return key
+
+    def release(self, key: str):
+        """Drop one reference; the chunk is freed when none are left."""
+        with self._lock:
+            chunk = self._chunks[key]
+            chunk.refs -= 1
+            self._logical_chars -= len(chunk.text)
+            if chunk.refs == 0:
+                del self._chunks[key]
+
+    def get(self, key: str) -> str:
+        return self._chunks[key].text
+
+    def encoded(self, key: str) -> bytes:
+        """The chunk as the inside of a JSON string literal (no surrounding quotes)."""
+        chunk = self._chunks[key]
+        if chunk._encoded is None:
+            chunk._encoded = dumps(chunk.text)[1:-1]
+        return chunk._encoded
+
+    def tokens(self, key: str) -> int:
+        chunk = self._chunks[key]
+        if chunk._tokens is None:
+            chunk._tokens = estimate_tokens(chunk.text)
+        return chunk._tokens
+
+    def stats(self) -> Dict:
+        """Unique vs referenced characters; the ratio is the memory saved by sharing."""
+        with self._lock:
+            unique = sum(len(chunk.text) for chunk in self._chunks.values())
+            return {
+                "chunks": len(self._chunks),
+                "references": sum(chunk.refs for chunk in self._chunks.values()),
+                "unique_chars": unique,
+                "referenced_chars": self._logical_chars,
+                "dedupe_ratio": round(self._logical_chars / unique, 2) if unique else 1.0,
+            }
+
+
+class StoredNotes:
+    """
+    Notes held as chunk references. Use as a context manager (or call
+    release()) so the chunks are freed when the request is done.
+
+    Wherever notes go into a Bedrock message, a StoredNotes can stand in for
+    the string: token_budget and json_codec read it chunk by chunk.
+    """
+
+    def __init__(self, store: ChunkStore, keys: List[str]):
+        self.store = store
+        self.keys = keys
+        self._released = False
+
+    @property
+    def estimated_tokens(self) -> int:
+        return sum(self.store.tokens(key) for key in self.keys)
+
+    def json_parts(self) -> List[bytes]:
+        """The notes as a JSON string literal, in pieces: the quotes and the shared per-chunk encodings."""
+        return [b'"', *(self.store.encoded(key) for key in self.keys), b'"']
+
+    def json_bytes(self) -> bytes:
+        return b"".join(self.json_parts())
+
+    def content_key(self) -> str:
+        """A hash of the notes, from the chunk keys (which already hash the content)."""
+        return hashlib.blake2b("".join(self.keys).encode("ascii"), digest_size=16).hexdigest()
+
+    def text(self) -> str:
+        """Materialize the full text (only for paths that genuinely need a string)."""
+        return "".join(self.store.get(key) for key in self.keys)
+
+    def document_texts(self) -> Iterator[str]:
+        """
+        The text one '=== Title ===' document at a time. A chunk never spans
+        two documents, so only one document is materialized at once.
+        """
+        run = []
+        for key in self.keys:
+            text = self.store.get(key)
+            if run and _is_header(text[:text.find("\n") + 1 or len(text)]):
+                yield "".join(run)
+                run = []
+            run.append(text)
+        if run:
+            yield "".join(run)
+
+    def __len__(self) -> int:
+        return sum(len(self.store.get(key)) for key in self.keys)
+
+    def __bool__(self) -> bool:
+        return bool(self.keys)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            for key in self.keys:
+                self.store.release(key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+store = ChunkStore()
+
+
+def store_notes(text: str, chunk_store: Optional[ChunkStore] = None,
+                prepare: Optional[Callable[[str], str]] = None) -> StoredNotes:
+    """
+    Chunk and store notes text, returning the references to it.
+
+    prepare, if given, rewrites each '=== Title ===' section before it is
+    chunked (e.g. normalization), so no rewritten copy of the whole text is made.
+    """
+    chunk_store = chunk_store or store
+    sections = (prepare(section) for section in split_sections(text)) if prepare else [text]
+    return StoredNotes(chunk_store, [chunk_store.put(chunk) for section in sections
+                                     for chunk in split_chunks(section) if chunk])
@@ -0,0 +1,128 @@
+"""
+Circuit breaker for Bedrock calls.
+
+While Bedrock is throttling or down, waiting out every call's timeout ties up
+workers and makes every /api request slow before it fails. The breaker counts
+consecutive failures of calls that went through it:
+
+- closed: calls go through. BREAKER_FAILURE_THRESHOLD failures in a row open it.
+- open: calls fail immediately with CircuitOpenError, so callers can fall back
+  to local answers. After BREAKER_RESET_SECONDS it becomes half-open.
+- half-open: up to BREAKER_HALF_OPEN_CALLS trial calls go through (the rest
+  still fail fast). A success closes the breaker, a failure opens it again.
+
+Errors that is_failure rejects (a bad request, not an unhealthy service) are
+left out of the accounting: they neither reset the failure count nor close a
+half-open breaker, whose trial slot is simply freed for the next call.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.environ.get("BREAKER_HALF_OPEN_CALLS", "1"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling while the breaker is open."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"The AI service is temporarily unavailable; retrying in {retry_after:.0f}s.")
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with half-open trial calls. Thread-safe."""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS,
+                 half_open_calls: int = BREAKER_HALF_OPEN_CALLS, is_failure: Optional[Callable[[Exception], bool]] = None):
+        """
+        Args:
+            is_failure: decides whether an exception means the service is
+                unhealthy (throttling, timeouts) rather than a bad request.
+                By default every exception counts.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure or (lambda exc: True)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._update()
+            return self._state
+
+    def _update(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state, self._trials = HALF_OPEN, 0
+
+    def _open(self):
+        self._state, self._opened_at = OPEN, time.monotonic()
+        print(f"🔌 Circuit opened after {self._failures} consecutive Bedrock failures")
+
+    def _before_call(self) -> bool:
+        """Admits a call or raises CircuitOpenError. Returns whether it is a half-open trial."""
+        with self._lock:
+            self._update()
+            if self._state == CLOSED:
+                return False
+            if self._state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return True
+            self._rejected += 1
+            retry_after = max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+            raise CircuitOpenError(retry_after)
+
+    def _after_call(self, trial: bool, failed: bool, counted: bool = True):
+        with self._lock:
+            if trial:
+                self._trials -= 1
+            if not counted:
+                return
+            if not failed:
+                if self._state != CLOSED:
+                    print("🔌 Circuit closed: Bedrock is answering again")
+                self._state, self._failures = CLOSED, 0
+                return
+            self._failures += 1
+            if (trial and self._state == HALF_OPEN) or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._open()
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """Run fn through the breaker."""
+        trial = self._before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            failed = self.is_failure(e)
+            self._after_call(trial, failed, counted=failed)
+            raise
+        self._after_call(trial, False)
+        return result
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a trial call through (0 unless open)."""
+        with self._lock:
+            self._update()
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._update()
+            return {"state": self._state, "consecutive_failures": self._failures, "rejected_calls": self._rejected}
@@ -0,0 +1,169 @@
+"""
+Streaming DOCX text extraction.
+
+Instead of building the whole python-docx object model, this reads the XML
+parts straight out of the .docx zip with iterparse and emits blocks in
+document order, clearing each element as soon as it has been handled. Memory
+stays bounded by the largest single paragraph or table row, not by the size of
+the document.
+
+Unlike joining doc.paragraphs, it also keeps tables, headers, footers,
+footnotes and endnotes.
+"""
+
+import os
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Iterator, List, Optional, Tuple, Union
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+BODY_PART = "word/document.xml"
+NOTE_PARTS = ("word/footnotes.xml", "word/endnotes.xml")
+HEADER_FOOTER_PATTERN = re.compile(r"^word/(header|footer)\d*\.xml$")
+
+# Block types yielded by iter_docx_blocks
+PARAGRAPH = "paragraph"
+TABLE_ROW = "table_row"
+
+Block = Tuple[str, Union[str, List[str]]]
+
+
+def _iter_part_blocks(stream) -> Iterator[Block]:
+    """
+    Iterparse one WordprocessingML part and yield its blocks.
+
+    Paragraphs outside tables are yielded as (PARAGRAPH, text). Each table row
+    is yielded as (TABLE_ROW, [cell_text, ...]); nested tables are flattened
+    into the text of the cell that contains them.
+    """
+    paragraphs = []   # text buffers for the open (possibly nested) paragraphs
+    tables = []       # per open table: {"row": [...] or None, "cell": [...] or None}
+    path = []         # open elements, so finished blocks can be detached from their parent
+    skip_depth = 0    # > 0 while inside mc:Fallback, which duplicates mc:Choice content
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+
+        if event == "start":
+            path.append(elem)
+            if skip_depth or tag == MC_FALLBACK:
+                skip_depth += 1
+            elif tag == W + "p":
+                paragraphs.append([])
+            elif tag == W + "tbl":
+                tables.append({"row": None, "cell": None})
+            elif tag == W + "tr" and tables:
+                tables[-1]["row"] = []
+            elif tag == W + "tc" and tables:
+                tables[-1]["cell"] = []
+            continue
+
+        path.pop()
+        if skip_depth:
+            skip_depth -= 1
+            continue
+
+        if tag == W + "t" and paragraphs:
+            paragraphs[-1].append(elem.text or "")
+        elif tag == W + "tab" and paragraphs:
+            paragraphs[-1].append("\t")
+        elif tag in (W + "br", W + "cr") and paragraphs:
+            paragraphs[-1].append("\n")
+        elif tag == W + "p" and paragraphs:
+            text = "".join(paragraphs.pop())
+            if paragraphs:
+                # Paragraph inside a text box: keep it with the enclosing paragraph
+                paragraphs[-1].append(text)
+            elif tables and tables[-1]["cell"] is not None:
+                tables[-1]["cell"].append(text)
+            else:
+                yield PARAGRAPH, text
+        elif tag == W + "tc" and tables and tables[-1]["cell"] is not None:
+            cell = tables[-1]["cell"]
+            tables[-1]["cell"] = None
+            if tables[-1]["row"] is not None:
+                tables[-1]["row"].append("\n".join(cell).strip())
+        elif tag == W + "tr" and tables and tables[-1]["row"] is not None:
+            row = tables[-1]["row"]
+            tables[-1]["row"] = None
+            if len(tables) > 1 and tables[-2]["cell"] is not None:
+                tables[-2]["cell"].append(" | ".join(row))
+            else:
+                yield TABLE_ROW, row
+        elif tag == W + "tbl" and tables:
+            tables.pop()
+        else:
+            continue
+
+        # A block finished: drop it from the tree so memory doesn't grow
+        elem.clear()
+        if path and tag in (W + "p", W + "tbl"):
+            parent = path[-1]
+            if len(parent) and parent[-1] is elem:
+                parent.remove(elem)
+
+
+def iter_docx_blocks(file_path: str, include_headers: bool = True,
+                     include_notes: bool = True) -> Iterator[Block]:
+    """
+    Stream the text blocks of a .docx file in document order.
+
+    Headers and footers come first (each distinct part once), then the body,
+    then footnotes and endnotes.
+
+    Args:
+        file_path: Path to the .docx file
+        include_headers: Include header/footer parts
+        include_notes: Include footnotes and endnotes
+
+    Yields:
+        (PARAGRAPH, text) or (TABLE_ROW, [cell_text, ...])
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        names = set(archive.namelist())
+        if BODY_PART not in names:
+            raise ValueError(f"Not a Word document (missing {BODY_PART}): {file_path}")
+
+        parts = []
+        if include_headers:
+            parts.extend(sorted(n for n in names if HEADER_FOOTER_PATTERN.match(n)))
+        parts.append(BODY_PART)
+        if include_notes:
+            parts.extend(n for n in NOTE_PARTS if n in names)
+
+        for part in parts:
+            with archive.open(part) as stream:
+                yield from _iter_part_blocks(stream)
+
+
+def extract_text_from_docx(file_path: str, include_headers: bool = True,
+                           include_notes: bool = True) -> Optional[str]:
+    """
+    Extract the text of a .docx file.
+
+    Paragraphs are separated by newlines and table rows are rendered as
+    tab-separated cells, one row per line.
+
+    Args:
+        file_path: Path to the .docx file
+        include_headers: Include header/footer text
+        include_notes: Include footnote and endnote text
+
+    Returns:
+        Extracted text or None if extraction fails
+    """
+    if not os.path.exists(file_path):
+        print(f"❌ DOCX file not found: {file_path}")
+        return None
+
+    try:
+        lines = []
+        for block_type, content in iter_docx_blocks(file_path, include_headers, include_notes):
+            lines.append("\t".join(content) if block_type == TABLE_ROW else content)
+        return "\n".join(lines)
+    except Exception as e:
+        print(f"❌ Error extracting DOCX text: {e}")
+        return None
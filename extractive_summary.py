@@ -0,0 +1,149 @@
+"""
+Local extractive summaries and keywords: a sub-100 ms getSummary fast path
+(mode "extractive") and the fallback while Bedrock is unavailable.
+
+summarize ranks each document's sentences with TextRank: sentences are nodes,
+edges are the cosine similarity of their TF-IDF vectors, and a sentence scores
+highly when it is similar to other high-scoring sentences. The top sentences
+are returned in reading order, up to about SUMMARY_RATIO of the notes, the
+same length the getSummary prompt asks for. The ranking is vectorized with
+NumPy; without NumPy, sentences are scored by the frequency of their words.
+
+keywords ranks the notes' content words by frequency.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import List
+
+try:
+    import numpy as np
+except ImportError:  # optional: sentences are scored by word frequency instead
+    np = None
+
+from summary_cache import split_documents
+from text_normalizer import PAGE_MARKER
+
+SUMMARY_RATIO = 0.3
+
+# TextRank damping factor and power-iteration limits
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+# Longer documents are ranked in consecutive segments of this many sentences,
+# keeping the similarity matrix (and the time) bounded
+SEGMENT_SENTENCES = 400
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+WORD = re.compile(r"[^\W\d_]{2,}")
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers him
+his how i if in into is it its itself just may me might more most must my no nor not now of off on once only or other
+our ours out over own same she should so some such than that the their theirs them then there these they this those
+through to too under until up upon us very was we were what when where which while who whom why will with within
+would you your yours
+""".split())
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of the text, one paragraph or line-wrapped block at a time."""
+    sentences = []
+    for block in re.split(r"\n\s*\n", text):
+        lines = [line.strip() for line in block.splitlines() if line.strip() and not PAGE_MARKER.match(line.strip())]
+        if lines:
+            sentences += [s.strip() for s in SENTENCE_END.split(" ".join(lines)) if s.strip()]
+    return sentences
+
+
+def content_words(text: str) -> List[str]:
+    return [word for word in WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def frequency_scores(sentences: List[str]) -> List[float]:
+    """Score sentences by how frequent their content words are in the whole text."""
+    words = [content_words(sentence) for sentence in sentences]
+    frequency = Counter(word for sentence in words for word in sentence)
+    return [sum(frequency[word] for word in ws) / math.sqrt(len(ws)) if ws else 0.0 for ws in words]
+
+
+def textrank_scores(sentences: List[str]) -> List[float]:
+    """TextRank over the TF-IDF cosine-similarity graph of the sentences."""
+    words = [content_words(sentence) for sentence in sentences]
+    vocabulary = {}
+    rows, cols = [], []
+    for row, sentence_words in enumerate(words):
+        for word in sentence_words:
+            rows.append(row)
+            cols.append(vocabulary.setdefault(word, len(vocabulary)))
+    n = len(sentences)
+    if not vocabulary:
+        return [0.0] * n
+
+    tf = np.zeros((n, len(vocabulary)), dtype=np.float32)
+    np.add.at(tf, (np.array(rows), np.array(cols)), 1.0)
+    document_frequency = np.count_nonzero(tf, axis=0)
+    tfidf = tf * (np.log((1 + n) / (1 + document_frequency)) + 1).astype(np.float32)
+    norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+    tfidf /= np.where(norms == 0, 1, norms)
+
+    similarity = tfidf @ tfidf.T
+    np.fill_diagonal(similarity, 0)
+    # Each sentence spreads its score over its neighbours by similarity; an
+    # isolated sentence spreads it evenly, so the scores stay a distribution
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    transition = np.where(out_weight > 0, similarity / np.where(out_weight == 0, 1, out_weight), 1.0 / n)
+
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(MAX_ITERATIONS):
+        updated = (1 - DAMPING) / n + DAMPING * (transition.T @ scores)
+        converged = np.abs(updated - scores).sum() < TOLERANCE
+        scores = updated
+        if converged:
+            break
+    return scores.tolist()
+
+
+def select_sentences(sentences: List[str], scores: List[float], ratio: float) -> List[str]:
+    """The best sentences up to about ratio of the total length, in reading order."""
+    target = ratio * sum(len(sentence) for sentence in sentences)
+    chosen, length = [], 0
+    for index in sorted(range(len(sentences)), key=lambda i: -scores[i]):
+        if length >= target:
+            break
+        chosen.append(index)
+        length += len(sentences[index])
+    return [sentences[i] for i in sorted(chosen)]
+
+
+def _summarize_document(text: str, ratio: float) -> str:
+    sentences = split_sentences(text)
+    if len(sentences) <= 1:
+        return " ".join(sentences)
+    score = textrank_scores if np is not None else frequency_scores
+    summary = []
+    for start in range(0, len(sentences), SEGMENT_SENTENCES):
+        segment = sentences[start:start + SEGMENT_SENTENCES]
+        summary += select_sentences(segment, score(segment), ratio)
+    return " ".join(summary)
+
+
+def summarize(notes_content: str, ratio: float = SUMMARY_RATIO) -> str:
+    """
+    Extractive summary of the notes, about ratio of their length.
+
+    Multi-document notes are summarized per document, each under its title.
+    """
+    documents = [(title, body) for title, body in split_documents(notes_content) if body.strip()]
+    if len(documents) == 1:
+        return _summarize_document(documents[0][1], ratio)
+    return "\n\n".join(
+        f"{title}\n{_summarize_document(body, ratio)}" if title else _summarize_document(body, ratio)
+        for title, body in documents
+    )
+
+
+def keywords(text: str, limit: int = 15) -> List[str]:
+    """The text's most frequent content words, most frequent first."""
+    return [word for word, _ in Counter(content_words(text)).most_common(limit)]
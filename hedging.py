@@ -0,0 +1,186 @@
+"""
+Hedged requests: cut the tail latency of Bedrock calls.
+
+A hedged call starts the primary request and waits up to a percentile
+(HEDGE_PERCENTILE) of the recent latency of similar calls. If no response has
+arrived by then, a duplicate is sent to a backup endpoint (another region or
+model ID) and whichever answers first wins. The slower request is left to
+finish in the background; it still costs tokens, so its result is handed to
+on_loser for usage accounting.
+
+Hedging costs the duplicated tokens, so it is capped: every call earns
+HEDGE_MAX_RATE of a hedge credit (up to HEDGE_BURST), and a hedge spends one.
+Over time at most HEDGE_MAX_RATE of calls are duplicated, however slow
+Bedrock gets.
+
+Latency is measured from when the primary request actually starts running,
+not from when it was queued on the thread pool, and no hedge is sent while
+every pool thread is busy: a backup would only queue behind the same work.
+A call can be given a timeout that covers the queueing too.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, Optional, TypeVar
+
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_RATE = float(os.environ.get("HEDGE_MAX_RATE", "0.05"))
+HEDGE_BURST = 5.0
+# Latencies remembered per kind of call, and how many are needed before hedging
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+# Never hedge sooner than this, whatever the percentile says
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", "0.5"))
+
+T = TypeVar("T")
+
+
+def _remaining(deadline: Optional[float], limit: Optional[float] = None) -> Optional[float]:
+    """Seconds left until deadline (capped at limit), or limit when there is no deadline."""
+    if deadline is None:
+        return limit
+    left = max(0.0, deadline - time.monotonic())
+    return left if limit is None else min(left, limit)
+
+
+class Hedger:
+    """Runs calls with a latency-triggered, rate-capped backup request."""
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, max_rate: float = HEDGE_MAX_RATE,
+                 min_samples: int = HEDGE_MIN_SAMPLES, min_delay: float = HEDGE_MIN_DELAY, workers: int = 32):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+        self._workers = workers
+        self._busy = 0  # requests submitted to the pool and not yet finished
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=HEDGE_WINDOW))
+        self._credit = HEDGE_BURST
+        self._stats = {"calls": 0, "hedged": 0, "backup_wins": 0, "skipped_over_rate": 0, "skipped_saturated": 0}
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """Seconds to wait before hedging a call of this kind, or None until enough calls were seen."""
+        with self._lock:
+            latencies = sorted(self._latencies[key])
+        if len(latencies) < self.min_samples:
+            return None
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+        return max(self.min_delay, latencies[index])
+
+    def _submit(self, fn: Callable[[], T], started: Optional[threading.Event] = None) -> Future:
+        with self._lock:
+            self._busy += 1
+        return self._pool.submit(self._run, fn, started)
+
+    def _run(self, fn: Callable[[], T], started: Optional[threading.Event]) -> T:
+        if started is not None:
+            started.set()
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self._busy -= 1
+
+    def _spend_credit(self) -> bool:
+        with self._lock:
+            if self._busy >= self._workers:
+                self._stats["skipped_saturated"] += 1
+                return False
+            if self._credit >= 1.0:
+                self._credit -= 1.0
+                return True
+            self._stats["skipped_over_rate"] += 1
+            return False
+
+    def call(self, key: str, primary: Callable[[], T], backup: Callable[[], T], timeout: Optional[float] = None,
+             on_loser: Optional[Callable[[T], None]] = None) -> T:
+        """
+        Run primary(), hedging with backup() if it is slower than usual.
+
+        key groups calls with comparable latency (e.g. model and action).
+        Errors from the first request to finish are only raised if the other
+        request fails too. Without an answer within timeout seconds (queueing
+        for a pool thread included) TimeoutError is raised. on_loser(result)
+        is called with the result of every request that finishes after the
+        call stopped waiting for it: the hedge that lost, or a timed-out one.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = self.hedge_delay(key)
+        with self._lock:
+            self._stats["calls"] += 1
+            self._credit = min(HEDGE_BURST, self._credit + self.max_rate)
+
+        running = threading.Event()
+        first = self._submit(primary, running)
+        # The hedge delay and the recorded latency start once the call runs,
+        # so time spent queued behind other calls is not taken for slowness
+        if not running.wait(_remaining(deadline)):
+            if not first.cancel():
+                self._when_done(first, on_loser)
+            raise TimeoutError(f"Bedrock call did not start within {timeout:.0f}s")
+        started = time.monotonic()
+        done, _ = wait([first], timeout=_remaining(deadline, delay))
+        out_of_time = deadline is not None and time.monotonic() >= deadline
+        if done or delay is None or out_of_time or not self._spend_credit():
+            try:
+                result = first.result(timeout=_remaining(deadline))
+            except TimeoutError:
+                self._when_done(first, on_loser)
+                raise
+            self._record(key, time.monotonic() - started)
+            return result
+
+        with self._lock:
+            self._stats["hedged"] += 1
+        second = self._submit(backup)
+        pending, winner = {first, second}, None
+        while pending:
+            done, pending = wait(pending, timeout=_remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                for future in pending:
+                    self._when_done(future, on_loser)
+                raise TimeoutError(f"Neither hedged Bedrock request finished within {timeout:.0f}s")
+            succeeded = [future for future in done if future.exception() is None]
+            if succeeded:
+                winner = first if first in succeeded else second
+                break
+            winner = winner or first  # both failed: raise the primary's error
+        if winner is second:
+            with self._lock:
+                self._stats["backup_wins"] += 1
+        # The loser is billed too, whether it already finished or finishes later
+        self._when_done(second if winner is first else first, on_loser)
+        result = winner.result()
+        self._record(key, time.monotonic() - started)
+        return result
+
+    @staticmethod
+    def _when_done(future: Future, on_loser: Optional[Callable[[T], None]]):
+        """Hand the result of a request no caller waits for to on_loser, once it succeeds."""
+        if on_loser is None:
+            return
+
+        def report(done: Future):
+            if done.cancelled() or done.exception() is not None:
+                return
+            try:
+                on_loser(done.result())
+            except Exception as e:
+                print(f"⚠️ Could not account for a hedged request: {e}")
+
+        future.add_done_callback(report)
+
+    def _record(self, key: str, seconds: float):
+        with self._lock:
+            self._latencies[key].append(seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hedge_rate"] = round(stats["hedged"] / stats["calls"], 4) if stats["calls"] else 0.0
+        return stats
@@ -0,0 +1,201 @@
+"""
+Compressed request and response bodies for the AI service.
+
+Study group notes often run to megabytes of plain text, which compresses
+5-10x. Requests sent with 'Content-Encoding: gzip' (or deflate, or zstd when
+the optional `zstandard` package is installed) are decompressed as a stream
+while Flask reads the body, with a cap on the decompressed size. Responses
+above COMPRESS_MIN_BYTES are compressed with the best encoding the client
+lists in Accept-Encoding.
+
+Rejected bodies get the same {"error": ...} JSON reply as the app's own
+errors (see app.create_error_response), so clients can always parse them.
+"""
+
+import gzip
+import json
+import os
+import zlib
+from typing import Optional
+
+from werkzeug.exceptions import BadRequest, HTTPException, RequestEntityTooLarge, UnsupportedMediaType
+from werkzeug.wsgi import LimitedStream
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip and deflate still work without it
+    zstandard = None
+
+# Responses smaller than this are sent as-is; compressing them isn't worth it
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "5"))
+# Refuse request bodies that inflate past this (guards against zip bombs)
+MAX_DECOMPRESSED_BYTES = int(os.environ.get("MAX_DECOMPRESSED_BYTES", str(256 * 1024 * 1024)))
+READ_BLOCK_SIZE = 64 * 1024
+
+_DECODE_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class JSONHTTPException(HTTPException):
+    """An HTTP error whose body is {"error": description}, not Werkzeug's HTML page."""
+
+    def get_body(self, environ=None, scope=None) -> str:
+        return json.dumps({"error": self.description})
+
+    def get_headers(self, environ=None, scope=None):
+        return [("Content-Type", "application/json"), ("Access-Control-Allow-Origin", "*")]
+
+
+class JSONBadRequest(JSONHTTPException, BadRequest):
+    pass
+
+
+class JSONRequestEntityTooLarge(JSONHTTPException, RequestEntityTooLarge):
+    pass
+
+
+class JSONUnsupportedMediaType(JSONHTTPException, UnsupportedMediaType):
+    pass
+
+
+def supported_encodings():
+    """Content codings this service can decode and produce, preferred first."""
+    return (["zstd"] if zstandard else []) + ["gzip", "deflate"]
+
+
+class DecompressingStream:
+    """
+    File-like reader that decompresses a wsgi.input stream block by block.
+
+    raw must end where the body ends (a LimitedStream over Content-Length):
+    on a keep-alive connection the socket does not reach EOF after the body.
+    Reading also stops at the end of the compressed stream.
+    """
+
+    def __init__(self, raw, encoding: str, limit: int = None):
+        self.raw = raw
+        self.limit = MAX_DECOMPRESSED_BYTES if limit is None else limit
+        self.produced = 0
+        self.buffer = bytearray()
+        self.finished = False
+        if encoding == "zstd":
+            self.decompressor = zstandard.ZstdDecompressor().decompressobj()
+        elif encoding == "gzip":
+            self.decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        else:
+            # HTTP 'deflate' is the zlib format
+            self.decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS)
+
+    def _fill(self, wanted: int):
+        while not self.finished and (wanted < 0 or len(self.buffer) < wanted):
+            block = self.raw.read(READ_BLOCK_SIZE)
+            try:
+                if block:
+                    chunk = self.decompressor.decompress(block)
+                    self.finished = getattr(self.decompressor, "eof", False)
+                else:
+                    chunk = self.decompressor.flush() if hasattr(self.decompressor, "flush") else b""
+                    self.finished = True
+            except _DECODE_ERRORS as e:
+                raise JSONBadRequest(f"Malformed compressed request body: {e}")
+            self.produced += len(chunk)
+            if self.produced > self.limit:
+                raise JSONRequestEntityTooLarge(
+                    f"Decompressed request body exceeds {self.limit} bytes."
+                )
+            self.buffer += chunk
+
+    def read(self, size: int = -1) -> bytes:
+        size = -1 if size is None else size
+        self._fill(size)
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        # Only used by form parsing; JSON bodies are read with read()
+        self._fill(-1)
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return data
+
+
+class DecompressRequestMiddleware:
+    """WSGI middleware that decodes Content-Encoding request bodies before Flask reads them."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding and encoding != "identity":
+            if encoding not in supported_encodings():
+                return JSONUnsupportedMediaType(
+                    f"Unsupported Content-Encoding '{encoding}'. Use one of: {', '.join(supported_encodings())}."
+                )(environ, start_response)
+            raw = environ["wsgi.input"]
+            content_length = environ.get("CONTENT_LENGTH")
+            if content_length:
+                try:
+                    raw = LimitedStream(raw, int(content_length))
+                except ValueError:
+                    return JSONBadRequest("Invalid Content-Length.")(environ, start_response)
+            environ["wsgi.input"] = DecompressingStream(raw, encoding)
+            # The decoded length is unknown until the stream is read to the end
+            environ.pop("CONTENT_LENGTH", None)
+            environ.pop("HTTP_CONTENT_ENCODING", None)
+            environ["wsgi.input_terminated"] = True
+        return self.wsgi_app(environ, start_response)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the preferred supported coding the client accepts (q=0 means refused)."""
+    accepted = {}
+    for item in (accept_encoding or "").lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=COMPRESS_LEVEL).compress(data)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+    return zlib.compress(data, COMPRESS_LEVEL)
+
+
+def compress_response(response, accept_encoding: str):
+    """
+    Compress a Flask response in place when it is large enough and the client
+    accepts a supported coding. Streamed and already-encoded responses are
+    left alone.
+    """
+    response.vary.add("Accept-Encoding")
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers):
+        return response
+
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None or (response.content_length or 0) < COMPRESS_MIN_BYTES:
+        return response
+
+    response.set_data(compress_body(response.get_data(), encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
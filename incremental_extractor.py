@@ -0,0 +1,218 @@
+"""
+Incremental, page-level PDF re-extraction.
+
+Every extraction records a fingerprint per page (see
+pdf_extractor.pdf_page_fingerprints) in a small JSON manifest stored under
+~/Documents/.ai_helper/page_cache. When the same document is extracted again,
+only pages whose fingerprint is new are re-extracted; every other page's text
+is reused from the manifest. Callers that must not touch the cache pass
+use_cache=False (pdf_extractor does when PDF_PAGE_CACHE=false).
+
+Derived artifacts (summaries, question sets, ...) can be registered against
+the pages they were built from. When pages change, artifacts that depend on
+them are invalidated, so callers only regenerate what the edit touched.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+import pdfplumber
+import PyPDF2
+
+from pdf_extractor import format_pdf_pages, ocr_empty_pages, pdf_page_fingerprints
+
+PAGE_CACHE_DIR = os.environ.get(
+    "PAGE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), "Documents", ".ai_helper", "page_cache"),
+)
+
+
+def _manifest_path(file_path: str, cache_dir: Optional[str] = None) -> str:
+    key = hashlib.sha256(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir or PAGE_CACHE_DIR, f"{key}.json")
+
+
+def load_manifest(file_path: str, cache_dir: Optional[str] = None) -> Optional[Dict]:
+    """Load the stored page manifest for a document, or None if it has none."""
+    manifest_file = _manifest_path(file_path, cache_dir)
+    if not os.path.exists(manifest_file):
+        return None
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_manifest(file_path: str, manifest: Dict, cache_dir: Optional[str] = None):
+    manifest_file = _manifest_path(file_path, cache_dir)
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    # Write then rename so a crash never leaves a half-written manifest behind
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_file, manifest_file)
+
+
+def _extract_selected_pages(file_path: str, page_indices: Iterable[int]) -> Dict[int, str]:
+    """Extract only the given pages: pdfplumber first, PyPDF2 for pages it can't read."""
+    page_indices = sorted(page_indices)
+    texts = {}
+    if not page_indices:
+        return texts
+
+    with pdfplumber.open(file_path) as pdf:
+        for i in page_indices:
+            try:
+                page_text = pdf.pages[i].extract_text()
+                texts[i] = page_text.strip() if page_text else ""
+            except Exception as e:
+                print(f"⚠️ Error extracting page {i+1}: {e}")
+                texts[i] = ""
+
+    missing = [i for i in page_indices if not texts[i]]
+    if missing:
+        with open(file_path, "rb") as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for i in missing:
+                try:
+                    page_text = pdf_reader.pages[i].extract_text()
+                    texts[i] = page_text.strip() if page_text else ""
+                except Exception as e:
+                    print(f"⚠️ Error extracting page {i+1} with PyPDF2: {e}")
+    return texts
+
+
+def _invalidate_artifacts(artifacts: Dict, previous: List[str], fingerprints: List[str]) -> List[str]:
+    """
+    Drop artifacts built from pages that are gone or changed, and move the
+    page numbers of the others to where their pages are now. Returns the
+    invalidated names.
+    """
+    position = {}
+    for i, fp in enumerate(fingerprints):
+        position.setdefault(fp, i)
+    invalidated = []
+    for name, info in list(artifacts.items()):
+        pages = info.get("pages")
+        if pages is None:
+            stale = previous != fingerprints
+        else:
+            depends_on = info.get("fingerprints") or [previous[p] for p in pages if p < len(previous)]
+            stale = any(fp not in position for fp in depends_on)
+            if not stale:
+                info["fingerprints"] = depends_on
+                info["pages"] = [position[fp] for fp in depends_on]
+        if stale:
+            invalidated.append(name)
+            del artifacts[name]
+    return invalidated
+
+
+def _previous_pages(manifest: Dict):
+    """(fingerprints, text by fingerprint) of the last extraction."""
+    if "fingerprints" in manifest:
+        return manifest["fingerprints"], manifest.get("texts", {})
+    # Manifests written before texts were keyed by fingerprint
+    pages = manifest.get("pages", [])
+    return [page["fingerprint"] for page in pages], {page["fingerprint"]: page["text"] for page in pages}
+
+
+def extract_pdf_incremental(file_path: str, max_pages: Optional[int] = None,
+                            cache_dir: Optional[str] = None, use_cache: bool = True) -> Dict:
+    """
+    Extract a PDF, re-using the text of every page that has not changed since
+    the last extraction of the same path.
+
+    Args:
+        file_path: Path to the PDF file
+        max_pages: Extract only the first max_pages pages (None for all);
+            changes are still detected on every page
+        cache_dir: Manifest directory (defaults to PAGE_CACHE_DIR)
+        use_cache: False to extract every page without reading or writing
+            the manifest
+
+    Returns:
+        Dictionary with:
+            text: full text with '--- Page N ---' markers
+            pages: per-page text
+            fingerprints: per-page fingerprints of the whole document
+            changed_pages: 0-based indices of pages whose content is new
+                (every page on the first extraction)
+            extracted_pages: number of pages that actually had to be extracted
+            invalidated_artifacts: derived artifacts dropped because of the change
+    """
+    fingerprints = pdf_page_fingerprints(file_path)
+    manifest = (load_manifest(file_path, cache_dir) if use_cache else None) or {"artifacts": {}}
+    previous, known_text = _previous_pages(manifest)
+
+    # Reuse by fingerprint rather than position, so inserted or reordered pages
+    # don't force re-extraction of content we have already seen.
+    wanted = fingerprints if max_pages is None else fingerprints[:max_pages]
+    to_extract = [i for i, fp in enumerate(wanted) if fp not in known_text]
+    extracted = _extract_selected_pages(file_path, to_extract)
+
+    page_texts = [
+        extracted[i] if i in extracted else known_text[fp]
+        for i, fp in enumerate(wanted)
+    ]
+    page_texts = ocr_empty_pages(file_path, page_texts, max_pages=max_pages, fingerprints=fingerprints)
+    # Changed means new content, matched the same way as reuse: a page that
+    # only moved (e.g. after an inserted page) is not changed
+    previous_set = set(previous)
+    changed_pages = [i for i, fp in enumerate(fingerprints) if fp not in previous_set]
+    invalidated = _invalidate_artifacts(
+        manifest.setdefault("artifacts", {}), previous, fingerprints,
+    ) if previous else []
+
+    texts = {fp: known_text[fp] for fp in fingerprints if fp in known_text}
+    texts.update(zip(wanted, page_texts))
+    manifest.pop("pages", None)
+    manifest["path"] = os.path.abspath(file_path)
+    manifest["updated"] = time.time()
+    manifest["fingerprints"] = fingerprints
+    manifest["texts"] = texts
+    if use_cache:
+        _save_manifest(file_path, manifest, cache_dir)
+
+    if previous:
+        print(f"♻️ Re-extracted {len(to_extract)} of {len(wanted)} pages ({len(changed_pages)} changed)")
+
+    return {
+        "text": format_pdf_pages(page_texts),
+        "pages": page_texts,
+        "fingerprints": fingerprints,
+        "changed_pages": changed_pages,
+        "extracted_pages": len(to_extract),
+        "invalidated_artifacts": invalidated,
+    }
+
+
+def register_artifact(file_path: str, name: str, pages: Optional[List[int]] = None,
+                      cache_dir: Optional[str] = None):
+    """
+    Record that a derived artifact was built from a document.
+
+    Args:
+        file_path: Path to the source PDF (must have been extracted already)
+        name: Artifact name, e.g. "summary" or "flashcards"
+        pages: 0-based pages the artifact depends on (None for the whole document)
+    """
+    manifest = load_manifest(file_path, cache_dir)
+    if manifest is None:
+        raise ValueError(f"Document has not been extracted yet: {file_path}")
+    fingerprints, _ = _previous_pages(manifest)
+    info = {"pages": pages, "created": time.time()}
+    if pages is not None:
+        info["fingerprints"] = [fingerprints[p] for p in pages if p < len(fingerprints)]
+    manifest.setdefault("artifacts", {})[name] = info
+    _save_manifest(file_path, manifest, cache_dir)
+
+
+def artifact_is_valid(file_path: str, name: str, cache_dir: Optional[str] = None) -> bool:
+    """True if the artifact is registered and none of its pages changed since."""
+    manifest = load_manifest(file_path, cache_dir)
+    return bool(manifest) and name in manifest.get("artifacts", {})
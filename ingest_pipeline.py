@@ -0,0 +1,290 @@
+"""
+Background document ingest.
+
+When a document is registered (process-document -> make_file), the Flask
+service is asked to ingest it: the file is extracted and normalized once, and a
+summary, keywords and a starter set of practice questions and flashcards are
+generated from it. The results are stored as JSON under
+~/Documents/.ai_helper/artifacts, next to descriptions.yaml, one file per
+document path. Interactive actions on an unchanged document are answered from
+there instead of waiting on Bedrock.
+
+PDFs are extracted incrementally (see incremental_extractor): re-ingesting an
+edited PDF only extracts its new pages, and when no page changed (a re-save)
+the artifacts are kept. The notes handed to generate are split into
+content-defined page groups, so the summaries of groups the edit did not
+touch come from the summary cache and only changed groups are re-summarized.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import zip_longest
+from typing import Callable, Dict, List, Optional
+
+import incremental_extractor
+from bulk_extractor import SUPPORTED_EXTENSIONS, extract_file_text, file_sha256
+from text_normalizer import PAGE_MARKER, normalize_text
+
+ARTIFACTS_DIR = os.environ.get(
+    "INGEST_ARTIFACTS_DIR",
+    os.path.join(os.path.expanduser("~"), "Documents", ".ai_helper", "artifacts"),
+)
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+# Size of the starter sets generated at ingest time
+STARTER_QUESTIONS = int(os.environ.get("INGEST_QUESTIONS", "5"))
+STARTER_FLASHCARDS = int(os.environ.get("INGEST_FLASHCARDS", "10"))
+
+# PDF page groups end after a page whose fingerprint is divisible by this
+# (~every 4 pages), or at PAGE_GROUP_MAX_PAGES
+PAGE_GROUP_MODULUS = 4
+PAGE_GROUP_MAX_PAGES = 12
+# Name of the ingest artifacts in the PDF's page manifest
+PAGE_ARTIFACT = "ingest"
+
+# Artifact states
+READY = "ready"
+FAILED = "failed"
+
+# generate(normalized_text) -> {"summary": str, "keywords": [...], "questions": [...], "flashcards": [...]}
+Generator = Callable[[str], Dict]
+
+
+def _artifact_path(file_path: str, artifacts_dir: Optional[str] = None) -> str:
+    key = hashlib.sha256(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+    return os.path.join(artifacts_dir or ARTIFACTS_DIR, f"{key}.json")
+
+
+def load_artifacts(file_path: str, artifacts_dir: Optional[str] = None) -> Optional[Dict]:
+    """Load the stored artifacts of a document (in any state), or None."""
+    try:
+        with open(_artifact_path(file_path, artifacts_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_artifacts(file_path: str, artifacts: Dict, artifacts_dir: Optional[str] = None):
+    artifact_file = _artifact_path(file_path, artifacts_dir)
+    os.makedirs(os.path.dirname(artifact_file), exist_ok=True)
+    tmp_file = artifact_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(artifacts, f, ensure_ascii=False)
+    os.replace(tmp_file, artifact_file)
+
+
+def _matches_file(artifacts: Optional[Dict], file_path: str) -> bool:
+    """True if the artifacts were built from the file as it is on disk now."""
+    if not artifacts:
+        return False
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return False
+    return artifacts.get("size") == stat.st_size and artifacts.get("mtime") == stat.st_mtime
+
+
+def fresh_artifacts(file_path: str, artifacts_dir: Optional[str] = None) -> Optional[Dict]:
+    """Ready artifacts for the document if it has not changed since ingest, else None."""
+    file_path = os.path.abspath(os.path.expanduser(file_path))
+    artifacts = load_artifacts(file_path, artifacts_dir)
+    if artifacts and artifacts.get("status") == READY and _matches_file(artifacts, file_path):
+        return artifacts
+    return None
+
+
+def needs_ingest(file_path: str, artifacts_dir: Optional[str] = None) -> bool:
+    """
+    True if a supported document has no artifacts for its current version.
+
+    A failed ingest of an unchanged file is not retried automatically.
+    """
+    file_path = os.path.abspath(os.path.expanduser(file_path))
+    if not os.path.isfile(file_path) or not file_path.lower().endswith(SUPPORTED_EXTENSIONS):
+        return False
+    return not _matches_file(load_artifacts(file_path, artifacts_dir), file_path)
+
+
+def parse_lines(reply: str) -> List[str]:
+    """Split a newline-separated model reply into its non-empty lines."""
+    return [line.strip() for line in reply.split("\n") if line.strip()]
+
+
+def parse_flashcards(reply: str) -> List[Dict[str, str]]:
+    """Pair up the alternating question/answer lines of a flashcard reply."""
+    lines = parse_lines(reply)
+    return [{"question": q, "answer": a} for q, a in zip(lines[0::2], lines[1::2])]
+
+
+def format_flashcards(cards: List[Dict[str, str]]) -> str:
+    """Render flashcards in the alternating-line format getFlashCards replies use."""
+    return "\n".join(f"{card['question']}\n{card['answer']}" for card in cards)
+
+
+def interleave(groups: List[List]) -> List:
+    """Round-robin merge, so a starter set drawn from several documents covers all of them."""
+    return [item for row in zip_longest(*groups) for item in row if item is not None]
+
+
+def page_groups(fingerprints: List[str]) -> List[List[int]]:
+    """
+    Split pages into groups whose boundaries depend only on the pages'
+    fingerprints, so an edit or inserted page changes only its own group.
+    """
+    groups, group = [], []
+    for i, fp in enumerate(fingerprints):
+        group.append(i)
+        if int(fp[:8], 16) % PAGE_GROUP_MODULUS == 0 or len(group) >= PAGE_GROUP_MAX_PAGES:
+            groups.append(group)
+            group = []
+    if group:
+        groups.append(group)
+    return groups
+
+
+def pdf_notes(file_path: str, extraction: Dict) -> str:
+    """
+    The normalized text of an extracted PDF as one '=== Title (pages a-b) ==='
+    section per page group. Section bodies leave out page numbers, so a group
+    moved by an inserted page keeps the same content.
+    """
+    normalized, _ = normalize_text(extraction["text"])
+    pages, number = {}, None
+    for line in normalized.split("\n"):
+        if PAGE_MARKER.match(line.strip()):
+            number = int(line.strip().split()[2]) - 1
+            pages[number] = []
+        elif number is not None:
+            pages[number].append(line)
+
+    title = os.path.basename(file_path)
+    sections = []
+    for group in page_groups(extraction["fingerprints"][:len(extraction["pages"])]):
+        body = "\n\n".join("\n".join(pages[i]).strip() for i in group if "\n".join(pages.get(i, [])).strip())
+        if body:
+            sections.append(f"=== {title} (pages {group[0] + 1}-{group[-1] + 1}) ===\n{body}")
+    return "\n\n".join(sections)
+
+
+def ingest_document(file_path: str, generate: Generator, artifacts_dir: Optional[str] = None,
+                    force: bool = False) -> Dict:
+    """
+    Extract a document and store its precomputed artifacts.
+
+    Args:
+        file_path: Path to a .pdf, .docx or .txt document
+        generate: Function building the artifacts from the normalized text
+        artifacts_dir: Artifact directory (defaults to ARTIFACTS_DIR)
+        force: Regenerate even if the file content is unchanged
+
+    Returns:
+        The stored artifacts. On failure they have status "failed" and an
+        "error" message instead of generated content.
+    """
+    file_path = os.path.abspath(os.path.expanduser(file_path))
+    started = time.perf_counter()
+    stat = os.stat(file_path)
+    artifacts = {
+        "path": file_path,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": None,
+        "status": FAILED,
+        "error": None,
+        "created": time.time(),
+    }
+
+    try:
+        artifacts["sha256"] = file_sha256(file_path)
+        previous = load_artifacts(file_path, artifacts_dir)
+        if (not force and previous and previous.get("status") == READY
+                and previous.get("sha256") == artifacts["sha256"]):
+            # Touched but not edited: keep the artifacts, just record the new mtime
+            previous.update(size=stat.st_size, mtime=stat.st_mtime)
+            _save_artifacts(file_path, previous, artifacts_dir)
+            return previous
+
+        is_pdf = file_path.lower().endswith(".pdf")
+        if is_pdf:
+            extraction = incremental_extractor.extract_pdf_incremental(file_path)
+            if (not force and previous and previous.get("status") == READY
+                    and incremental_extractor.artifact_is_valid(file_path, PAGE_ARTIFACT)):
+                # Re-saved without changing any page: keep the artifacts
+                previous.update(size=stat.st_size, mtime=stat.st_mtime, sha256=artifacts["sha256"])
+                _save_artifacts(file_path, previous, artifacts_dir)
+                return previous
+            print(f"📥 Ingesting {os.path.basename(file_path)} "
+                  f"({len(extraction['changed_pages'])} of {len(extraction['pages'])} pages changed)")
+            normalized, pages = pdf_notes(file_path, extraction), len(extraction["pages"])
+        else:
+            print(f"📥 Ingesting {os.path.basename(file_path)}")
+            text, pages = extract_file_text(file_path)
+            normalized, _ = normalize_text(text)
+        if not normalized.strip():
+            raise ValueError("No text could be extracted from the document")
+
+        artifacts.update(generate(normalized))
+        artifacts.update(
+            status=READY,
+            pages=pages,
+            content_hash=hashlib.sha256(normalized.encode("utf-8")).hexdigest(),
+        )
+        if is_pdf:
+            incremental_extractor.register_artifact(file_path, PAGE_ARTIFACT)
+        print(f"✅ Ingested {os.path.basename(file_path)} in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"❌ Ingest failed for {os.path.basename(file_path)}: {e}")
+        artifacts["error"] = str(e)
+
+    artifacts["ingest_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    _save_artifacts(file_path, artifacts, artifacts_dir)
+    return artifacts
+
+
+class IngestQueue:
+    """Runs ingests in a small thread pool, at most one at a time per document."""
+
+    def __init__(self, generate: Generator, workers: int = INGEST_WORKERS,
+                 artifacts_dir: Optional[str] = None):
+        self.generate = generate
+        self.artifacts_dir = artifacts_dir
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest")
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+
+    def submit(self, file_path: str, force: bool = False) -> Future:
+        """Queue a document for ingest. Returns the already-pending future if there is one."""
+        file_path = os.path.abspath(os.path.expanduser(file_path))
+        with self._lock:
+            pending = self._pending.get(file_path)
+            if pending is not None and not pending.done():
+                return pending
+            future = self._pool.submit(ingest_document, file_path, self.generate, self.artifacts_dir, force)
+            self._pending[file_path] = future
+        future.add_done_callback(lambda _: self._forget(file_path, future))
+        return future
+
+    def _forget(self, file_path: str, future: Future):
+        with self._lock:
+            if self._pending.get(file_path) is future:
+                del self._pending[file_path]
+
+    def shutdown(self, wait: bool = True):
+        """Stop taking ingests; with wait, finish the ones already queued."""
+        self._pool.shutdown(wait=wait)
+
+    def status(self, file_path: str) -> str:
+        """"pending", "ready", "failed", "stale" (file changed since ingest) or "missing"."""
+        file_path = os.path.abspath(os.path.expanduser(file_path))
+        with self._lock:
+            if file_path in self._pending:
+                return "pending"
+        artifacts = load_artifacts(file_path, self.artifacts_dir)
+        if artifacts is None:
+            return "missing"
+        if not _matches_file(artifacts, file_path):
+            return "stale"
+        return artifacts.get("status", FAILED)
@@ -0,0 +1,115 @@
+"""
+Fast JSON encoding for the HTTP surface and Bedrock payloads.
+
+Uses orjson when it is installed (set JSON_CODEC=json to force the standard
+library) and falls back to the json module for anything orjson refuses, such
+as integers wider than 64 bits.
+
+Bedrock request bodies are assembled from pre-encoded pieces: the JSON form of
+short strings (roles, prompts, the system prompt) is cached, and chunked notes
+arrive pre-encoded from chunk_store, so repeated calls mostly join bytes.
+Long strings are encoded each time rather than cached: re-encoding them costs
+less than hashing them would, and the cache would keep a request's notes
+alive after it ends.
+"""
+
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: the standard library is used instead
+    orjson = None
+
+JSON_CODEC = os.environ.get("JSON_CODEC", "auto").lower()
+USE_ORJSON = orjson is not None and JSON_CODEC != "json"
+CODEC_NAME = "orjson" if USE_ORJSON else "json"
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def dumps(obj: Any, default=None) -> bytes:
+    """Serialize to UTF-8 JSON bytes."""
+    if USE_ORJSON:
+        try:
+            return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            pass  # e.g. a big int; the standard library handles it
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data) -> Any:
+    """Parse JSON from bytes or str."""
+    if USE_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Strings longer than this are not cached by encode_string
+ENCODE_CACHE_MAX_CHARS = 4096
+
+
+@lru_cache(maxsize=64)
+def _encode_short_string(text: str) -> bytes:
+    return dumps(text)
+
+
+def encode_string(text: str) -> bytes:
+    """JSON-encode one string, remembering recent short ones."""
+    return _encode_short_string(text) if len(text) <= ENCODE_CACHE_MAX_CHARS else dumps(text)
+
+
+def _content_parts(content) -> List[bytes]:
+    # Message content is a string or chunk_store.StoredNotes, whose chunks'
+    # shared, already-encoded bytes go straight into the body
+    return [encode_string(content)] if isinstance(content, str) else content.json_parts()
+
+
+def bedrock_request_body(system: str, messages: List[Dict[str, str]], max_tokens: int,
+                         temperature: float, anthropic_version: str = "bedrock-2023-05-31") -> bytes:
+    """
+    Build an Anthropic messages request body for bedrock.invoke_model.
+
+    Equivalent to json.dumps({...}).encode("utf-8"), but each message's content
+    is encoded through encode_string (or taken pre-encoded from the chunk
+    store), so notes that were already sent are not escaped and copied again.
+    """
+    # Every piece is joined once, so the notes are copied only into the body itself
+    parts = [
+        b'{"anthropic_version":', encode_string(anthropic_version),
+        b',"system":', encode_string(system),
+        b',"messages":[',
+    ]
+    for i, m in enumerate(messages):
+        parts += [b',{"role":' if i else b'{"role":', encode_string(m["role"]), b',"content":']
+        parts += _content_parts(m["content"])
+        parts.append(b"}")
+    parts += [
+        b'],"max_tokens":', dumps(max_tokens),
+        b',"temperature":', dumps(temperature),
+        b"}",
+    ]
+    return b"".join(parts)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dumps/loads, for request.get_json and jsonify."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, default=self.default).decode("utf-8")
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        # Build the body as bytes directly instead of str -> "...\n" -> bytes
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, default=self.default) + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,21 @@
+// Run async work over a list with at most `limit` tasks in flight.
+// Results come back in input order, whatever order the tasks finish in.
+export const mapWithConcurrency = async <T, R>(
+  items: T[],
+  limit: number,
+  fn: (item: T, index: number) => Promise<R>
+): Promise<R[]> => {
+  const results = new Array<R>(items.length)
+  let next = 0
+
+  const worker = async () => {
+    while (next < items.length) {
+      const index = next++
+      results[index] = await fn(items[index], index)
+    }
+  }
+
+  const workers = Array.from({ length: Math.min(Math.max(1, limit), items.length) }, () => worker())
+  await Promise.all(workers)
+  return results
+}
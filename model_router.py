@@ -0,0 +1,138 @@
+"""
+Latency-aware routing between a fast and a large Bedrock model.
+
+Every action used to go to MODEL_ID. The router picks a model per call from
+the action, the input size and a latency objective (SLO) per action:
+
+- Light, latency-sensitive calls (keywords, single answers, small question
+  sets) go to whichever model is currently fastest.
+- Heavy calls (summaries, batch grading, or anything with more than
+  LARGE_INPUT_TOKENS of input) go to the large model if it is expected to
+  finish within the action's SLO, and otherwise to the fast model.
+
+Expected latency comes from live measurements: an exponentially weighted
+average of each model's per-call overhead and seconds per output token,
+starting from conservative priors. One call in ROUTER_EXPLORE_EVERY goes to
+the model the policy did not pick, so a model that lost the routing after a
+few slow calls keeps being measured and can win it back.
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+
+# Actions whose output benefits from the stronger model
+HEAVY_ACTIONS = ("getSummary", "checkAnswers")
+# Any call with more input than this is treated as heavy
+LARGE_INPUT_TOKENS = int(os.environ.get("ROUTER_LARGE_INPUT_TOKENS", "20000"))
+
+# Seconds a call may take before the large model is not worth waiting for
+DEFAULT_SLO_SECONDS = {
+    "getKeywords": 3.0,
+    "search": 3.0,
+    "checkAnswer": 8.0,
+    "getQuestions": 20.0,
+    "getFlashCards": 20.0,
+    "checkAnswers": 45.0,
+    "getSummary": 60.0,
+}
+FALLBACK_SLO_SECONDS = 20.0
+
+# Weight of the newest measurement in the moving averages
+EWMA_ALPHA = 0.2
+# (overhead seconds, seconds per output token) assumed before a model is measured
+PRIOR_FAST = (0.5, 0.008)
+PRIOR_LARGE = (1.5, 0.015)
+# Every Nth call goes to the other model to keep its estimate current (0: never)
+ROUTER_EXPLORE_EVERY = int(os.environ.get("ROUTER_EXPLORE_EVERY", "20"))
+
+
+class _LatencyModel:
+    """Moving averages of one model's call overhead and output speed."""
+
+    def __init__(self, prior):
+        self.overhead, self.seconds_per_token = prior
+        self.calls = 0
+
+    def predict(self, output_tokens: int) -> float:
+        return self.overhead + self.seconds_per_token * output_tokens
+
+    def observe(self, seconds: float, output_tokens: int):
+        # Attribute the time to overhead and generation in the current ratio,
+        # then move each average towards its share
+        predicted = self.predict(output_tokens) or seconds
+        overhead = seconds * self.overhead / predicted
+        per_token = (seconds - overhead) / output_tokens if output_tokens else self.seconds_per_token
+        self.overhead += EWMA_ALPHA * (overhead - self.overhead)
+        self.seconds_per_token += EWMA_ALPHA * (per_token - self.seconds_per_token)
+        self.calls += 1
+
+
+class ModelRouter:
+    """Chooses a model ID per Bedrock call and learns from the measured latency."""
+
+    def __init__(self, fast_model: str, large_model: str, slo_seconds: Optional[Dict[str, float]] = None,
+                 explore_every: int = ROUTER_EXPLORE_EVERY):
+        self.fast_model = fast_model
+        self.large_model = large_model
+        self.slo_seconds = dict(DEFAULT_SLO_SECONDS, **(slo_seconds or {}))
+        self.explore_every = explore_every
+        self._choices = 0
+        self._lock = threading.Lock()
+        self._models = {fast_model: _LatencyModel(PRIOR_FAST)}
+        if large_model != fast_model:
+            self._models[large_model] = _LatencyModel(PRIOR_LARGE)
+
+    def predict(self, model_id: str, output_tokens: int) -> float:
+        """Expected seconds for a call to model_id producing output_tokens."""
+        with self._lock:
+            return self._models[model_id].predict(output_tokens)
+
+    def choose(self, action: Optional[str], input_tokens: int, max_tokens: int, explore: bool = True) -> str:
+        """
+        The model ID to use for one call. With explore=False (a lookup, not a
+        call) the policy's pick is returned and no exploration call is counted.
+        """
+        if self.large_model == self.fast_model:
+            return self.fast_model
+        chosen = self._policy(action, input_tokens, max_tokens)
+        if explore and self.explore_every > 0:
+            with self._lock:
+                self._choices += 1
+                exploring = self._choices % self.explore_every == 0
+            if exploring:
+                return self.large_model if chosen == self.fast_model else self.fast_model
+        return chosen
+
+    def _policy(self, action: Optional[str], input_tokens: int, max_tokens: int) -> str:
+        # max_tokens is sized to the expected reply, so it doubles as the estimate
+        fast = self.predict(self.fast_model, max_tokens)
+        large = self.predict(self.large_model, max_tokens)
+        if action in HEAVY_ACTIONS or input_tokens > LARGE_INPUT_TOKENS:
+            slo = self.slo_seconds.get(action, FALLBACK_SLO_SECONDS)
+            if large <= slo or large <= fast:
+                return self.large_model
+        return self.fast_model if fast <= large else self.large_model
+
+    def observe(self, model_id: str, seconds: float, output_tokens: int):
+        """Record the latency of a finished call."""
+        with self._lock:
+            latency = self._models.get(model_id)
+            if latency is not None:
+                latency.observe(seconds, output_tokens)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "fast_model": self.fast_model,
+                "large_model": self.large_model,
+                "slo_seconds": dict(self.slo_seconds),
+                "models": {
+                    model_id: {
+                        "calls": latency.calls,
+                        "overhead_seconds": round(latency.overhead, 3),
+                        "seconds_per_output_token": round(latency.seconds_per_token, 5),
+                    }
+                    for model_id, latency in self._models.items()
+                },
+            }
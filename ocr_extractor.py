@@ -0,0 +1,179 @@
+"""
+OCR fallback for image-only PDF pages.
+
+Scanned handouts have no text layer, so pdfplumber and PyPDF2 both return
+nothing for them. This module renders just those pages and runs them through a
+locally installed Tesseract binary from a bounded thread pool. Pages are
+rendered one at a time (PDFium, which renders them, is not thread-safe), and
+each page's time limit covers its render and its tesseract process, which is
+killed when the limit runs out. The whole batch has one deadline. Results are cached by page fingerprint, resolution and
+language under ~/Documents/.ai_helper/ocr_cache, so the same page is never
+OCR'd twice with the same settings.
+
+Requires the `tesseract` executable on PATH (e.g. `brew install tesseract`).
+Set PDF_OCR=off to disable the fallback entirely.
+"""
+
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+OCR_MODE = os.environ.get("PDF_OCR", "auto").lower()
+OCR_WORKERS = int(os.environ.get("PDF_OCR_WORKERS", "2"))
+OCR_PAGE_TIMEOUT = float(os.environ.get("PDF_OCR_PAGE_TIMEOUT", "60"))
+# Deadline for a whole document's OCR, however many pages are queued
+OCR_TOTAL_TIMEOUT = float(os.environ.get("PDF_OCR_TOTAL_TIMEOUT", "300"))
+OCR_RESOLUTION = int(os.environ.get("PDF_OCR_RESOLUTION", "300"))
+OCR_LANGUAGE = os.environ.get("PDF_OCR_LANGUAGE", "eng")
+OCR_CACHE_DIR = os.environ.get(
+    "OCR_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), "Documents", ".ai_helper", "ocr_cache"),
+)
+
+
+def ocr_available() -> bool:
+    """True if OCR is enabled and a Tesseract binary is installed."""
+    return OCR_MODE != "off" and shutil.which("tesseract") is not None
+
+
+# pdfplumber renders through pypdfium2, and PDFium must not be entered from
+# two threads at once
+_render_lock = threading.Lock()
+
+
+def render_page(file_path: str, page_index: int):
+    """Render one PDF page to a PIL image at OCR_RESOLUTION, one page at a time."""
+    import pdfplumber
+
+    with _render_lock:
+        with pdfplumber.open(file_path) as pdf:
+            return pdf.pages[page_index].to_image(resolution=OCR_RESOLUTION).original
+
+
+def tesseract_page(file_path: str, page_index: int, timeout: float) -> str:
+    """
+    Render one PDF page and OCR it with the tesseract CLI.
+
+    Runs in a pool thread. timeout covers the render too; tesseract gets what
+    is left, and its subprocess timeout kills it if it gets stuck.
+    """
+    started = time.monotonic()
+    image = render_page(file_path, page_index)
+    remaining = timeout - (time.monotonic() - started)
+    if remaining <= 0:
+        raise TimeoutError(f"rendering page {page_index + 1} used up its {timeout:.0f}s")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_path = os.path.join(tmp_dir, "page.png")
+        image.save(image_path)
+        result = subprocess.run(
+            ["tesseract", image_path, "stdout", "-l", OCR_LANGUAGE],
+            capture_output=True,
+            text=True,
+            timeout=remaining,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"tesseract exited with {result.returncode}")
+    return result.stdout.strip()
+
+
+def _cache_path(fingerprint: str, cache_dir: Optional[str]) -> str:
+    # Text OCR'd at another resolution or in another language is not reused
+    return os.path.join(cache_dir or OCR_CACHE_DIR, f"{fingerprint}-{OCR_RESOLUTION}dpi-{OCR_LANGUAGE}.txt")
+
+
+def _read_cache(fingerprint: str, cache_dir: Optional[str]) -> Optional[str]:
+    try:
+        with open(_cache_path(fingerprint, cache_dir), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_cache(fingerprint: str, text: str, cache_dir: Optional[str]):
+    cache_file = _cache_path(fingerprint, cache_dir)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_file, cache_file)
+
+
+def ocr_pdf_pages(
+    file_path: str,
+    page_indices: List[int],
+    fingerprints: List[str],
+    workers: int = OCR_WORKERS,
+    timeout: float = OCR_PAGE_TIMEOUT,
+    total_timeout: float = OCR_TOTAL_TIMEOUT,
+    cache_dir: Optional[str] = None,
+    engine: Callable[[str, int, float], str] = tesseract_page,
+) -> Dict[int, str]:
+    """
+    OCR the given pages of a PDF, consulting the page-hash cache first.
+
+    Args:
+        file_path: Path to the PDF file
+        page_indices: 0-based pages to OCR (normally those with no text layer)
+        fingerprints: Page fingerprints from pdf_extractor.pdf_page_fingerprints
+        workers: Size of the OCR thread pool
+        timeout: Seconds allowed per page before it is given up on
+        total_timeout: Seconds allowed for all the pages together
+        cache_dir: Cache directory (defaults to OCR_CACHE_DIR)
+        engine: Function (file_path, page_index, timeout) -> text, run in the pool
+
+    Returns:
+        {page_index: text} for every page that produced text. Pages that time
+        out or fail are left out (and not cached, so they are retried later).
+    """
+    results = {}
+    to_run = []
+    for i in page_indices:
+        cached = _read_cache(fingerprints[i], cache_dir)
+        if cached is not None:
+            results[i] = cached
+        else:
+            to_run.append(i)
+
+    if not to_run:
+        return {i: text for i, text in results.items() if text}
+
+    print(f"🔎 Running OCR on {len(to_run)} image-only page(s) of {os.path.basename(file_path)}")
+    workers = max(1, min(workers, len(to_run)))
+    # Queued pages count against the same deadline as running ones
+    deadline = time.monotonic() + min(total_timeout, timeout * math.ceil(len(to_run) / workers))
+
+    def run_page(i: int) -> str:
+        # A page started late gets only what is left before the deadline
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("deadline passed before the page started")
+        return engine(file_path, i, min(timeout, remaining))
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+    try:
+        futures = {i: pool.submit(run_page, i) for i in to_run}
+        wait(futures.values(), timeout=max(0.0, deadline - time.monotonic()))
+        for i, future in futures.items():
+            if not future.done():
+                print(f"⚠️ OCR timed out on page {i+1}")
+                continue
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"⚠️ OCR failed on page {i+1}: {e}")
+                continue
+            _write_cache(fingerprints[i], text, cache_dir)
+            results[i] = text
+    finally:
+        # Queued pages are dropped; running tesseract processes are killed by
+        # their own timeout, which never reaches past the deadline
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return {i: text for i, text in results.items() if text}
@@ -1,7 +1,98 @@
+import hashlib
 import os
-import pdfplumber
 import PyPDF2
-from typing import Optional
+from typing import List, Optional
+
+import tracing
+from ocr_extractor import ocr_available, ocr_pdf_pages
+from text_normalizer import normalize_text
+
+# Plain extractions (the CLI, get_pdf_summary) keep a per-page manifest under
+# ~/Documents/.ai_helper/page_cache so re-extracting an edited file only reads
+# its changed pages. Set PDF_PAGE_CACHE=false (or pass --no-page-cache) to
+# extract without reading or writing it.
+PDF_PAGE_CACHE = os.environ.get("PDF_PAGE_CACHE", "true").lower() != "false"
+
+def _stream_bytes(obj) -> bytes:
+    """Raw (still encoded) bytes of a PDF stream object, b'' for non-streams."""
+    obj = obj.get_object()
+    data = getattr(obj, '_data', None)
+    return data if isinstance(data, bytes) else b''
+
+@tracing.traced("pdf.fingerprints")
+def pdf_page_fingerprints(file_path: str) -> List[str]:
+    """
+    Fingerprint every page of a PDF without extracting any text.
+
+    A page's fingerprint is a SHA-256 over its raw content stream plus the raw
+    bytes of the images/forms it draws, so an edit to one page changes only
+    that page's fingerprint.
+
+    Args:
+        file_path: Path to the PDF file
+
+    Returns:
+        One hex digest per page, in page order
+    """
+    fingerprints = []
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page in pdf_reader.pages:
+            digest = hashlib.sha256()
+            contents = page.get('/Contents')
+            if contents is not None:
+                contents = contents.get_object()
+                streams = contents if isinstance(contents, PyPDF2.generic.ArrayObject) else [contents]
+                for stream in streams:
+                    digest.update(_stream_bytes(stream))
+
+            resources = page.get('/Resources')
+            xobjects = resources.get_object().get('/XObject') if resources else None
+            if xobjects:
+                for name, xobject in sorted(xobjects.get_object().items()):
+                    digest.update(name.encode('utf-8'))
+                    digest.update(_stream_bytes(xobject))
+
+            fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+@tracing.traced("pdf.ocr_empty_pages")
+def ocr_empty_pages(file_path: str, page_texts: Optional[List[str]], max_pages: Optional[int] = 10,
+                    fingerprints: Optional[List[str]] = None) -> Optional[List[str]]:
+    """
+    Fill pages that have no text layer with OCR output, when OCR is available.
+
+    Args:
+        file_path: Path to the PDF file
+        page_texts: Extracted text of each page ('' for pages without a text
+            layer; None if no page had text)
+        max_pages: Page limit that was used for extraction
+        fingerprints: Page fingerprints, computed here if not supplied
+
+    Returns:
+        Page texts with image-only pages filled in where OCR succeeded
+    """
+    if not ocr_available():
+        return page_texts
+    if page_texts is not None and all(page_texts):
+        return page_texts
+
+    if fingerprints is None:
+        fingerprints = pdf_page_fingerprints(file_path)
+    if max_pages is not None:
+        fingerprints = fingerprints[:max_pages]
+    if page_texts is None:
+        page_texts = [""] * len(fingerprints)
+
+    empty_pages = [i for i, text in enumerate(page_texts) if not text]
+    ocr_texts = ocr_pdf_pages(file_path, empty_pages, fingerprints)
+    return [ocr_texts.get(i, text) for i, text in enumerate(page_texts)]
+
+def format_pdf_pages(page_texts: List[str]) -> str:
+    """Join page texts with the '--- Page N ---' markers, skipping empty pages."""
+    return "\n\n".join(
+        f"--- Page {i+1} ---\n{text}" for i, text in enumerate(page_texts) if text
+    )
 
 def extract_text_from_pdf(file_path: str, max_pages: int = 10) -> Optional[str]:
     """
@@ -23,51 +114,22 @@ def extract_text_from_pdf(file_path: str, max_pages: int = 10) -> Optional[str]:
         return None
     
     try:
-        # Method 1: Try pdfplumber first (better for complex layouts)
         print(f"📄 Extracting text from PDF: {os.path.basename(file_path)}")
         
-        with pdfplumber.open(file_path) as pdf:
-            text_content = []
-            pages_to_extract = min(len(pdf.pages), max_pages)
-            
-            for i, page in enumerate(pdf.pages[:pages_to_extract]):
-                try:
-                    page_text = page.extract_text()
-                    if page_text and page_text.strip():
-                        text_content.append(f"--- Page {i+1} ---\n{page_text.strip()}")
-                except Exception as e:
-                    print(f"⚠️ Error extracting page {i+1}: {e}")
-                    continue
+        with tracing.span("pdf.extract_text", bytes=os.path.getsize(file_path), max_pages=max_pages) as pdf_span:
+            # Pages unchanged since this file was last extracted are reused
+            # (see PDF_PAGE_CACHE); pages without a text layer (scanned
+            # handouts) are OCRed
+            from incremental_extractor import extract_pdf_incremental
+            extraction = extract_pdf_incremental(file_path, max_pages, use_cache=PDF_PAGE_CACHE)
+            page_texts = extraction["pages"]
+            pdf_span.set(extracted_pages=extraction["extracted_pages"])
+            if page_texts and any(page_texts):
+                text = format_pdf_pages(page_texts)
+                pdf_span.set(pages=len(page_texts), chars=len(text))
+                return text
             
-            if text_content:
-                full_text = "\n\n".join(text_content)
-                print(f"✅ Successfully extracted {len(text_content)} pages using pdfplumber")
-                return full_text
-        
-        # Method 2: Fallback to PyPDF2 if pdfplumber fails
-        print("🔄 Trying PyPDF2 as fallback...")
-        
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text_content = []
-            pages_to_extract = min(len(pdf_reader.pages), max_pages)
-            
-            for i in range(pages_to_extract):
-                try:
-                    page = pdf_reader.pages[i]
-                    page_text = page.extract_text()
-                    if page_text and page_text.strip():
-                        text_content.append(f"--- Page {i+1} ---\n{page_text.strip()}")
-                except Exception as e:
-                    print(f"⚠️ Error extracting page {i+1} with PyPDF2: {e}")
-                    continue
-            
-            if text_content:
-                full_text = "\n\n".join(text_content)
-                print(f"✅ Successfully extracted {len(text_content)} pages using PyPDF2")
-                return full_text
-        
-        print("❌ Failed to extract text from PDF using both methods")
+        print("❌ Failed to extract text from PDF using all methods")
         return None
         
     except Exception as e:
@@ -90,8 +152,9 @@ def get_pdf_summary(file_path: str, max_chars: int = 2000) -> str:
     if not full_text:
         return f"Could not extract text from PDF: {os.path.basename(file_path)}"
     
-    # Clean up the text
-    cleaned_text = full_text.replace('\n\n\n', '\n\n').strip()
+    # Clean up the text: drop running headers/footers, page numbers and
+    # hyphenation breaks so the character budget goes to real content
+    cleaned_text, _ = normalize_text(full_text)
     
     # Truncate if too long
     if len(cleaned_text) > max_chars:
@@ -108,14 +171,38 @@ def get_pdf_summary(file_path: str, max_chars: int = 2000) -> str:
 if __name__ == "__main__":
     import sys
     
+    if len(sys.argv) > 1 and sys.argv[1] == "--bulk":
+        # Bulk mode: directories/globs in, one JSONL record per document out
+        from bulk_extractor import main as bulk_main
+        sys.exit(bulk_main(sys.argv[2:]))
+
+    if "--no-page-cache" in sys.argv:
+        sys.argv.remove("--no-page-cache")
+        PDF_PAGE_CACHE = False
+
+    # --profile: record a CPU and allocation profile of this extraction
+    profile = None
+    if "--profile" in sys.argv:
+        sys.argv.remove("--profile")
+        import profiling
+        profile = profiling.Profile("pdf_extractor " + " ".join(sys.argv[1:])).start()
+
     if len(sys.argv) < 2:
-        print("Usage: python3 pdf_extractor.py <file_path> [max_pages] [max_chars]")
+        print("Usage: python3 pdf_extractor.py [--profile] [--no-page-cache] <file_path> [max_pages] [max_chars]")
+        print("       python3 pdf_extractor.py --bulk <dir|glob|file>... [-o out.jsonl] [-j workers]")
         sys.exit(1)
     
     file_path = sys.argv[1]
     max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 10
     max_chars = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
     
-    # Extract text and print to stdout
-    result = get_pdf_summary(file_path, max_chars)
+    # Extract text and print to stdout. Spans carry the caller's request ID
+    # (TRACE_REQUEST_ID) when the extractor runs on behalf of a request.
+    tracing.start_trace(os.environ.get("TRACE_REQUEST_ID"))
+    with tracing.span("pdf_extractor.cli", max_pages=max_pages, max_chars=max_chars):
+        result = get_pdf_summary(file_path, max_chars)
+    if profile is not None:
+        # stderr, since stdout carries the extracted text
+        summary = profile.stop()
+        print(f"📈 Profile saved: {os.path.join(profiling.PROFILE_DIR, summary['id'])}.prof", file=sys.stderr)
     print(result)
@@ -0,0 +1,187 @@
+"""
+On-demand profiling of single requests.
+
+A request asks to be profiled with the X-Profile: 1 header (or ?profile=1)
+and proves it may with X-Profile-Token matching PROFILE_TOKEN. Profiling is
+off entirely unless PROFILE_TOKEN is set, and at most PROFILE_MAX_PER_MINUTE
+requests per process are profiled, one at a time, so the switch can stay
+enabled in production.
+
+A profile records, for that request only:
+- a cProfile CPU profile of the thread serving it (saved as <id>.prof for
+  pstats/snakeviz, with the top functions in the summary),
+- tracemalloc allocation stats: peak traced memory and the source lines that
+  allocated the most while it ran. tracemalloc is process-wide, so
+  allocations by other threads in that window are included.
+
+Profiles are stored under PROFILE_DIR as <id>.prof and <id>.json (the newest
+PROFILE_KEEP are kept); the response carries the id in X-Profile-Id.
+"""
+
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get(
+    "PROFILE_DIR",
+    os.path.join(os.path.expanduser("~"), "Documents", ".ai_helper", "profiles"),
+)
+PROFILE_MAX_PER_MINUTE = int(os.environ.get("PROFILE_MAX_PER_MINUTE", "2"))
+PROFILE_KEEP = 50
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 15
+
+# Why a profile was not taken (reported in X-Profile-Status)
+UNAUTHORIZED, RATE_LIMITED, BUSY = "unauthorized", "rate-limited", "busy"
+
+_lock = threading.Lock()
+_recent = deque()
+_active = False
+
+
+def authorized(token: Optional[str]) -> bool:
+    """Whether token is the configured PROFILE_TOKEN (never, when none is configured)."""
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode()))
+
+
+def admit(token: Optional[str]) -> Optional[str]:
+    """
+    Reserve the profiler for one request.
+
+    Returns None if the request may be profiled (Profile.stop() releases the
+    profiler), otherwise the reason it may not.
+    """
+    global _active
+    if not authorized(token):
+        return UNAUTHORIZED
+    with _lock:
+        now = time.monotonic()
+        while _recent and now - _recent[0] > 60:
+            _recent.popleft()
+        if _active:
+            return BUSY
+        if len(_recent) >= PROFILE_MAX_PER_MINUTE:
+            return RATE_LIMITED
+        _recent.append(now)
+        _active = True
+    return None
+
+
+def _release():
+    global _active
+    with _lock:
+        _active = False
+
+
+class Profile:
+    """CPU and allocation profile of one request or command. Use start() then stop()."""
+
+    def __init__(self, label: str, request_id: Optional[str] = None):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.label = label
+        self.request_id = request_id
+        self._profiler = cProfile.Profile()
+        self._started_tracemalloc = False
+
+    def start(self) -> "Profile":
+        try:
+            # Raises ValueError if another profiler (e.g. a debugger) is active
+            self._profiler.enable()
+            self._profiler.disable()
+        except ValueError:
+            _release()
+            raise
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        elif hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._profiler.enable()
+        return self
+
+    def stop(self, directory: Optional[str] = None) -> Dict:
+        """Stop profiling, save the profile and return its summary."""
+        try:
+            self._profiler.disable()
+            wall_ms = (time.perf_counter() - self._wall) * 1000
+            cpu_ms = (time.process_time() - self._cpu) * 1000
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        finally:
+            _release()
+
+        summary = {
+            "id": self.id,
+            "label": self.label,
+            "request_id": self.request_id,
+            "wall_ms": round(wall_ms, 2),
+            "cpu_ms": round(cpu_ms, 2),
+            "top_functions": self._top_functions(),
+            "allocations": {"peak_bytes": peak, "top": self._top_allocations(after)},
+        }
+        self._save(summary, directory or PROFILE_DIR)
+        return summary
+
+    def _top_functions(self) -> List[Dict]:
+        stats = pstats.Stats(self._profiler).stats
+        rows = sorted(stats.items(), key=lambda item: -item[1][3])[:TOP_FUNCTIONS]
+        return [
+            {
+                "function": f"{os.path.basename(filename)}:{line}({name})",
+                "calls": calls,
+                "self_ms": round(self_time * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }
+            for (filename, line, name), (_, calls, self_time, cumulative, _) in rows
+        ]
+
+    def _top_allocations(self, after) -> List[Dict]:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        differences = after.filter_traces(ignore).compare_to(self._before.filter_traces(ignore), "lineno")
+        return [
+            {"where": f"{frame.filename}:{frame.lineno}", "bytes": diff.size_diff, "count": diff.count_diff}
+            for diff in differences[:TOP_ALLOCATIONS]
+            for frame in diff.traceback[:1]
+        ]
+
+    def _save(self, summary: Dict, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self._profiler.dump_stats(os.path.join(directory, f"{self.id}.prof"))
+        summary_file = os.path.join(directory, f"{self.id}.json")
+        tmp_file = summary_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        os.replace(tmp_file, summary_file)
+        # Keep the newest PROFILE_KEEP profiles
+        saved = sorted(name[:-5] for name in os.listdir(directory) if name.endswith(".json"))
+        for old in saved[:-PROFILE_KEEP]:
+            for extension in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(directory, old + extension))
+                except OSError:
+                    pass
+
+
+def load_summary(profile_id: str, directory: Optional[str] = None) -> Optional[Dict]:
+    """A stored profile summary, or None. Only ids as generated by Profile are accepted."""
+    if not profile_id or not all(c.isalnum() or c == "-" for c in profile_id):
+        return None
+    try:
+        with open(os.path.join(directory or PROFILE_DIR, f"{profile_id}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,331 @@
+"""
+Per-document question and flashcard banks with near-duplicate filtering.
+
+Each document section of the notes (see summary_cache.split_documents) gets a
+bank keyed by a hash of its content and the requested topic, stored as JSON
+under ~/Documents/.ai_helper/question_bank. A bank holds unserved questions
+and flashcards plus the MinHash signatures of everything already served.
+
+getQuestions/getFlashCards are answered from the banks when they hold enough
+unserved items. Banks that run low are refilled in a background thread, one
+document at a time. New items whose word shingles are too similar (estimated
+Jaccard >= NEAR_DUPLICATE_THRESHOLD) to anything already banked or served are
+dropped, so the same question does not come back reworded. Only the last
+SEEN_LIMIT served signatures per document are remembered, so a document whose
+material has been exhausted starts over instead of serving nothing.
+
+serve.py runs several worker processes over the same bank files, so every
+load-modify-save of a bank holds an exclusive lock on its <key>.lock file
+(fcntl.flock) as well as the in-process lock.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import tracing
+from summary_cache import split_documents
+
+try:
+    import fcntl
+except ImportError:  # optional: without it (Windows) banks are only locked within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+QUESTION_BANK_DIR = os.environ.get(
+    "QUESTION_BANK_DIR",
+    os.path.join(os.path.expanduser("~"), "Documents", ".ai_helper", "question_bank"),
+)
+# Refill a document's bank when fewer unserved items than this are left
+BANK_LOW_WATER = int(os.environ.get("QUESTION_BANK_LOW_WATER", "10"))
+BANK_REFILL_SIZE = {"questions": 10, "flashcards": 20}
+KINDS = ("questions", "flashcards")
+# Served signatures remembered per document and kind (oldest are forgotten)
+SEEN_LIMIT = int(os.environ.get("QUESTION_BANK_SEEN_LIMIT", "200"))
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+NEAR_DUPLICATE_THRESHOLD = 0.5
+
+_WORD = re.compile(r"[^\W_]+")
+_PRIME = (1 << 61) - 1
+_rng = random.Random(332)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+Item = Union[str, Dict[str, str]]
+# generate(kind, document_text, count, query) -> new items
+Generator = Callable[[str, str, int, str], List[Item]]
+
+
+# --- MinHash ---
+
+def shingles(text: str) -> set:
+    """Word SHINGLE_SIZE-grams of the case-folded text (the whole text if shorter)."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str) -> List[int]:
+    """MinHash signature over the text's shingles."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for shingle in shingles(text)
+    ]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(first: List[int], second: List[int]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERMUTATIONS
+
+
+def item_text(item: Item) -> str:
+    """The part of an item compared for duplicates (a flashcard's question)."""
+    return item["question"] if isinstance(item, dict) else item
+
+
+def drop_near_duplicates(items: List[Item], signatures: Optional[List[List[int]]] = None) -> List[Item]:
+    """
+    The items that are not near-duplicates of an earlier item or of the given
+    signatures. The kept items' signatures are appended to signatures.
+    """
+    signatures = [] if signatures is None else signatures
+    kept = []
+    for item in items:
+        signature = minhash(item_text(item))
+        if not any(similarity(signature, other) >= NEAR_DUPLICATE_THRESHOLD for other in signatures):
+            signatures.append(signature)
+            kept.append(item)
+    return kept
+
+
+# --- Banks ---
+
+class QuestionBank:
+    """Document banks on disk, with a background refill worker."""
+
+    def __init__(self, generate: Generator, bank_dir: Optional[str] = None, workers: int = 1):
+        self.generate = generate
+        self.bank_dir = bank_dir
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bank-refill")
+        self._refilling: Dict[Tuple[str, str], Future] = {}
+
+    # Storage
+
+    @staticmethod
+    def bank_key(document_text: str, query: str) -> str:
+        return hashlib.sha256(f"{query or ''}\x00{document_text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.bank_dir or QUESTION_BANK_DIR, f"{key}.json")
+
+    def _load(self, key: str) -> Dict:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            bank = {kind: [] for kind in KINDS}
+            bank["seen"] = {kind: [] for kind in KINDS}
+            return bank
+
+    @contextmanager
+    def _locked(self, keys: Iterable[str]):
+        """Hold the in-process lock and the lock files of the given banks (in key order)."""
+        with self._lock, ExitStack() as stack:
+            if fcntl is not None:
+                for key in sorted(set(keys)):
+                    lock_file = self._path(key)[:-len(".json")] + ".lock"
+                    os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+                    handle = stack.enter_context(open(lock_file, "a"))
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def _save(self, key: str, bank: Dict):
+        bank_file = self._path(key)
+        os.makedirs(os.path.dirname(bank_file), exist_ok=True)
+        tmp_file = bank_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(bank, f)
+        os.replace(tmp_file, bank_file)
+
+    def documents(self, notes_content: str, query: str) -> List[Tuple[str, str]]:
+        """(bank key, document text) for each document section of the notes."""
+        documents = []
+        for title, body in split_documents(notes_content):
+            if body.strip():
+                text = f"=== {title} ===\n{body}" if title else body
+                documents.append((self.bank_key(body, query), text))
+        return documents
+
+    @staticmethod
+    def _remember(bank: Dict, kind: str, signature: List[int]):
+        seen = bank["seen"][kind]
+        seen.append(signature)
+        del seen[:-SEEN_LIMIT]
+
+    @staticmethod
+    def _is_near_duplicate(signature: List[int], signatures: List[List[int]]) -> bool:
+        return any(similarity(signature, other) >= NEAR_DUPLICATE_THRESHOLD for other in signatures)
+
+    def _accept(self, bank: Dict, kind: str, items: List[Item]) -> List[Dict]:
+        """Bank entries for the items that duplicate nothing banked, served, or earlier in the list."""
+        known = [entry["sig"] for entry in bank[kind]] + bank["seen"][kind]
+        accepted = []
+        for item in items:
+            signature = minhash(item_text(item))
+            if not self._is_near_duplicate(signature, known):
+                known.append(signature)
+                accepted.append({"item": item, "sig": signature})
+        return accepted
+
+    # Serving
+
+    def take(self, kind: str, notes_content: str, count: int, query: str = "") -> Optional[List[Item]]:
+        """
+        Serve count unserved items drawn round-robin from the documents' banks.
+
+        Returns None (serving nothing) if the banks don't hold enough; the
+        caller then generates items itself and passes them to record_served.
+        After serving, banks that are running low are queued for a background
+        refill.
+        """
+        documents = self.documents(notes_content, query)
+        if not documents:
+            return None
+        with self._locked(key for key, _ in documents):
+            banks = {key: self._load(key) for key, _ in documents}
+            available = sum(len(banks[key][kind]) for key, _ in documents)
+            if available < count:
+                return None
+            served = []
+            while len(served) < count:
+                for key, _ in documents:
+                    if banks[key][kind] and len(served) < count:
+                        entry = banks[key][kind].pop(0)
+                        self._remember(banks[key], kind, entry["sig"])
+                        served.append(entry["item"])
+            for key, _ in documents:
+                self._save(key, banks[key])
+        self._refill_low_banks(kind, documents, banks, query)
+        return served
+
+    def take_unserved(self, kind: str, notes_content: str, items: List[Item], count: int,
+                      query: str = "") -> Optional[List[Item]]:
+        """
+        Serve count of the given items (an ingest-time starter set) that are
+        not near-duplicates of anything served from the documents before.
+
+        Returns None (serving nothing) if fewer than count are left, so a
+        starter set is served once and later requests go to the banks.
+        """
+        documents = self.documents(notes_content, query)
+        if not documents:
+            return None
+        with self._locked(key for key, _ in documents):
+            banks = {key: self._load(key) for key, _ in documents}
+            known = [sig for bank in banks.values() for sig in bank["seen"][kind]]
+            served, signatures = [], []
+            for item in items:
+                signature = minhash(item_text(item))
+                if not self._is_near_duplicate(signature, known):
+                    known.append(signature)
+                    served.append(item)
+                    signatures.append(signature)
+                if len(served) == count:
+                    break
+            if len(served) < count:
+                return None
+            for key, bank in banks.items():
+                for signature in signatures:
+                    self._remember(bank, kind, signature)
+                self._save(key, bank)
+        return served
+
+    def record_served(self, kind: str, notes_content: str, items: List[Item], query: str = "") -> List[Item]:
+        """
+        Filter freshly generated items against everything the documents' banks
+        have banked or served, and remember the survivors as served.
+        """
+        documents = self.documents(notes_content, query)
+        with self._locked(key for key, _ in documents):
+            banks = {key: self._load(key) for key, _ in documents}
+            known = [entry["sig"] for bank in banks.values() for entry in bank[kind]]
+            known += [sig for bank in banks.values() for sig in bank["seen"][kind]]
+            fresh = []
+            for item in items:
+                signature = minhash(item_text(item))
+                if self._is_near_duplicate(signature, known):
+                    continue
+                known.append(signature)
+                fresh.append(item)
+                for bank in banks.values():
+                    self._remember(bank, kind, signature)
+            for key, bank in banks.items():
+                self._save(key, bank)
+        # Refill only now, so the new batch is filtered against what was just served
+        self._refill_low_banks(kind, documents, banks, query)
+        return fresh
+
+    def _refill_low_banks(self, kind: str, documents: List[Tuple[str, str]], banks: Dict, query: str):
+        for key, text in documents:
+            if len(banks[key][kind]) < BANK_LOW_WATER:
+                self.schedule_refill(kind, key, text, query)
+
+    # Refilling
+
+    def refill(self, kind: str, key: str, document_text: str, query: str = "") -> int:
+        """Generate a batch for one document's bank. Returns how many items were kept."""
+        with tracing.span("question_bank.refill", kind=kind) as refill_span:
+            items = self.generate(kind, document_text, BANK_REFILL_SIZE[kind], query)
+            with self._locked([key]):
+                bank = self._load(key)
+                accepted = self._accept(bank, kind, items)
+                bank[kind].extend(accepted)
+                self._save(key, bank)
+            refill_span.set(generated=len(items), kept=len(accepted))
+        logger.info("Banked %d of %d new %s (%d near-duplicates)",
+                    len(accepted), len(items), kind, len(items) - len(accepted))
+        return len(accepted)
+
+    def schedule_refill(self, kind: str, key: str, document_text: str, query: str = "") -> Future:
+        """Queue a background refill, unless one is already pending for the bank."""
+        with self._lock:
+            pending = self._refilling.get((kind, key))
+            if pending is not None and not pending.done():
+                return pending
+            future = self._pool.submit(self._safe_refill, kind, key, document_text, query)
+            self._refilling[(kind, key)] = future
+            return future
+
+    def _safe_refill(self, kind: str, key: str, document_text: str, query: str) -> int:
+        try:
+            return self.refill(kind, key, document_text, query)
+        except Exception:
+            logger.exception("Question bank refill failed")
+            return 0
+
+    def drain(self):
+        """Wait for every queued refill to finish."""
+        with self._lock:
+            pending = list(self._refilling.values())
+        for future in pending:
+            future.result()
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def unserved(self, kind: str, notes_content: str, query: str = "") -> int:
+        """Number of unserved items banked for the notes' documents."""
+        with self._lock:
+            return sum(len(self._load(key)[kind]) for key, _ in self.documents(notes_content, query))
@@ -0,0 +1,360 @@
+"""
+Positional full-text index over the notes for the search action.
+
+The notes are split into their '=== Title ===' documents and every word is
+indexed with its position and character offsets, once per notes content: the
+index is cached by a hash of the notes (the last INDEX_CACHE_SIZE), so the
+repeated searches of a study session over the same selection reuse it.
+
+A query is free words plus optional "quoted phrases". Documents must contain
+every phrase; the free words then only add to the ranking, and are required
+(at least one of them) only when there is no phrase. Documents are ranked with
+BM25 (a phrase counts as one term). Each result carries a snippet of about
+SNIPPET_CHARS around the passage where the most distinct query terms are
+closest together, wherever in the document it is, with the offsets of every
+match inside the snippet.
+
+Queries tolerate typos: a query word that is not in the notes matches the
+words within a small edit distance of it ("technqiues" finds "techniques").
+Candidates come from a character-trigram index of the notes' vocabulary
+(built on the first miss) and are verified with a bounded edit distance, so
+correctly spelled queries cost nothing extra and misspelled ones only look at
+words sharing trigrams with them. Fuzzy matches score FUZZY_WEIGHT of exact
+ones. match_catalog applies the same matching to the search catalog.
+"""
+
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from summary_cache import iter_documents
+
+INDEX_CACHE_SIZE = 8
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 20
+SNIPPET_CHARS = 300
+# Matches further apart than this many words are not shown in one snippet
+WINDOW_WORDS = 40
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Fuzzy matching: words up to this length must match exactly, longer ones
+# within one edit, and words of LONG_WORD or more characters within two
+EXACT_MAX_LENGTH = 3
+LONG_WORD = 8
+FUZZY_WEIGHT = 0.8
+
+TOKEN = re.compile(r"\w+")
+PHRASE = re.compile(r'"([^"]*)"')
+
+
+def tokenize(text: str) -> List[str]:
+    return [word.lower() for word in TOKEN.findall(text)]
+
+
+def parse_query(query: str) -> Tuple[List[List[str]], List[str]]:
+    """(phrases, words): the quoted phrases as word lists, and the other words."""
+    phrases = [words for words in (tokenize(p) for p in PHRASE.findall(query)) if words]
+    words = list(dict.fromkeys(tokenize(PHRASE.sub(" ", query))))
+    return phrases, words
+
+
+def max_edits(word: str) -> int:
+    """Edits tolerated when matching word: none for short words and numbers."""
+    if len(word) <= EXACT_MAX_LENGTH or any(c.isdigit() for c in word):
+        return 0
+    return 2 if len(word) >= LONG_WORD else 1
+
+
+def trigrams(word: str) -> set:
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Edit distance counting an adjacent transposition as one edit (optimal
+    string alignment), or limit + 1 as soon as it must exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                distance = min(distance, before[j - 2] + 1)
+            current[j] = distance
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+class TrigramIndex:
+    """Character-trigram index of a vocabulary, for approximate word lookup."""
+
+    def __init__(self, words):
+        self.ids = {word: word_id for word_id, word in enumerate(dict.fromkeys(words))}
+        self.words = list(self.ids)
+        self.grams: Dict[str, List[int]] = {}
+        for word_id, word in enumerate(self.words):
+            for gram in trigrams(word):
+                self.grams.setdefault(gram, []).append(word_id)
+
+    def lookup(self, word: str, limit: Optional[int] = None) -> List[str]:
+        """Vocabulary words within limit edits of word (max_edits by default), closest first."""
+        limit = max_edits(word) if limit is None else limit
+        if limit == 0:
+            return [word] if word in self.ids else []
+        grams = trigrams(word)
+        # Each edit changes at most four of a word's trigrams
+        needed = max(1, len(grams) - 4 * limit)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for word_id in self.grams.get(gram, ()):
+                shared[word_id] = shared.get(word_id, 0) + 1
+        matches = []
+        for word_id, count in shared.items():
+            candidate = self.words[word_id]
+            if count >= needed and abs(len(candidate) - len(word)) <= limit:
+                distance = edit_distance(word, candidate, limit)
+                if distance <= limit:
+                    matches.append((distance, candidate))
+        return [candidate for _, candidate in sorted(matches)]
+
+
+class _Document:
+    __slots__ = ("title", "text", "starts", "ends")
+
+    def __init__(self, title: str, text: str):
+        self.title = title
+        self.text = text
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+
+
+class SearchIndex:
+    """Positional inverted index of the documents in one notesContent."""
+
+    def __init__(self, notes_content):
+        self.documents: List[_Document] = []
+        # term -> {document number: [word positions]}
+        self.postings: Dict[str, Dict[int, List[int]]] = {}
+        for title, body in iter_documents(notes_content):
+            if not body.strip():
+                continue
+            doc_id = len(self.documents)
+            document = _Document(title, body)
+            for position, match in enumerate(TOKEN.finditer(body)):
+                document.starts.append(match.start())
+                document.ends.append(match.end())
+                self.postings.setdefault(match.group().lower(), {}).setdefault(doc_id, []).append(position)
+            self.documents.append(document)
+        lengths = [len(d.starts) for d in self.documents]
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        self._trigrams: Optional[TrigramIndex] = None
+
+    def expand(self, word: str) -> List[str]:
+        """The indexed words the query word matches: itself if indexed, else its near misses."""
+        if word in self.postings:
+            return [word]
+        if max_edits(word) == 0:
+            return []
+        if self._trigrams is None:
+            self._trigrams = TrigramIndex(self.postings)
+        return self._trigrams.lookup(word)
+
+    def word_positions(self, word: str) -> Tuple[Dict[int, List[int]], bool]:
+        """Document number -> positions of the word or its near misses, and whether they are exact."""
+        matches = self.expand(word)
+        if matches == [word]:
+            return self.postings[word], True
+        positions: Dict[int, List[int]] = {}
+        for match in matches:
+            for doc_id, doc_positions in self.postings[match].items():
+                positions.setdefault(doc_id, []).extend(doc_positions)
+        return {doc_id: sorted(p) for doc_id, p in positions.items()}, False
+
+    def phrase_positions(self, words: List[str]) -> Dict[int, List[int]]:
+        """Document number -> start positions of the phrase's occurrences."""
+        postings = [self.word_positions(word)[0] for word in words]
+        if not all(postings):
+            return {}
+        found = {}
+        for doc_id in set.intersection(*(set(p) for p in postings)):
+            starts = set(postings[0][doc_id])
+            for offset, word_postings in enumerate(postings[1:], 1):
+                starts &= {position - offset for position in word_postings[doc_id]}
+            if starts:
+                found[doc_id] = sorted(starts)
+        return found
+
+    def _idf(self, document_frequency: int) -> float:
+        n = len(self.documents)
+        return math.log(1 + (n - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K) -> List[Dict]:
+        """
+        The top_k documents for the query, best first. Each result has the
+        document title, its BM25 score, a snippet, the [start, end) offsets of
+        the matches within the snippet, and the snippet's offset in the document.
+        """
+        phrases, words = parse_query(query)
+        # Each term: (number of words it spans, {document number: start positions}, weight)
+        terms = [(len(p), self.phrase_positions(p), 1.0) for p in phrases]
+        required = len(terms)
+        for word in words:
+            positions, exact = self.word_positions(word)
+            terms.append((1, positions, 1.0 if exact else FUZZY_WEIGHT))
+
+        candidates = None
+        for _, positions, _ in terms[:required]:
+            candidates = set(positions) if candidates is None else candidates & set(positions)
+        if candidates is None:
+            candidates = set().union(*(positions for _, positions, _ in terms)) if terms else set()
+
+        scored = []
+        for doc_id in candidates:
+            length = len(self.documents[doc_id].starts)
+            score = 0.0
+            for _, positions, weight in terms:
+                frequency = len(positions.get(doc_id, ()))
+                if frequency:
+                    norm = K1 * (1 - B + B * length / (self.average_length or 1))
+                    score += weight * self._idf(len(positions)) * frequency * (K1 + 1) / (frequency + norm)
+            if score > 0:
+                scored.append((score, doc_id))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+
+        results = []
+        for score, doc_id in scored[:top_k]:
+            matches = sorted(
+                (start, span, term)
+                for term, (span, positions, _) in enumerate(terms)
+                for start in positions.get(doc_id, ())
+            )
+            results.append({"title": self.documents[doc_id].title, "score": round(score, 4),
+                            **self._snippet(self.documents[doc_id], matches)})
+        return results
+
+    def _snippet(self, document: _Document, matches: List[Tuple[int, int, int]]) -> Dict:
+        # The window of at most WINDOW_WORDS words covering the most distinct
+        # terms (then the most matches)
+        best, best_key = (0, 0), (0, 0)
+        counts: Dict[int, int] = {}
+        first = 0
+        for last, (start, span, term) in enumerate(matches):
+            counts[term] = counts.get(term, 0) + 1
+            while start + span - matches[first][0] > WINDOW_WORDS:
+                counts[matches[first][2]] -= 1
+                if not counts[matches[first][2]]:
+                    del counts[matches[first][2]]
+                first += 1
+            key = (len(counts), last - first + 1)
+            if key > best_key:
+                best, best_key = (first, last), key
+        window = matches[best[0]:best[1] + 1]
+
+        text = document.text
+        begin = document.starts[window[0][0]]
+        end = document.ends[max(start + span - 1 for start, span, _ in window)]
+        pad = max(0, SNIPPET_CHARS - (end - begin)) // 2
+        snippet_start, snippet_end = max(0, begin - pad), min(len(text), end + pad)
+        # Don't cut words at the snippet edges
+        if snippet_start > 0:
+            space = text.find(" ", snippet_start, begin)
+            snippet_start = space + 1 if space != -1 else begin
+        if snippet_end < len(text):
+            space = text.rfind(" ", end, snippet_end)
+            snippet_end = space if space != -1 else end
+
+        highlights = []
+        for start, span, _ in matches:
+            char_start, char_end = document.starts[start], document.ends[start + span - 1]
+            if char_start >= snippet_start and char_end <= snippet_end:
+                highlights.append([char_start - snippet_start, char_end - snippet_start])
+        return {
+            "snippet": text[snippet_start:snippet_end],
+            "highlights": highlights,
+            "offset": snippet_start,
+            "truncatedStart": snippet_start > 0,
+            "truncatedEnd": snippet_end < len(text),
+        }
+
+
+_cache: "OrderedDict[str, SearchIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def notes_key(notes_content) -> str:
+    if not isinstance(notes_content, str):  # chunk_store.StoredNotes
+        return notes_content.content_key()
+    return hashlib.sha256(notes_content.encode("utf-8")).hexdigest()
+
+
+def get_index(notes_content) -> SearchIndex:
+    """
+    The index of these notes (a string or chunk_store.StoredNotes), built on
+    first use and cached by their hash.
+    """
+    key = notes_key(notes_content)
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+            return index
+    index = SearchIndex(notes_content)
+    with _cache_lock:
+        _cache[key] = index
+        while len(_cache) > INDEX_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
+
+
+def match_catalog(catalog: Dict[str, str], keywords: List[str]) -> List[str]:
+    """
+    Catalog entries (path -> description) whose description contains one of
+    the keywords, exactly or with every word of the keyword within typo
+    distance, in keyword order.
+    """
+    entry_words = {path: set(tokenize(description)) for path, description in catalog.items()}
+    vocabulary = TrigramIndex(word for words in entry_words.values() for word in words)
+    matches = []
+    for keyword in keywords:
+        keyword_words = tokenize(keyword)
+        if not keyword_words:
+            continue
+        alternatives = [set(vocabulary.lookup(word)) for word in keyword_words]
+        for path, description in catalog.items():
+            if path in matches:
+                continue
+            if keyword.lower() in description.lower() or all(alts & entry_words[path] for alts in alternatives):
+                matches.append(path)
+    return matches
+
+
+def format_results(query: str, results: List[Dict]) -> str:
+    """The results as the markdown reply, matches in bold."""
+    blocks = []
+    for rank, result in enumerate(results, 1):
+        snippet, cursor, parts = result["snippet"], 0, []
+        for start, end in result["highlights"]:
+            if start < cursor:
+                continue  # overlaps a match already in bold
+            parts += [snippet[cursor:start], "**", snippet[start:end], "**"]
+            cursor = end
+        parts.append(snippet[cursor:])
+        text = "".join(parts).strip()
+        if result["truncatedStart"]:
+            text = "…" + text
+        if result["truncatedEnd"]:
+            text += "…"
+        blocks.append(f"**{rank}. {result['title'] or 'Notes'}**\n{text}")
+    return f"**Search Results for: {query}**\n\n" + "\n\n".join(blocks)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Production entry point for the Flask AI service.
+
+`python3 app.py` runs Flask's single-process development server with the
+reloader on. This instead:
+
+- imports app.py and warms it (Bedrock client, extractor libraries, encoders)
+  once in a parent process,
+- opens the listening socket and pre-forks a configurable number of worker
+  processes that share it, so the warm state is inherited copy-on-write,
+- serves each worker with a thread per request (or one request at a time
+  with --no-threads),
+- replaces workers that die, backing off when they die right after starting,
+  and
+- on SIGTERM/SIGINT drains: workers report not-ready on /readyz while still
+  serving for a grace period (so a load balancer sees it and stops sending
+  traffic), then stop accepting, finish in-flight requests, queued ingests and
+  question bank refills, and exit. Workers still busy after the drain timeout
+  are killed.
+
+/healthz (liveness) and /readyz (readiness) are served by app.py.
+
+Usage:
+    python3 serve.py                          # AI_SERVICE_WORKERS workers on 127.0.0.1:5004
+    python3 serve.py --workers 4 --port 5004 --drain-grace 10 --drain-timeout 120
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import BaseWSGIServer, ThreadedWSGIServer
+
+SERVE_HOST = os.environ.get("AI_SERVICE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.environ.get("AI_SERVICE_PORT", "5004"))
+SERVE_WORKERS = int(os.environ.get("AI_SERVICE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Seconds a draining worker keeps accepting while /readyz reports draining
+DRAIN_GRACE = float(os.environ.get("AI_SERVICE_DRAIN_GRACE", "5"))
+# Seconds a draining worker gets to finish its in-flight generations
+DRAIN_TIMEOUT = float(os.environ.get("AI_SERVICE_DRAIN_TIMEOUT", "60"))
+LISTEN_BACKLOG = 128
+# A worker that exits sooner than this after starting is replaced after a
+# delay that doubles up to RESPAWN_MAX_BACKOFF, instead of in a tight loop
+RESPAWN_MIN_UPTIME = 10.0
+RESPAWN_MAX_BACKOFF = 30.0
+
+
+class DrainingThreadedServer(ThreadedWSGIServer):
+    """Threaded server whose server_close() waits for in-flight requests."""
+
+    daemon_threads = False
+    block_on_close = True
+
+
+def run_worker(ai_app, listener: socket.socket, threaded: bool, grace: float = DRAIN_GRACE):
+    """Serve requests from the shared listening socket until told to drain."""
+    # Ctrl+C reaches the whole process group; the parent decides when to drain
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    server_class = DrainingThreadedServer if threaded else BaseWSGIServer
+    host, port = listener.getsockname()[:2]
+    server = server_class(host, port, ai_app.app, fd=listener.fileno())
+    # Every worker wakes up for a new connection but only one accepts it; the
+    # others must get an error back from accept(), not block in it (and then
+    # never see the shutdown request)
+    server.socket.setblocking(False)
+    # The server has its own copy of the socket; closing this one lets
+    # server_close() actually stop the listener once the worker drains
+    listener.close()
+
+    def drain(signum, frame):
+        ai_app.begin_drain()
+        # Keep serving (with /readyz failing) for the grace period; shutdown()
+        # blocks until serve_forever returns, so it can't run on this thread
+        timer = threading.Timer(grace, server.shutdown)
+        timer.daemon = True
+        timer.start()
+
+    signal.signal(signal.SIGTERM, drain)
+    server.serve_forever()
+    server.server_close()  # joins the request threads that were still running
+    ai_app.ingest_queue.shutdown()
+    ai_app.bank.shutdown()
+    print(f"👋 Worker {os.getpid()} drained")
+
+
+def spawn_worker(ai_app, listener: socket.socket, threaded: bool, grace: float = DRAIN_GRACE) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(ai_app, listener, threaded, grace)
+        except Exception as e:
+            print(f"❌ Worker {os.getpid()} crashed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def respawn_backoff(uptime: float, backoff: float) -> float:
+    """Delay before replacing a worker that exited after uptime seconds, given the previous delay."""
+    if uptime >= RESPAWN_MIN_UPTIME:
+        return 0.0
+    return min(RESPAWN_MAX_BACKOFF, max(1.0, backoff * 2))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--no-threads", dest="threaded", action="store_false",
+                        help="serve one request at a time per worker")
+    parser.add_argument("--drain-grace", type=float, default=DRAIN_GRACE,
+                        help="seconds to keep serving with /readyz failing before draining")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    # Import and warm up before forking so every worker starts ready
+    import app as ai_app
+    ai_app.warm_up()
+
+    listener = socket.create_server((args.host, args.port), backlog=LISTEN_BACKLOG)
+    listener.set_inheritable(True)
+    print(f"🚀 Serving on http://{args.host}:{listener.getsockname()[1]} "
+          f"with {args.workers} {'threaded' if args.threaded else 'single-request'} worker(s)")
+
+    if not hasattr(os, "fork"):
+        # No fork() (Windows): serve from this process only
+        run_worker(ai_app, listener, args.threaded, args.drain_grace)
+        return 0
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    started = {}  # worker pid -> when it was spawned
+
+    def start_worker():
+        started[spawn_worker(ai_app, listener, args.threaded, args.drain_grace)] = time.monotonic()
+
+    for _ in range(max(1, args.workers)):
+        start_worker()
+    backoff = 0.0
+    replacements = []  # when each pending replacement is due
+    while not stopping.is_set():
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid and pid in started:
+            uptime = time.monotonic() - started.pop(pid)
+            backoff = respawn_backoff(uptime, backoff)
+            print(f"⚠️ Worker {pid} exited with status {status} after {uptime:.1f}s; "
+                  f"starting a replacement in {backoff:.0f}s")
+            replacements.append(time.monotonic() + backoff)
+        for due in [due for due in replacements if due <= time.monotonic()]:
+            replacements.remove(due)
+            start_worker()
+        stopping.wait(0.5)
+
+    workers = set(started)
+    print(f"🛑 Draining {len(workers)} worker(s) (up to {args.drain_grace + args.drain_timeout:.0f}s)")
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    # Workers hold their own copies; the listener closes when the last one drains
+    listener.close()
+
+    deadline = time.monotonic() + args.drain_grace + args.drain_timeout
+    while workers and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            workers.discard(pid)
+        else:
+            time.sleep(0.1)
+    for pid in workers:
+        print(f"⚠️ Worker {pid} did not drain in time; killing it")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
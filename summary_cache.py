@@ -0,0 +1,150 @@
+"""
+Hierarchical, content-addressed summary cache for multi-document notes.
+
+Study group requests send every selected document in one notesContent, each
+under a '=== Title ===' header. Summarizing that as a single block means any
+change to the document set re-summarizes everything. Here each document body
+is summarized on its own and cached by a hash of its content (plus the topic
+and the model that wrote it), and the group summary is a cheap merge of the
+per-document summaries under their titles, itself cached by the hashes it was
+built from. Adding one file to a 30-file group costs one document summary and
+one merge.
+
+Entries are plain text files under ~/Documents/.ai_helper/summary_cache.
+"""
+
+import hashlib
+import os
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from text_normalizer import DOCUMENT_HEADER
+
+SUMMARY_CACHE_DIR = os.environ.get(
+    "SUMMARY_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), "Documents", ".ai_helper", "summary_cache"),
+)
+# Bump when the summary prompts change so old entries stop matching
+CACHE_VERSION = "2"
+
+
+def iter_documents(notes_content) -> Iterator[Tuple[str, str]]:
+    """
+    (title, body) per '=== Title ===' section, one at a time.
+
+    The notes are a string or a chunk_store.StoredNotes, which is read one
+    document at a time. Text before the first header, if any, comes with an
+    empty title.
+    """
+    sections = [notes_content] if isinstance(notes_content, str) else notes_content.document_texts()
+    for section in sections:
+        title, body = "", []
+        for line in section.splitlines():
+            if DOCUMENT_HEADER.match(line.strip()):
+                if title or "".join(body).strip():
+                    yield title, "\n".join(body).strip()
+                title, body = line.strip()[4:-4], []
+            else:
+                body.append(line)
+        if title or "".join(body).strip():
+            yield title, "\n".join(body).strip()
+
+
+def split_documents(notes_content) -> List[Tuple[str, str]]:
+    """Split notes (a string or chunk_store.StoredNotes) into (title, body) per '=== Title ===' section."""
+    return list(iter_documents(notes_content))
+
+
+def summary_key(*parts: str) -> str:
+    """Cache key over the given parts (content, topic, model, ...)."""
+    digest = hashlib.sha256(CACHE_VERSION.encode("utf-8"))
+    for part in parts:
+        digest.update(b"\x00" + (part or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cache_path(key: str, cache_dir: Optional[str]) -> str:
+    return os.path.join(cache_dir or SUMMARY_CACHE_DIR, f"{key}.txt")
+
+
+def read_summary(key: str, cache_dir: Optional[str] = None) -> Optional[str]:
+    try:
+        with open(_cache_path(key, cache_dir), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_summary(key: str, summary: str, cache_dir: Optional[str] = None):
+    cache_file = _cache_path(key, cache_dir)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(summary)
+    os.replace(tmp_file, cache_file)
+
+
+def hierarchical_summary(
+    notes_content,
+    summarize_document: Callable[[str], str],
+    combine: Callable[[List[Tuple[str, str]]], str],
+    query: str = "",
+    model_for: Optional[Callable[[str], str]] = None,
+    served_model: Optional[Callable[[], str]] = None,
+    cache_dir: Optional[str] = None,
+) -> Tuple[str, Dict]:
+    """
+    Summarize multi-document notes from cached per-document summaries.
+
+    Args:
+        notes_content: Notes with '=== Title ===' document sections, as a string
+            or a chunk_store.StoredNotes (read one document at a time)
+        summarize_document: Function (document body) -> summary, called on cache misses
+        combine: Function ([(title, summary), ...]) -> group summary
+        query: Topic the summaries focus on (part of every cache key)
+        model_for: Function (text) -> ID of the model a summary of it would be
+            routed to now; summaries that model wrote are the ones looked up
+        served_model: Function () -> ID of the model that answered the last
+            summarize_document/combine call; new summaries are stored under it
+        cache_dir: Cache directory (defaults to SUMMARY_CACHE_DIR)
+
+    Returns:
+        (summary, stats) where stats has documents, cached_documents and
+        combined_cached
+    """
+    model_for = model_for or (lambda text: "")
+    served_model = served_model or (lambda: "")
+    summaries, keys = [], []
+    cached_documents = 0
+    for title, body in iter_documents(notes_content):
+        # The body is summarized without its '=== Title ===' header, so a
+        # summary never names the title and renaming a document (or moving it
+        # between groups) keeps it; combine sees the current titles
+        key = summary_key("document", body, query, model_for(body))
+        summary = read_summary(key, cache_dir)
+        if summary is None:
+            summary = summarize_document(body)
+            key = summary_key("document", body, query, served_model())
+            write_summary(key, summary, cache_dir)
+        else:
+            cached_documents += 1
+        summaries.append((title, summary))
+        keys.append(key)
+
+    stats = {
+        "documents": len(summaries),
+        "cached_documents": cached_documents,
+        "combined_cached": False,
+    }
+    if len(summaries) == 1:
+        return summaries[0][1], stats
+
+    # The merge is shown the titles, so unlike the document summaries it is keyed by them
+    merged = "\n\n".join(summary for _, summary in summaries)
+    titles = [title for title, _ in summaries]
+    combined = read_summary(summary_key("group", query, model_for(merged), *keys, *titles), cache_dir)
+    if combined is None:
+        combined = combine(summaries)
+        write_summary(summary_key("group", query, served_model(), *keys, *titles), combined, cache_dir)
+    else:
+        stats["combined_cached"] = True
+    return combined, stats
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Test the extraction benchmark's measurements and regression gate
+"""
+
+import os
+
+import pytest
+
+import bench_extraction
+from bench_extraction import RESULTS_DIR, compare
+
+DOCX = os.path.join(RESULTS_DIR, "EnglishFinalEssay.docx")
+
+
+def test_each_docx_backend_is_measured_in_its_own_process():
+    results = bench_extraction.run({"EnglishFinalEssay.docx": DOCX})
+
+    assert set(results) == {"EnglishFinalEssay.docx streaming", "EnglishFinalEssay.docx python-docx"}
+    for result in results.values():
+        assert result["seconds"] > 0 and result["ms_per_page"] is None
+        assert 0 < result["peak_rss_mb"] < 500
+        assert result["output_chars"] > 10000
+
+
+def test_regressions_beyond_the_thresholds_fail_the_gate(tmp_path):
+    baseline = {"a.pdf pipeline": {"seconds": 2.0, "peak_rss_mb": 100.0, "output_chars": 1000}}
+    path = str(tmp_path / "baseline.json")
+    bench_extraction.save_baselines(path, baseline)
+    baseline = bench_extraction.load_baselines(path)
+
+    def result(seconds=2.0, peak_rss_mb=100.0, output_chars=1000):
+        return {"a.pdf pipeline": {"seconds": seconds, "peak_rss_mb": peak_rss_mb, "output_chars": output_chars}}
+
+    assert compare(result(seconds=2.3, peak_rss_mb=110.0, output_chars=1200), baseline) == []
+    assert compare(result(seconds=2.6), baseline)[0].startswith("a.pdf pipeline: 2.600s")
+    assert "peak RSS" in compare(result(peak_rss_mb=130.0), baseline)[0]
+    assert "output" in compare(result(output_chars=900), baseline)[0]
+    assert compare({"new.docx streaming": result()["a.pdf pipeline"]}, baseline) == []
+    assert bench_extraction.load_baselines(str(tmp_path / "missing.json")) == {}
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
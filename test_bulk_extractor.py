@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test bulk extraction: discovery, JSONL records and resuming an interrupted run
+"""
+
+import io
+import json
+
+from bulk_extractor import discover_files, extract_document, load_completed, run_bulk
+
+
+def _make_library(root):
+    (root / "cse332").mkdir()
+    (root / ".ai_helper").mkdir()
+    (root / "notes.txt").write_text("Dijkstra finds shortest paths.", encoding="utf-8")
+    (root / "cse332" / "heaps.txt").write_text("Binary heaps support O(log n) insert.", encoding="utf-8")
+    (root / "cse332" / "image.png").write_bytes(b"\x89PNG")
+    (root / ".ai_helper" / "summary.txt").write_text("hidden", encoding="utf-8")
+
+
+def test_discover_files_skips_hidden_and_unsupported(tmp_path):
+    """Directories are walked recursively; hidden and unsupported files are skipped"""
+    _make_library(tmp_path)
+
+    found = list(discover_files([str(tmp_path), str(tmp_path / "*.txt")]))
+
+    assert [p.rsplit("/", 1)[-1] for p in found] == ["heaps.txt", "notes.txt"]
+
+
+def test_extract_document_reports_errors_instead_of_raising(tmp_path):
+    """A corrupt file produces a record with an error, not an exception"""
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+
+    record = extract_document(str(broken))
+
+    assert record["error"]
+    assert record["sha256"]
+    assert "total_ms" in record["timings"]
+
+
+def test_run_bulk_resumes_from_existing_output(tmp_path):
+    """A second run skips documents already present and unchanged in the output"""
+    _make_library(tmp_path)
+    out = io.StringIO()
+
+    stats = run_bulk([str(tmp_path)], out, workers=1)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+
+    assert stats == {"extracted": 2, "failed": 0, "skipped": 0}
+    assert {r["text"] for r in records} == {
+        "Dijkstra finds shortest paths.",
+        "Binary heaps support O(log n) insert.",
+    }
+
+    output = tmp_path / "out.jsonl"
+    output.write_text(out.getvalue() + '{"path": "partial', encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("Edited notes.", encoding="utf-8")
+
+    second = io.StringIO()
+    stats = run_bulk([str(tmp_path)], second, workers=1, completed=load_completed(str(output)))
+
+    assert stats == {"extracted": 1, "failed": 0, "skipped": 1}
+    assert json.loads(second.getvalue())["text"] == "Edited notes."
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test batched grading of a whole quiz with the checkAnswers action
+"""
+
+import io
+import json
+import re
+
+import pytest
+
+import app as ai_app
+import token_budget
+
+
+class GradingBedrock:
+    """Grades answers containing 'right' as correct; can garble its first batch reply."""
+
+    def __init__(self, garble_first=False):
+        self.garble_first = garble_first
+        self.requests = []
+
+    def invoke_model(self, **kwargs):
+        body = json.loads(kwargs["body"])
+        self.requests.append(body)
+        prompt = body["messages"][-1]["content"]
+        answers = re.findall(r"^My answer (\d+): (.*)$", prompt, re.MULTILINE)
+        if answers and self.garble_first:
+            self.garble_first = False
+            text = "Sure! Here are the grades: first one is fine, second one is not."
+        elif answers:
+            text = "Here you go:\n" + json.dumps([
+                {"question": int(n), "correct": "right" in a, "feedback": f"Feedback on {n}."} for n, a in answers
+            ])
+        else:
+            single = re.search(r"My answer is: (.*)", prompt).group(1)
+            text = ("yes" if "right" in single else "no") + "\nSingle feedback."
+        payload = {"content": [{"type": "text", "text": text}]}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+def quiz(count):
+    return [{"question": f"Question {i}?", "answer": "right answer" if i % 2 == 0 else "wrong answer"}
+            for i in range(count)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(token_budget, "ledger", token_budget.UsageLedger())
+    ai_app.app.testing = True
+    with ai_app.app.test_client() as test_client:
+        yield test_client
+
+
+def test_twenty_questions_are_graded_in_two_calls(client, monkeypatch):
+    fake = GradingBedrock()
+    monkeypatch.setattr(ai_app, "bedrock", fake)
+
+    response = client.post("/api", json={"action": "checkAnswers", "notesContent": "Notes on heaps.", "items": quiz(20)})
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert len(fake.requests) == 2  # 15 + 5 with the default 4096-token output budget
+    assert data["total"] == 20 and data["correct"] == 10
+    assert data["results"][0] == {"question": "Question 0?", "answer": "right answer",
+                                  "correct": True, "feedback": "Feedback on 1."}
+    assert data["results"][19]["correct"] is False
+    assert all(r["max_tokens"] <= token_budget.MAX_OUTPUT_TOKENS for r in fake.requests)
+
+
+def test_malformed_batch_reply_is_regraded_in_halves(client, monkeypatch):
+    fake = GradingBedrock(garble_first=True)
+    monkeypatch.setattr(ai_app, "bedrock", fake)
+
+    data = client.post("/api", json={"action": "checkAnswers", "notesContent": "Notes.", "items": quiz(4)}).get_json()
+
+    # One garbled call, then two halves of two
+    assert len(fake.requests) == 3
+    assert [r["correct"] for r in data["results"]] == [True, False, True, False]
+
+
+def test_items_are_validated(client, monkeypatch):
+    monkeypatch.setattr(ai_app, "bedrock", GradingBedrock())
+
+    missing = client.post("/api", json={"action": "checkAnswers", "notesContent": "Notes.", "items": []})
+    incomplete = client.post("/api", json={"action": "checkAnswers", "notesContent": "Notes.",
+                                           "items": [{"question": "Why?"}]})
+
+    assert missing.status_code == 400
+    assert incomplete.status_code == 400
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test the content-addressed, reference-counted notes chunk store
+"""
+
+import io
+import json
+import random
+
+import app as ai_app
+import chunk_store
+import json_codec
+import question_bank
+import search_index
+import summary_cache
+from chunk_store import ChunkStore, split_chunks, store_notes
+
+
+def document(title, seed, paragraphs=60):
+    rng = random.Random(seed)
+    words = ["heap", "graph", "tree", "hash", "queue", "sort", "edge", "node", "cost", "path"]
+    body = "\n".join(" ".join(rng.choice(words) for _ in range(rng.randint(5, 25))) for _ in range(paragraphs))
+    return f"=== {title} ===\n{body}\n\n"
+
+
+def test_chunks_round_trip_and_do_not_depend_on_neighbours():
+    a, b, c = document("A.pdf", 1), document("B.pdf", 2), document("C.pdf", 3)
+    notes = a + b + c
+
+    assert "".join(split_chunks(notes)) == notes
+    assert all(len(chunk) <= chunk_store.CHUNK_MAX_CHARS for chunk in split_chunks(notes))
+
+    # B chunks identically whether it is selected with A or with C
+    key = ChunkStore.chunk_key
+    with_a = {key(chunk) for chunk in split_chunks(a + b)}
+    with_c = {key(chunk) for chunk in split_chunks(b + c)}
+    b_only = {key(chunk) for chunk in split_chunks(b)}
+    assert b_only <= with_a and b_only <= with_c
+
+
+def test_shared_documents_are_stored_once_and_freed_with_the_last_reference():
+    store = ChunkStore()
+    shared = document("Lecture.pdf", 7) + document("Slides.pdf", 8)
+    members = [store_notes(shared + document(f"Own {i}.txt", 100 + i, 5), store) for i in range(10)]
+
+    stats = store.stats()
+    assert stats["referenced_chars"] >= 10 * len(shared)
+    assert stats["unique_chars"] < 2 * len(shared)
+    assert stats["dedupe_ratio"] > 5
+
+    text = members[0].text()
+    assert json.loads(members[0].json_bytes()) == text
+    assert members[0].estimated_tokens == ai_app.estimate_tokens(text)
+
+    for notes in members:
+        notes.release()
+        notes.release()  # releasing twice is harmless
+    assert store.stats()["chunks"] == 0
+
+
+def test_stored_notes_are_prepared_and_read_one_document_at_a_time():
+    store = ChunkStore()
+    a, b = document("A.pdf", 4), document("B.pdf", 5)
+    seen = []
+
+    def prepare(section):
+        seen.append(section)
+        return section.upper()
+
+    with store_notes(a + b, store, prepare=prepare) as notes, store_notes(b, store) as other:
+        assert seen == [a, b]
+        assert list(notes.document_texts()) == [a.upper(), b.upper()]
+        assert len(notes) == len(a + b)
+        assert search_index.notes_key(notes) != search_index.notes_key(other)
+        assert search_index.get_index(other).search("heap") == search_index.get_index(b).search("heap")
+
+        body = json.loads(json_codec.bedrock_request_body("system", [{"role": "user", "content": notes}], 10, 0.5))
+        assert body["messages"][0]["content"] == (a + b).upper()
+
+
+def test_requests_send_chunked_notes_and_release_them(monkeypatch, tmp_path):
+    sent = []
+
+    class RecordingBedrock:
+        def invoke_model(self, **kwargs):
+            sent.append(json.loads(kwargs["body"]))
+            payload = {"content": [{"type": "text", "text": "Summary."}]}
+            return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    monkeypatch.setattr(ai_app, "bedrock", RecordingBedrock())
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(chunk_store, "store", ChunkStore())
+    monkeypatch.setattr(ai_app, "bank", question_bank.QuestionBank(ai_app._refill_bank, bank_dir=str(tmp_path / "bank")))
+    notes = document("Lecture.pdf", 11)
+
+    with ai_app.app.test_client() as client:
+        response = client.post("/api", json={"action": "getQuestions", "notesContent": notes, "numQuestions": 3})
+        ai_app.bank.drain()
+        stats = client.get("/api/chunk-store").get_json()
+
+    assert response.status_code == 200
+    # Normalized one document at a time, each ending in a line break
+    assert sent[0]["messages"][0]["content"] == ai_app.prepare_notes(notes) + "\n"
+    assert stats["chunks"] == 0
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
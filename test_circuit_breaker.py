@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test the Bedrock circuit breaker and the degraded-mode fallbacks
+"""
+
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+import app as ai_app
+import summary_cache
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+NOTES = """=== Heaps.pdf ===
+A binary heap is a complete binary tree stored in an array. The heap property says every parent is no larger than its children.
+Insertion appends the new key and sifts it up, which takes logarithmic time. Removing the minimum moves the last key to the root.
+The key is then sifted down until the heap property holds again. Heaps are the usual way to implement a priority queue.
+Building a heap from an unsorted array takes linear time with repeated sift-down. Many students enjoy drawing heaps on paper.
+"""
+
+
+def throttled():
+    raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "InvokeModel")
+
+
+class ThrottledBedrock:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, **kwargs):
+        self.calls += 1
+        throttled()
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_a_trial_call():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=0.1)
+    for _ in range(3):
+        with pytest.raises(ClientError):
+            breaker.call(throttled)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+
+    time.sleep(0.15)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(ClientError):
+        breaker.call(throttled)  # the trial fails: open again
+    assert breaker.state == OPEN
+
+    time.sleep(0.15)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_request_errors_do_not_open_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, is_failure=ai_app._bedrock_unhealthy)
+
+    def invalid():
+        raise ClientError({"Error": {"Code": "ValidationException", "Message": "Too long"}}, "InvokeModel")
+
+    with pytest.raises(ClientError):
+        breaker.call(invalid)
+    assert breaker.state == CLOSED
+
+
+def test_request_error_during_the_trial_keeps_the_breaker_half_open():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.1, is_failure=ai_app._bedrock_unhealthy)
+
+    def invalid():
+        raise ClientError({"Error": {"Code": "ValidationException", "Message": "Too long"}}, "InvokeModel")
+
+    # Request errors neither count as failures nor reset the count
+    with pytest.raises(ClientError):
+        breaker.call(throttled)
+    with pytest.raises(ClientError):
+        breaker.call(invalid)
+    with pytest.raises(ClientError):
+        breaker.call(throttled)
+    assert breaker.state == OPEN
+
+    time.sleep(0.15)
+    with pytest.raises(ClientError):
+        breaker.call(invalid)
+    assert breaker.state == HALF_OPEN  # the trial said nothing about Bedrock's health
+    with pytest.raises(ClientError):
+        breaker.call(throttled)  # the trial slot was freed for the next call
+    assert breaker.state == OPEN
+
+
+def test_open_breaker_serves_local_fallbacks(monkeypatch, tmp_path):
+    fake = ThrottledBedrock()
+    monkeypatch.setattr(ai_app, "bedrock", fake)
+    monkeypatch.setattr(ai_app, "breaker", CircuitBreaker(failure_threshold=1, reset_seconds=60,
+                                                          is_failure=ai_app._bedrock_unhealthy))
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_DIR", str(tmp_path))
+
+    with ai_app.app.test_client() as client:
+        first = client.post("/api", json={"action": "getSummary", "notesContent": NOTES})
+        summary = client.post("/api", json={"action": "getSummary", "notesContent": NOTES})
+        keywords = client.post("/api", json={"action": "getKeywords", "prompt": NOTES})
+        questions = client.post("/api", json={"action": "checkAnswer", "notesContent": NOTES,
+                                              "question": "What is a heap?", "answer": "A tree."})
+
+    assert first.status_code == 429  # the failure that opened the breaker
+    assert fake.calls == 1  # everything after failed fast
+    data = summary.get_json()
+    assert summary.status_code == 200 and data["degraded"] is True
+    assert "heap" in data["reply"] and len(data["reply"]) < 0.6 * len(NOTES)
+    assert keywords.get_json()["degraded"] is True and "heap" in keywords.get_json()["keywords"]
+    assert questions.status_code == 503 and int(questions.headers["Retry-After"]) > 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test streaming DOCX extraction: document order, tables, headers and footnotes
+"""
+
+import zipfile
+
+from docx_extractor import PARAGRAPH, TABLE_ROW, extract_text_from_docx, iter_docx_blocks
+
+NS = ('xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+      'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"')
+
+
+def para(text):
+    return f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
+def write_docx(path, body, header=None, footnotes=None):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", f"<w:document {NS}><w:body>{body}</w:body></w:document>")
+        if header:
+            archive.writestr("word/header1.xml", f"<w:hdr {NS}>{header}</w:hdr>")
+        if footnotes:
+            archive.writestr("word/footnotes.xml", f"<w:footnotes {NS}><w:footnote>{footnotes}</w:footnote></w:footnotes>")
+
+
+def test_blocks_are_emitted_in_document_order(tmp_path):
+    """Paragraphs and table rows come out in the order they appear"""
+    docx_file = tmp_path / "notes.docx"
+    table = (
+        "<w:tbl>"
+        f"<w:tr><w:tc>{para('Algorithm')}</w:tc><w:tc>{para('Runtime')}</w:tc></w:tr>"
+        f"<w:tr><w:tc>{para('Dijkstra')}</w:tc><w:tc>{para('O(E log V)')}</w:tc></w:tr>"
+        "</w:tbl>"
+    )
+    write_docx(docx_file, para("Shortest paths") + table + para("Negative edges need Bellman-Ford."))
+
+    assert list(iter_docx_blocks(str(docx_file))) == [
+        (PARAGRAPH, "Shortest paths"),
+        (TABLE_ROW, ["Algorithm", "Runtime"]),
+        (TABLE_ROW, ["Dijkstra", "O(E log V)"]),
+        (PARAGRAPH, "Negative edges need Bellman-Ford."),
+    ]
+
+
+def test_headers_footnotes_and_fallback_content(tmp_path):
+    """Headers and footnotes are kept; mc:Fallback duplicates are skipped"""
+    docx_file = tmp_path / "essay.docx"
+    body = (
+        "<w:p><w:r><w:t>Line one</w:t><w:br/><w:t>line two</w:t></w:r></w:p>"
+        "<mc:AlternateContent><mc:Choice>" + para("Text box") + "</mc:Choice>"
+        "<mc:Fallback>" + para("Text box") + "</mc:Fallback></mc:AlternateContent>"
+    )
+    write_docx(docx_file, body, header=para("CSE 332 Notes"), footnotes=para("Cited from lecture 12."))
+
+    text = extract_text_from_docx(str(docx_file))
+
+    assert text == "CSE 332 Notes\nLine one\nline two\nText box\nCited from lecture 12."
+    assert extract_text_from_docx(str(docx_file), include_headers=False, include_notes=False) == \
+        "Line one\nline two\nText box"
+
+
+def test_matches_python_docx_on_sample_essay():
+    """Body text matches the python-docx paragraphs path on the sample essay"""
+    import docx
+
+    sample = "AI/results/EnglishFinalEssay.docx"
+    expected = "\n".join(p.text for p in docx.Document(sample).paragraphs)
+
+    assert extract_text_from_docx(sample, include_headers=False, include_notes=False) == expected
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test the local TextRank summarizer and the extractive getSummary mode
+"""
+
+import random
+import time
+
+import pytest
+
+import app as ai_app
+import extractive_summary
+from extractive_summary import split_sentences, summarize, textrank_scores
+
+NOTES = """=== Heaps.pdf ===
+--- Page 1 ---
+A binary heap is a complete binary tree stored in an array.
+The heap property says every parent key is no larger than the keys of its children.
+Insertion adds the key at the end of the array and sifts it up the heap.
+The weather was unusually warm on the day of the lecture.
+Removing the minimum moves the last key to the root and sifts it down the heap.
+A heap built from an unsorted array by repeated sift-down takes linear time.
+Priority queues are usually implemented with a binary heap.
+"""
+
+
+class NoBedrock:
+    def invoke_model(self, **kwargs):
+        raise AssertionError("extractive summaries must not call Bedrock")
+
+
+def test_central_sentences_are_kept_in_reading_order():
+    sentences = split_sentences(NOTES.split("\n", 1)[1])
+    scores = textrank_scores(sentences)
+    summary = summarize(NOTES)
+
+    assert len(sentences) == 7
+    assert scores.index(min(scores)) == 3  # the off-topic sentence ranks last
+    assert "weather" not in summary
+    picked = [sentence for sentence in sentences if sentence in summary]
+    assert summary == " ".join(picked)
+    assert 0.25 * len(NOTES) <= len(summary) <= 0.5 * len(NOTES)
+
+
+def test_long_notes_are_summarized_quickly_to_about_thirty_percent():
+    rng = random.Random(4)
+    words = "heap graph tree hash queue sort edge node cost path array stack cache pointer".split()
+    notes = "=== Long.pdf ===\n" + "\n".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(8, 25))).capitalize() + "." for _ in range(2000)
+    )
+    summarize(notes)  # warm up
+
+    start = time.perf_counter()
+    summary = summarize(notes)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.1
+    assert 0.28 <= len(summary) / len(notes) <= 0.33
+
+
+def test_frequency_scoring_is_used_without_numpy(monkeypatch):
+    monkeypatch.setattr(extractive_summary, "np", None)
+
+    assert "weather" not in summarize(NOTES)
+
+
+def test_get_summary_extractive_mode(monkeypatch):
+    monkeypatch.setattr(ai_app, "bedrock", NoBedrock())
+
+    with ai_app.app.test_client() as client:
+        extractive = client.post("/api", json={"action": "getSummary", "notesContent": NOTES, "mode": "extractive"})
+        invalid = client.post("/api", json={"action": "getSummary", "notesContent": NOTES, "mode": "abstract"})
+
+    assert extractive.status_code == 200
+    assert extractive.get_json()["mode"] == "extractive"
+    assert "binary heap" in extractive.get_json()["reply"]
+    assert invalid.status_code == 400
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test parallel fan-out generation for large question and flashcard requests
+"""
+
+import io
+import json
+import re
+import threading
+import time
+
+import pytest
+
+import app as ai_app
+import token_budget
+
+NOTES = "".join(f"=== Lecture {i}.pdf ===\n" + f"Topic {i} covers heaps, graphs and trees in depth. " * 200 + "\n\n"
+                for i in range(4))
+DELAY = 0.3
+
+
+class SlowFlashcardBedrock:
+    """Takes DELAY per call and answers with the requested number of cards, one repeated across calls."""
+
+    def __init__(self):
+        self.requests = []
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, **kwargs):
+        body = json.loads(kwargs["body"])
+        with self._lock:
+            self.requests.append(body)
+            call = len(self.requests)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(DELAY)
+        with self._lock:
+            self.in_flight -= 1
+        count = int(re.search(r"generate (\d+)", body["messages"][-1]["content"]).group(1))
+        lines = ["What do all of these lectures have in common?", "Data structures"]
+        for i in range(count - 1):
+            lines += [f"Call {call} card {i}: what is concept number {call * 100 + i} about?", f"Answer {i}"]
+        payload = {"content": [{"type": "text", "text": "\n".join(lines)}]}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = SlowFlashcardBedrock()
+    monkeypatch.setattr(ai_app, "bedrock", fake)
+    monkeypatch.setattr(ai_app, "QUESTION_BANK", False)
+    monkeypatch.setattr(token_budget, "ledger", token_budget.UsageLedger())
+    return fake
+
+
+def test_large_deck_is_generated_by_concurrent_section_requests(fake):
+    start = time.time()
+    cards = ai_app.generate_items("flashcards", NOTES, 100)
+    elapsed = time.time() - start
+
+    assert len(fake.requests) == 4 and fake.max_in_flight == 4
+    assert elapsed < 2 * DELAY  # not 4 * DELAY serially
+    # Each sub-request saw its own lecture
+    sections = [re.findall(r"=== (.+?) ===", r["messages"][0]["content"]) for r in fake.requests]
+    assert sorted(s for section in sections for s in section) == [f"Lecture {i}.pdf" for i in range(4)]
+    # The card every call returned is kept once
+    assert len(cards) == 97
+    assert sum(1 for card in cards if card["question"].startswith("What do all")) == 1
+    assert all(r["max_tokens"] <= token_budget.output_token_budget("getFlashCards", count=25) for r in fake.requests)
+
+
+def test_streamed_flashcards_arrive_per_sub_request(fake):
+    with ai_app.app.test_client() as client:
+        response = client.post("/api", json={"action": "getFlashCards", "notesContent": NOTES, "numCards": 50,
+                                             "stream": True, "userId": "student-1"})
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.mimetype == "application/x-ndjson"
+    assert [len(e["items"]) for e in events[:-1]] in ([25, 24], [24, 25])
+    assert events[-2]["received"] == 49 and events[-2]["requested"] == 50
+    assert events[-1]["done"] is True and len(events[-1]["reply"].splitlines()) == 98
+    # Calls made on the fan-out threads are billed to the request
+    assert token_budget.ledger.totals("student-1")["bedrock_calls"] == 2
+
+
+def test_stream_that_fails_midway_ends_with_an_error_event(fake, monkeypatch):
+    from botocore.exceptions import ClientError
+
+    answer = fake.invoke_model
+
+    def throttled_after_first_call(**kwargs):
+        if fake.requests:
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}}, "InvokeModel")
+        return answer(**kwargs)
+
+    monkeypatch.setattr(fake, "invoke_model", throttled_after_first_call)
+    with ai_app.app.test_client() as client:
+        response = client.post("/api", json={"action": "getFlashCards", "notesContent": NOTES, "numCards": 50,
+                                             "stream": True})
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert events[-1]["type"] == "error" and events[-1]["status"] == 429
+    assert not any(e.get("done") for e in events)
+
+
+def test_streamed_count_must_be_a_number(fake):
+    with ai_app.app.test_client() as client:
+        response = client.post("/api", json={"action": "getQuestions", "notesContent": NOTES, "numQuestions": "five",
+                                             "stream": True})
+
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "'numQuestions' must be a number."
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
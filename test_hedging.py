@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test hedged Bedrock requests and their rate cap
+"""
+
+import threading
+import time
+
+import pytest
+
+from hedging import HEDGE_BURST, Hedger
+
+
+def fast():
+    return "fast"
+
+
+def slow():
+    time.sleep(0.4)
+    return "slow"
+
+
+def warmed_up(**kwargs):
+    hedger = Hedger(min_samples=5, min_delay=0.05, **kwargs)
+    for _ in range(5):
+        hedger.call("model:getSummary", fast, fast)
+    return hedger
+
+
+def test_slow_call_is_answered_by_the_backup():
+    hedger = warmed_up()
+
+    start = time.time()
+    result = hedger.call("model:getSummary", slow, lambda: "backup")
+
+    assert result == "backup"
+    assert time.time() - start < 0.3
+    assert hedger.stats()["hedged"] == 1 and hedger.stats()["backup_wins"] == 1
+
+
+def test_no_hedging_without_latency_history_or_for_fast_calls():
+    hedger = Hedger(min_samples=5, min_delay=0.05)
+
+    assert hedger.call("model:getKeywords", slow, lambda: "backup") == "slow"
+    assert hedger.hedge_delay("model:getKeywords") is None
+    assert warmed_up().call("model:getSummary", fast, lambda: "backup") == "fast"
+
+
+def test_hedge_rate_is_capped():
+    hedger = warmed_up(max_rate=0.0)
+
+    results = [hedger.call("model:getSummary", slow, lambda: "backup") for _ in range(int(HEDGE_BURST) + 1)]
+
+    assert results == ["backup"] * int(HEDGE_BURST) + ["slow"]
+    assert hedger.stats()["skipped_over_rate"] == 1
+
+
+def test_time_queued_in_the_pool_is_neither_hedged_nor_recorded():
+    hedger = warmed_up(workers=1)
+    release = threading.Event()
+    blocker = threading.Thread(target=hedger.call, args=("model:getQuestions", release.wait, fast))
+    blocker.start()
+    time.sleep(0.05)
+
+    # Queued behind the blocker for longer than the hedge delay, then fast
+    threading.Timer(0.3, release.set).start()
+    assert hedger.call("model:getSummary", fast, lambda: "backup") == "fast"
+    blocker.join()
+    assert hedger.stats()["hedged"] == 0
+    assert max(hedger._latencies["model:getSummary"]) < 0.05
+
+    # A slow call on a saturated pool is not hedged: the backup would only queue
+    assert hedger.call("model:getSummary", slow, lambda: "backup") == "slow"
+    assert hedger.stats()["hedged"] == 0 and hedger.stats()["skipped_saturated"] == 1
+
+
+def test_a_failed_request_loses_to_the_other_one():
+    hedger = warmed_up()
+
+    def slow_failure():
+        time.sleep(0.2)
+        raise RuntimeError("throttled")
+
+    assert hedger.call("model:getSummary", slow_failure, slow) == "slow"
+    with pytest.raises(RuntimeError):
+        hedger.call("model:getSummary", slow_failure, slow_failure)
+
+
+def test_the_losing_request_is_reported_when_it_finishes():
+    hedger = warmed_up()
+    losers = []
+    finished = threading.Event()
+
+    def on_loser(result):
+        losers.append(result)
+        finished.set()
+
+    assert hedger.call("model:getSummary", slow, lambda: "backup", on_loser=on_loser) == "backup"
+    assert losers == []  # the primary is still running
+    assert finished.wait(1) and losers == ["slow"]
+
+
+def test_a_call_queued_on_a_saturated_pool_times_out():
+    hedger = warmed_up(workers=1)
+    release = threading.Event()
+    blocker = threading.Thread(target=hedger.call, args=("model:getQuestions", release.wait, fast))
+    blocker.start()
+    time.sleep(0.05)
+
+    start = time.time()
+    with pytest.raises(TimeoutError):
+        hedger.call("model:getSummary", fast, fast, timeout=0.1)
+    assert time.time() - start < 0.3
+
+    release.set()
+    blocker.join()
+    with pytest.raises(TimeoutError):
+        hedger.call("model:getSummary", slow, slow, timeout=0.1)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test compressed request bodies and negotiated response compression
+"""
+
+import gzip
+import http.client
+import io
+import json
+import threading
+import zlib
+
+import pytest
+from werkzeug.serving import make_server
+
+import app as ai_app
+import http_compression
+import summary_cache
+import token_budget
+
+
+class EchoBedrock:
+    """Replies with the notes it was sent, so responses are as large as the request."""
+
+    def invoke_model(self, **kwargs):
+        notes = json.loads(kwargs["body"])["messages"][0]["content"]
+        payload = {"content": [{"type": "text", "text": notes}]}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(ai_app, "bedrock", EchoBedrock())
+    monkeypatch.setattr(token_budget, "ledger", token_budget.UsageLedger())
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_DIR", str(tmp_path / "summary_cache"))
+    ai_app.app.testing = True
+    with ai_app.app.test_client() as test_client:
+        yield test_client
+
+
+def summary_request(notes):
+    return json.dumps({"action": "getSummary", "notesContent": notes, "query": "trees"}).encode("utf-8")
+
+
+def test_gzip_request_and_response(client):
+    notes = "A red-black tree keeps its height logarithmic by recoloring and rotating.\n" * 2000
+    body = gzip.compress(summary_request(notes))
+
+    response = client.post("/api", data=body, headers={
+        "Content-Type": "application/json",
+        "Content-Encoding": "gzip",
+        "Accept-Encoding": "gzip, deflate",
+    })
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    raw = response.get_data()
+    assert len(raw) < len(notes) / 10
+    assert json.loads(gzip.decompress(raw))["reply"] == notes.strip()
+
+
+def test_small_or_unaccepted_responses_are_not_compressed(client):
+    small = client.post("/api", data=zlib.compress(summary_request("Short notes.")), headers={
+        "Content-Type": "application/json", "Content-Encoding": "deflate", "Accept-Encoding": "gzip",
+    })
+    assert small.status_code == 200
+    assert "Content-Encoding" not in small.headers
+
+    refused = client.post("/api", data=summary_request("Long notes. " * 500), headers={
+        "Content-Type": "application/json", "Accept-Encoding": "gzip;q=0",
+    })
+    assert "Content-Encoding" not in refused.headers
+
+
+def test_bad_encodings_and_oversized_bodies_are_rejected(client, monkeypatch):
+    unknown = client.post("/api", data=b"{}", headers={"Content-Type": "application/json", "Content-Encoding": "br"})
+    assert unknown.status_code == 415
+    assert unknown.get_json()["error"].startswith("Unsupported Content-Encoding 'br'")
+
+    corrupt = client.post("/api", data=b"not gzip at all", headers={
+        "Content-Type": "application/json", "Content-Encoding": "gzip",
+    })
+    assert corrupt.status_code == 400
+    assert corrupt.get_json()["error"].startswith("Malformed compressed request body")
+
+    monkeypatch.setattr(http_compression, "MAX_DECOMPRESSED_BYTES", 10000)
+    bomb = gzip.compress(summary_request("a" * 50000))
+    oversized = client.post("/api", data=bomb, headers={
+        "Content-Type": "application/json", "Content-Encoding": "gzip",
+    })
+    assert oversized.status_code == 413
+    assert oversized.get_json() == {"error": "Decompressed request body exceeds 10000 bytes."}
+
+
+def test_gzip_body_on_a_keep_alive_connection(client):
+    # The test client hands the app a finite body; a real socket stays open
+    # after it, so the body must end at Content-Length, not at EOF
+    server = make_server("127.0.0.1", 0, ai_app.app, threaded=True)
+    server.socket.settimeout(5)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        notes = "Tries share prefixes between keys.\n" * 1000
+        for body, headers in (
+            (gzip.compress(summary_request(notes)), {"Content-Encoding": "gzip"}),
+            (summary_request(notes), {}),
+        ):
+            connection.request("POST", "/api", body=body, headers={"Content-Type": "application/json", **headers})
+            response = connection.getresponse()
+            assert response.status == 200
+            assert json.loads(response.read())["reply"] == notes.strip()
+        connection.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test incremental page-level re-extraction of edited PDFs
+"""
+
+from incremental_extractor import artifact_is_valid, extract_pdf_incremental, load_manifest, register_artifact
+
+
+def write_pdf(path, page_texts):
+    """Write a minimal single-font PDF with one line of text per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+def test_only_changed_pages_are_reextracted(tmp_path):
+    """Editing one page re-extracts that page and invalidates artifacts built on it"""
+    pdf = tmp_path / "lecture.pdf"
+    cache = str(tmp_path / "cache")
+    write_pdf(pdf, ["Shortest paths", "Dijkstra", "Bellman Ford"])
+
+    first = extract_pdf_incremental(str(pdf), cache_dir=cache)
+    assert first["pages"] == ["Shortest paths", "Dijkstra", "Bellman Ford"]
+    assert first["extracted_pages"] == 3
+
+    register_artifact(str(pdf), "summary", cache_dir=cache)
+    register_artifact(str(pdf), "intro_flashcards", pages=[0], cache_dir=cache)
+
+    write_pdf(pdf, ["Shortest paths", "Dijkstra with a heap", "Bellman Ford"])
+    second = extract_pdf_incremental(str(pdf), cache_dir=cache)
+
+    assert second["pages"] == ["Shortest paths", "Dijkstra with a heap", "Bellman Ford"]
+    assert second["changed_pages"] == [1]
+    assert second["extracted_pages"] == 1
+    assert second["invalidated_artifacts"] == ["summary"]
+    assert not artifact_is_valid(str(pdf), "summary", cache_dir=cache)
+    assert artifact_is_valid(str(pdf), "intro_flashcards", cache_dir=cache)
+
+
+def test_unchanged_document_extracts_nothing(tmp_path):
+    """Re-running on an identical file reuses every page"""
+    pdf = tmp_path / "notes.pdf"
+    cache = str(tmp_path / "cache")
+    write_pdf(pdf, ["Heaps", "Hash tables"])
+
+    extract_pdf_incremental(str(pdf), cache_dir=cache)
+    again = extract_pdf_incremental(str(pdf), cache_dir=cache)
+
+    assert again["extracted_pages"] == 0
+    assert again["changed_pages"] == []
+    assert again["text"] == "--- Page 1 ---\nHeaps\n\n--- Page 2 ---\nHash tables"
+
+
+def test_extraction_without_the_cache_leaves_no_manifest(tmp_path, monkeypatch):
+    """PDF_PAGE_CACHE=false extracts every page and writes nothing"""
+    import incremental_extractor
+    import pdf_extractor
+    pdf = tmp_path / "notes.pdf"
+    cache = tmp_path / "cache"
+    write_pdf(pdf, ["Heaps", "Hash tables"])
+    monkeypatch.setattr(incremental_extractor, "PAGE_CACHE_DIR", str(cache))
+    monkeypatch.setattr(pdf_extractor, "PDF_PAGE_CACHE", False)
+
+    assert pdf_extractor.extract_text_from_pdf(str(pdf)) == "--- Page 1 ---\nHeaps\n\n--- Page 2 ---\nHash tables"
+    assert extract_pdf_incremental(str(pdf), use_cache=False)["extracted_pages"] == 2
+    assert not cache.exists()
+
+
+def test_inserted_page_only_changes_itself(tmp_path):
+    """Pages shifted by an insertion are matched by fingerprint, not position"""
+    pdf = tmp_path / "lecture.pdf"
+    cache = str(tmp_path / "cache")
+    write_pdf(pdf, ["Heaps", "Tries", "Graphs"])
+    extract_pdf_incremental(str(pdf), cache_dir=cache)
+    register_artifact(str(pdf), "graph_cards", pages=[2], cache_dir=cache)
+
+    write_pdf(pdf, ["Heaps", "Hash tables", "Tries", "Graphs"])
+    again = extract_pdf_incremental(str(pdf), cache_dir=cache)
+
+    assert again["changed_pages"] == [1]
+    assert again["extracted_pages"] == 1
+    assert again["invalidated_artifacts"] == []
+    assert artifact_is_valid(str(pdf), "graph_cards", cache_dir=cache)
+    assert load_manifest(str(pdf), cache_dir=cache)["artifacts"]["graph_cards"]["pages"] == [3]
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Test ingest-time precomputation of summaries, keywords and starter sets
+"""
+
+import io
+import json
+import os
+
+import pytest
+
+import app as ai_app
+import incremental_extractor
+import ingest_pipeline
+import question_bank
+import summary_cache
+import token_budget
+
+
+class ScriptedBedrock:
+    """Replies by prompt type so each ingest artifact gets recognizable content."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, **kwargs):
+        self.calls += 1
+        prompt = json.loads(kwargs["body"])["messages"][-1]["content"]
+        if "flash cards" in prompt:
+            text = "\n".join(f"Card question {i}?\nAnswer {i}" for i in range(10))
+        elif "exam style questions" in prompt:
+            text = "\n".join(f"Exam question {i}?" for i in range(5))
+        elif "key words" in prompt:
+            text = "heaps\npriority queues"
+        else:
+            text = "Heaps keep the smallest element at the root."
+        payload = {"content": [{"type": "text", "text": text}]}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    fake = ScriptedBedrock()
+    monkeypatch.setattr(ai_app, "bedrock", fake)
+    monkeypatch.setattr(token_budget, "ledger", token_budget.UsageLedger())
+    monkeypatch.setattr(ingest_pipeline, "ARTIFACTS_DIR", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_DIR", str(tmp_path / "summary_cache"))
+    monkeypatch.setattr(incremental_extractor, "PAGE_CACHE_DIR", str(tmp_path / "pages"))
+    monkeypatch.setattr(ai_app, "bank", question_bank.QuestionBank(ai_app._refill_bank, bank_dir=str(tmp_path / "bank")))
+    monkeypatch.setattr(ai_app, "ingest_queue", ingest_pipeline.IngestQueue(ai_app.generate_ingest_artifacts))
+    ai_app.app.testing = True
+    with ai_app.app.test_client() as test_client:
+        test_client.fake_bedrock = fake
+        yield test_client
+
+
+def write_notes(tmp_path, name="heaps.txt"):
+    path = tmp_path / name
+    path.write_text("A binary heap is a complete tree.\nThe minimum sits at the root.\n")
+    return str(path)
+
+
+def test_ingest_stores_artifacts_and_skips_unchanged_files(client, tmp_path):
+    path = write_notes(tmp_path)
+
+    response = client.post("/api/ingest", json={"filePath": path})
+    assert response.status_code == 202
+    ai_app.ingest_queue.submit(path).result(timeout=10)
+
+    artifacts = ingest_pipeline.fresh_artifacts(path)
+    assert artifacts["status"] == "ready"
+    assert artifacts["summary"] == "Heaps keep the smallest element at the root."
+    assert artifacts["keywords"] == ["heaps", "priority queues"]
+    assert len(artifacts["questions"]) == 5
+    assert artifacts["flashcards"][0] == {"question": "Card question 0?", "answer": "Answer 0"}
+    assert client.get("/api/ingest", query_string={"filePath": path}).get_json()["status"] == "ready"
+
+    # Touching the file without editing it must not regenerate anything
+    calls = client.fake_bedrock.calls
+    os.utime(path, (1, 1))
+    assert ingest_pipeline.needs_ingest(path)
+    ingest_pipeline.ingest_document(path, ai_app.generate_ingest_artifacts)
+    assert client.fake_bedrock.calls == calls
+    assert ingest_pipeline.fresh_artifacts(path) is not None
+
+
+def test_actions_answer_from_artifacts_without_bedrock(client, tmp_path):
+    first = write_notes(tmp_path, "heaps.txt")
+    second = write_notes(tmp_path, "graphs.txt")
+    for path in (first, second):
+        ingest_pipeline.ingest_document(path, ai_app.generate_ingest_artifacts)
+    calls = client.fake_bedrock.calls
+
+    summary = client.post("/api", json={
+        "action": "getSummary", "notesContent": "notes", "filePaths": [first], "usePrecomputed": True,
+    }).get_json()
+    cards = client.post("/api", json={
+        "action": "getFlashCards", "notesContent": "notes", "numCards": 4,
+        "filePaths": [first, second], "usePrecomputed": True,
+    }).get_json()
+
+    assert client.fake_bedrock.calls == calls
+    assert summary == {"reply": "Heaps keep the smallest element at the root.", "precomputed": True}
+    # Both documents have the same starter cards; each is served once
+    assert cards["reply"].split("\n") == [
+        "Card question 0?", "Answer 0", "Card question 1?", "Answer 1",
+        "Card question 2?", "Answer 2", "Card question 3?", "Answer 3",
+    ]
+
+    # A custom topic can't be served from the generic artifacts
+    client.post("/api", json={
+        "action": "getSummary", "notesContent": "notes", "query": "heap sort", "filePaths": [first],
+    })
+    assert client.fake_bedrock.calls == calls + 1
+
+
+def test_starter_set_is_not_served_again(client, tmp_path):
+    path = write_notes(tmp_path)
+    ingest_pipeline.ingest_document(path, ai_app.generate_ingest_artifacts)
+    request = {"action": "getQuestions", "notesContent": "notes", "numQuestions": 5,
+               "filePaths": [path], "usePrecomputed": True}
+
+    first = client.post("/api", json=request).get_json()
+    calls = client.fake_bedrock.calls
+    second = client.post("/api", json=request).get_json()
+    ai_app.bank.drain()
+
+    assert first["precomputed"] is True
+    assert "precomputed" not in second and client.fake_bedrock.calls > calls
+    # The scripted model only knows the starter questions, so nothing new is left
+    assert second["reply"] == "" and second["shortfall"] == 5
+
+
+def test_invalid_count_is_rejected_even_with_fresh_artifacts(client, tmp_path):
+    path = write_notes(tmp_path)
+    ingest_pipeline.ingest_document(path, ai_app.generate_ingest_artifacts)
+
+    response = client.post("/api", json={"action": "getQuestions", "notesContent": "notes", "numQuestions": "five",
+                                         "filePaths": [path], "usePrecomputed": True})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "'numQuestions' must be a number."
+
+
+def test_edited_file_is_not_served_stale_and_is_requeued(client, tmp_path):
+    path = write_notes(tmp_path)
+    ingest_pipeline.ingest_document(path, ai_app.generate_ingest_artifacts)
+
+    with open(path, "a") as f:
+        f.write("Insertion sifts the new element up.\n")
+
+    response = client.post("/api", json={
+        "action": "getSummary", "notesContent": "notes", "filePaths": [path], "usePrecomputed": True,
+    }).get_json()
+    assert "precomputed" not in response
+
+    ai_app.ingest_queue.submit(path).result(timeout=10)
+    assert ingest_pipeline.fresh_artifacts(path) is not None
+
+
+def test_edited_pdf_only_resummarizes_changed_page_groups(client, tmp_path, monkeypatch):
+    from test_incremental_extractor import write_pdf
+    monkeypatch.setattr(ingest_pipeline, "PAGE_GROUP_MODULUS", 1)  # one page per group
+    summarized = []
+    summarize = ai_app.generate_from_notes
+    monkeypatch.setattr(ai_app, "generate_from_notes", lambda action, notes, *args, **kwargs: (
+        summarized.append(notes.text()) if action == "getSummary" else None) or summarize(action, notes, *args, **kwargs))
+
+    pdf = tmp_path / "lecture.pdf"
+    write_pdf(pdf, ["Heaps keep order", "Tries share prefixes", "Graphs have edges"])
+    ingest_pipeline.ingest_document(str(pdf), ai_app.generate_ingest_artifacts)
+    assert len(summarized) == 3  # one summary per page group
+
+    # Re-saved with identical pages: the artifacts are kept
+    with open(pdf, "ab") as f:
+        f.write(b"\n")
+    calls = client.fake_bedrock.calls
+    ingest_pipeline.ingest_document(str(pdf), ai_app.generate_ingest_artifacts)
+    assert client.fake_bedrock.calls == calls
+    assert ingest_pipeline.fresh_artifacts(str(pdf))["status"] == "ready"
+
+    # An inserted page is the only group summarized again
+    del summarized[:]
+    write_pdf(pdf, ["Heaps keep order", "Hash tables hash keys", "Tries share prefixes", "Graphs have edges"])
+    artifacts = ingest_pipeline.ingest_document(str(pdf), ai_app.generate_ingest_artifacts)
+    assert artifacts["pages"] == 4
+    assert summarized == ["Hash tables hash keys"]
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test the fast JSON codec used for API bodies and Bedrock payloads
+"""
+
+import json
+
+import app as ai_app
+import json_codec
+
+
+def test_bedrock_body_matches_standard_json():
+    notes = 'Quotes "inside", a backslash \\, tabs\t, emoji 📚 and accents: café\n' * 100
+    messages = [
+        {"role": "user", "content": notes},
+        {"role": "assistant", "content": "Okay, I have received the notes."},
+        {"role": "user", "content": "Summarize them."},
+    ]
+
+    body = json_codec.bedrock_request_body("Be helpful.", messages, 512, temperature=0.2)
+
+    assert json.loads(body) == {
+        "anthropic_version": "bedrock-2023-05-31",
+        "system": "Be helpful.",
+        "messages": messages,
+        "max_tokens": 512,
+        "temperature": 0.2,
+    }
+
+
+def test_short_strings_are_encoded_once_and_notes_are_not_kept():
+    json_codec._encode_short_string.cache_clear()
+    notes = "Photosynthesis converts light into chemical energy. " * 1000
+    for prompt in ("Summarize.", "Write questions.", "Write flashcards."):
+        json_codec.bedrock_request_body("", [{"role": "user", "content": notes},
+                                             {"role": "user", "content": prompt}], 256, temperature=0.2)
+
+    info = json_codec._encode_short_string.cache_info()
+    # The role, version and system strings were each encoded once and then reused
+    assert info.hits >= 2 * 3
+    assert info.misses == 3 + 3
+    assert info.currsize == 6  # the notes are not held by the cache
+
+
+def test_flask_round_trip_and_stdlib_fallback():
+    ai_app.app.testing = True
+    with ai_app.app.test_request_context():
+        response = ai_app.create_success_response({"reply": "naïve résumé", "big": 2 ** 70, 3: "int key"})
+    assert json.loads(response.get_data()) == {"reply": "naïve résumé", "big": 2 ** 70, "3": "int key"}
+
+    assert json_codec.loads(json_codec.dumps({"a": [1, 2.5, None, True]})) == {"a": [1, 2.5, None, True]}
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
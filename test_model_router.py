@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test latency-aware routing between the fast and large models
+"""
+
+import io
+import json
+
+import app as ai_app
+import summary_cache
+from model_router import ModelRouter
+
+FAST = "anthropic.claude-3-haiku-20240307-v1:0"
+LARGE = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+
+
+def test_heavy_actions_use_the_large_model_only_within_their_slo():
+    router = ModelRouter(FAST, LARGE)
+
+    assert router.choose("getKeywords", 50, 500) == FAST
+    assert router.choose("getSummary", 5000, 2000) == LARGE
+    assert router.choose("getQuestions", 30000, 1000) == LARGE  # big input
+
+    # The large model turns out to be slow today: 90s for 2000 tokens
+    for _ in range(5):
+        router.observe(LARGE, 90.0, 2000)
+    assert router.predict(LARGE, 2000) > router.slo_seconds["getSummary"]
+    assert router.choose("getSummary", 5000, 2000) == FAST
+
+
+def test_light_actions_follow_the_measured_fastest_model():
+    router = ModelRouter(FAST, LARGE)
+    for _ in range(5):
+        router.observe(FAST, 12.0, 400)
+        router.observe(LARGE, 3.0, 400)
+
+    assert router.choose("getKeywords", 50, 500) == LARGE
+    assert router.stats()["models"][FAST]["calls"] == 5
+
+
+def test_a_model_that_lost_the_routing_is_still_measured():
+    router = ModelRouter(FAST, LARGE, explore_every=10)
+    router.observe(FAST, 12.0, 50)  # one slow call moves the estimate only part of the way
+    assert router.predict(FAST, 50) < 12.0
+
+    for _ in range(4):
+        router.observe(FAST, 12.0, 50)
+    choices = [router.choose("getKeywords", 50, 50) for _ in range(50)]
+    assert choices.count(FAST) == 5  # every tenth call keeps measuring it
+
+    # Fast again: a few exploration calls win the routing back
+    for _ in range(15):
+        router.observe(FAST, 0.3, 50)
+    assert router.choose("getKeywords", 50, 50, explore=False) == FAST
+
+
+def test_calls_are_sent_to_the_routed_model(monkeypatch, tmp_path):
+    used = []
+
+    class RecordingBedrock:
+        def invoke_model(self, **kwargs):
+            used.append(kwargs["modelId"])
+            payload = {"content": [{"type": "text", "text": "reply"}], "usage": {"input_tokens": 10, "output_tokens": 5}}
+            return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    monkeypatch.setattr(ai_app, "bedrock", RecordingBedrock())
+    monkeypatch.setattr(ai_app, "router", ModelRouter(FAST, LARGE))
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_DIR", str(tmp_path))
+
+    with ai_app.app.test_client() as client:
+        client.post("/api", json={"action": "getKeywords", "prompt": "heaps"})
+        client.post("/api", json={"action": "getSummary", "notesContent": "Heaps are trees."})
+        stats = client.get("/api/models").get_json()
+
+    assert used == [FAST, LARGE]
+    assert stats["models"][LARGE]["calls"] == 1
+
+
+def test_summaries_are_cached_per_serving_model(monkeypatch, tmp_path):
+    used = []
+
+    class RecordingBedrock:
+        def invoke_model(self, **kwargs):
+            used.append(kwargs["modelId"])
+            text = f"summary by {kwargs['modelId']}"
+            payload = {"content": [{"type": "text", "text": text}], "usage": {"input_tokens": 10, "output_tokens": 5}}
+            return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    router = ModelRouter(FAST, LARGE)
+    monkeypatch.setattr(ai_app, "bedrock", RecordingBedrock())
+    monkeypatch.setattr(ai_app, "router", router)
+    monkeypatch.setattr(ai_app, "HEDGING", False)
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_DIR", str(tmp_path))
+
+    assert ai_app.summarize_notes("Heaps are trees.")[0] == f"summary by {LARGE}"
+    assert ai_app.summarize_notes("Heaps are trees.")[0] == f"summary by {LARGE}"
+    assert used == [LARGE]
+
+    # The large model is too slow today, so summaries are routed to the fast
+    # one, which must not be handed the large model's cached summary
+    for _ in range(5):
+        router.observe(LARGE, 300.0, 200)
+    assert ai_app.summarize_notes("Heaps are trees.")[0] == f"summary by {FAST}"
+    assert ai_app.summarize_notes("Heaps are trees.")[0] == f"summary by {FAST}"
+    assert used == [LARGE, FAST]
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test the OCR fallback for image-only PDF pages (uses a stand-in OCR engine)
+"""
+
+import subprocess
+import threading
+import time
+
+import pdfplumber
+
+import ocr_extractor
+from ocr_extractor import ocr_pdf_pages
+from pdf_extractor import pdf_page_fingerprints
+
+SCANNED_PDF = "AI/results/picturePDF.pdf"
+
+
+def fake_engine(file_path, page_index, timeout):
+    return f"scanned text of page {page_index + 1}"
+
+
+def failing_engine(file_path, page_index, timeout):
+    raise AssertionError("cached pages must not be OCR'd again")
+
+
+def slow_engine(file_path, page_index, timeout):
+    if page_index == 1:
+        time.sleep(3)
+    return f"page {page_index + 1}"
+
+
+def test_ocr_results_are_cached_by_page_hash(tmp_path):
+    """OCR runs once per page; later calls are answered from the cache"""
+    fingerprints = pdf_page_fingerprints(SCANNED_PDF)
+    cache = str(tmp_path)
+
+    first = ocr_pdf_pages(SCANNED_PDF, [0, 2], fingerprints, cache_dir=cache, engine=fake_engine)
+    second = ocr_pdf_pages(SCANNED_PDF, [0, 2], fingerprints, cache_dir=cache, engine=failing_engine)
+
+    assert first == {0: "scanned text of page 1", 2: "scanned text of page 3"}
+    assert second == first
+
+
+def test_slow_pages_time_out_without_blocking_others(tmp_path):
+    """A page that exceeds the timeout is dropped and not cached"""
+    fingerprints = pdf_page_fingerprints(SCANNED_PDF)
+
+    result = ocr_pdf_pages(SCANNED_PDF, [0, 1], fingerprints, workers=2, timeout=1,
+                           cache_dir=str(tmp_path), engine=slow_engine)
+
+    assert result == {0: "page 1"}
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_queued_pages_share_one_deadline(tmp_path):
+    """Pages waiting for a worker don't each get a fresh timeout"""
+    fingerprints = pdf_page_fingerprints(SCANNED_PDF)
+    timeouts = []
+
+    def steady_engine(file_path, page_index, timeout):
+        timeouts.append(timeout)
+        time.sleep(0.4)
+        return f"page {page_index + 1}"
+
+    start = time.monotonic()
+    result = ocr_pdf_pages(SCANNED_PDF, [0, 1, 2], fingerprints, workers=1, timeout=1, total_timeout=1,
+                           cache_dir=str(tmp_path), engine=steady_engine)
+
+    assert time.monotonic() - start < 1.5
+    assert sorted(result) == [0, 1]
+    assert timeouts[0] <= 1 and timeouts[1] < 0.7  # the second page only gets what was left
+
+
+def test_cache_is_keyed_by_resolution_and_language(tmp_path, monkeypatch):
+    """Changing the OCR settings re-runs OCR instead of returning stale text"""
+    fingerprints = pdf_page_fingerprints(SCANNED_PDF)
+    cache = str(tmp_path)
+    ocr_pdf_pages(SCANNED_PDF, [0], fingerprints, cache_dir=cache, engine=fake_engine)
+
+    monkeypatch.setattr(ocr_extractor, "OCR_LANGUAGE", "deu")
+    german = ocr_pdf_pages(SCANNED_PDF, [0], fingerprints, cache_dir=cache,
+                           engine=lambda path, i, timeout: "gescannter Text")
+    monkeypatch.setattr(ocr_extractor, "OCR_RESOLUTION", 150)
+    low_resolution = ocr_pdf_pages(SCANNED_PDF, [0], fingerprints, cache_dir=cache,
+                                   engine=lambda path, i, timeout: "low resolution text")
+
+    assert german == {0: "gescannter Text"}
+    assert low_resolution == {0: "low resolution text"}
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_pages_are_rendered_one_at_a_time_within_the_page_timeout(tmp_path, monkeypatch):
+    """PDFium is never entered concurrently, and tesseract only gets the time the render left"""
+    fingerprints = pdf_page_fingerprints(SCANNED_PDF)
+    lock = threading.Lock()
+    rendering, overlaps, tesseract_timeouts = [], [], []
+
+    class Image:
+        def save(self, path):
+            pass
+
+    class Rendered:
+        original = Image()
+
+    def to_image(page, resolution):
+        with lock:
+            rendering.append(page.page_number)
+            overlaps.append(len(rendering))
+        time.sleep(0.2)
+        with lock:
+            rendering.remove(page.page_number)
+        return Rendered()
+
+    def run(args, timeout, **kwargs):
+        tesseract_timeouts.append(timeout)
+        return subprocess.CompletedProcess(args, 0, stdout="scanned", stderr="")
+
+    monkeypatch.setattr(pdfplumber.page.Page, "to_image", to_image)
+    monkeypatch.setattr(ocr_extractor.subprocess, "run", run)
+    result = ocr_pdf_pages(SCANNED_PDF, [0, 1, 2], fingerprints, workers=3, timeout=5, cache_dir=str(tmp_path))
+
+    assert result == {0: "scanned", 1: "scanned", 2: "scanned"}
+    assert max(overlaps) == 1
+    assert all(timeout < 4.9 for timeout in tesseract_timeouts)
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
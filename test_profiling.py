@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test the on-demand, token-gated request profiler
+"""
+
+import io
+import json
+import os
+
+import pytest
+
+import app as ai_app
+import profiling
+import summary_cache
+
+
+class FakeBedrock:
+    def invoke_model(self, **kwargs):
+        payload = {"content": [{"type": "text", "text": "heap\ntree"}], "usage": {"output_tokens": 2}}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+@pytest.fixture
+def profile_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "s3cret")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(profiling, "_recent", profiling.deque())
+    monkeypatch.setattr(ai_app, "bedrock", FakeBedrock())
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_DIR", str(tmp_path / "summary_cache"))
+    return str(tmp_path / "profiles")
+
+
+def test_profile_captures_cpu_and_allocations(tmp_path):
+    profile = profiling.Profile("build").start()
+    blocks = [bytearray(1024) for _ in range(2000)]
+    sorted(range(100000), key=lambda i: -i)
+    summary = profile.stop(str(tmp_path))
+
+    assert len(blocks) == 2000
+    assert summary["allocations"]["peak_bytes"] >= 2000 * 1024
+    assert any("test_profiling.py" in a["where"] for a in summary["allocations"]["top"])
+    assert any("sorted" in f["function"] for f in summary["top_functions"])
+    assert os.path.isfile(tmp_path / f"{summary['id']}.prof")
+    assert profiling.load_summary(summary["id"], str(tmp_path)) == summary
+    assert profiling.load_summary("../etc/passwd", str(tmp_path)) is None
+
+
+def test_requests_are_profiled_only_with_the_token(profile_dir):
+    body = {"action": "getKeywords", "prompt": "heaps"}
+    with ai_app.app.test_client() as client:
+        plain = client.post("/api", json=body)
+        wrong = client.post("/api", json=body, headers={"X-Profile": "1", "X-Profile-Token": "guess"})
+        profiled = client.post("/api?profile=1", json=body, headers={"X-Profile-Token": "s3cret"})
+        fetched = client.get(f"/api/profiles/{profiled.headers['X-Profile-Id']}",
+                             headers={"X-Profile-Token": "s3cret"})
+        forbidden = client.get(f"/api/profiles/{profiled.headers['X-Profile-Id']}")
+
+    assert "X-Profile-Status" not in plain.headers
+    assert wrong.headers["X-Profile-Status"] == profiling.UNAUTHORIZED and "X-Profile-Id" not in wrong.headers
+    assert profiled.status_code == 200 and profiled.headers["X-Profile-Status"] == "recorded"
+    summary = fetched.get_json()
+    assert summary["label"] == "POST /api"
+    assert summary["request_id"] == profiled.headers["X-Request-ID"]
+    assert any("call_bedrock" in f["function"] for f in summary["top_functions"])
+    assert forbidden.status_code == 403
+
+
+def test_profiling_is_rate_limited(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MAX_PER_MINUTE", 2)
+    headers = {"X-Profile": "1", "X-Profile-Token": "s3cret"}
+    with ai_app.app.test_client() as client:
+        statuses = [client.post("/api", json={"action": "getKeywords", "prompt": "heaps"}, headers=headers)
+                    .headers["X-Profile-Status"] for _ in range(3)]
+
+    assert statuses == ["recorded", "recorded", profiling.RATE_LIMITED]
+    assert len([name for name in os.listdir(profile_dir) if name.endswith(".prof")]) == 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
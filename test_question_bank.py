@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test the per-document question banks and near-duplicate filtering
+"""
+
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+
+import pytest
+
+import app as ai_app
+import question_bank
+import summary_cache
+import token_budget
+from question_bank import QuestionBank, minhash, similarity
+
+NOTES = "=== Heaps.pdf ===\nA binary heap is a complete tree stored in an array.\n\n"
+
+
+class NumberedBedrock:
+    """Answers each questions prompt with that many distinct, numbered questions."""
+
+    def __init__(self):
+        self.requests = []
+
+    def invoke_model(self, **kwargs):
+        body = json.loads(kwargs["body"])
+        self.requests.append(body)
+        count = int(re.search(r"(\d+)", body["messages"][-1]["content"]).group(1))
+        start = len(self.requests) * 100
+        text = "\n".join(f"Question {start + i}: explain heap property number {start + i} in detail?"
+                         for i in range(count))
+        payload = {"content": [{"type": "text", "text": text}]}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+def test_reworded_questions_are_near_duplicates():
+    original = minhash("What is the time complexity of inserting into a binary heap?")
+    reworded = minhash("What is the time complexity of inserting into a binary heap")
+    unrelated = minhash("Explain how Dijkstra's algorithm finds shortest paths in a graph.")
+
+    assert similarity(original, reworded) >= question_bank.NEAR_DUPLICATE_THRESHOLD
+    assert similarity(original, unrelated) < question_bank.NEAR_DUPLICATE_THRESHOLD
+
+
+def test_bank_filters_duplicates_and_never_serves_twice(tmp_path):
+    batches = [["What is a heap?", "What is a heap", "Why are heaps stored in arrays?"],
+               ["What is a heap?", "How does sift-down restore the heap order?"]]
+    bank = QuestionBank(lambda kind, text, count, query: batches.pop(0), bank_dir=str(tmp_path))
+    key, text = bank.documents(NOTES, "")[0]
+
+    assert bank.refill("questions", key, text) == 2
+    served = bank.take("questions", NOTES, 2)
+    bank.drain()  # the bank went low, so a refill was queued
+
+    assert served == ["What is a heap?", "Why are heaps stored in arrays?"]
+    assert bank.unserved("questions", NOTES) == 1  # the served question was not banked again
+    assert bank.take("questions", NOTES, 5) is None
+    bank.shutdown()
+
+
+def test_get_questions_is_served_from_the_refilled_bank(monkeypatch, tmp_path):
+    fake = NumberedBedrock()
+    monkeypatch.setattr(ai_app, "bedrock", fake)
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_DIR", str(tmp_path / "summary_cache"))
+    monkeypatch.setattr(token_budget, "ledger", token_budget.UsageLedger())
+    monkeypatch.setattr(ai_app, "bank", QuestionBank(ai_app._refill_bank, bank_dir=str(tmp_path / "bank")))
+    request = {"action": "getQuestions", "notesContent": NOTES, "numQuestions": 3}
+
+    with ai_app.app.test_client() as client:
+        first = client.post("/api", json=request).get_json()
+        ai_app.bank.drain()
+        calls = len(fake.requests)
+        second = client.post("/api", json=request).get_json()
+
+    assert first["fromBank"] is False and second["fromBank"] is True
+    assert calls == 2  # the live request and one background refill
+    assert len(fake.requests) == calls  # the second request needed no Bedrock call
+    assert not set(first["reply"].splitlines()) & set(second["reply"].splitlines())
+    ai_app.bank.drain()
+
+
+def test_only_the_latest_served_items_are_remembered(monkeypatch, tmp_path):
+    monkeypatch.setattr(question_bank, "SEEN_LIMIT", 2)
+    bank = QuestionBank(lambda kind, text, count, query: [], bank_dir=str(tmp_path))
+    starters = ["What is a heap?", "Why are heaps stored in arrays?", "How does sift-down work?"]
+
+    assert bank.take_unserved("questions", NOTES, starters, 2) == starters[:2]
+    assert bank.take_unserved("questions", NOTES, starters, 2) is None
+    assert bank.record_served("questions", NOTES, starters) == [starters[2]]
+    # "What is a heap?" was forgotten once the limit was reached
+    assert bank.take_unserved("questions", NOTES, starters, 1) == starters[:1]
+    bank.shutdown()
+
+
+def _take_questions(bank_dir, rounds, results):
+    bank = QuestionBank(lambda kind, text, count, query: [], bank_dir=bank_dir)
+    for _ in range(rounds):
+        results.put(bank.take("questions", NOTES, 1))
+    bank.drain()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork() like serve.py")
+def test_worker_processes_never_serve_the_same_item(tmp_path):
+    rng = random.Random(5)
+    questions = [" ".join("".join(rng.choice("abcdefghij") for _ in range(6)) for _ in range(6)) + "?"
+                 for _ in range(40)]
+    bank = QuestionBank(lambda kind, text, count, query: questions, bank_dir=str(tmp_path))
+    key, text = bank.documents(NOTES, "")[0]
+    assert bank.refill("questions", key, text) == 40
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [context.Process(target=_take_questions, args=(str(tmp_path), 10, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    served = [results.get(timeout=10) for _ in range(40)]
+    for worker in workers:
+        worker.join(timeout=10)
+
+    assert all(batch is not None for batch in served)
+    assert sorted(item for batch in served for item in batch) == sorted(questions)
+    bank.shutdown()
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
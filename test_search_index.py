@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test the positional search index and the ranked search action
+"""
+
+import random
+import string
+import time
+
+import pytest
+
+import app as ai_app
+import search_index
+from search_index import SearchIndex, TrigramIndex, edit_distance, format_results, match_catalog, parse_query
+
+NOTES = (
+    "=== Lecture.pdf ===\n" + "Scheduling and filler material for the course. " * 250
+    + "The binary heap property keeps the minimum key at the root.\n" + "Closing remarks. " * 40
+    + "\n=== Heaps.pdf ===\nHeap sort uses a binary heap. A binary tree is not always a binary heap."
+    + "\n=== Graphs.pdf ===\nGraphs have vertices and edges.\n"
+)
+
+
+class NoBedrock:
+    def invoke_model(self, **kwargs):
+        raise AssertionError("searching the notes must not call Bedrock")
+
+
+def test_results_are_ranked_with_snippets_around_late_matches():
+    index = SearchIndex(NOTES)
+    results = index.search("binary heap", top_k=5)
+
+    assert [r["title"] for r in results] == ["Heaps.pdf", "Lecture.pdf"]
+    late = results[1]
+    assert late["offset"] > 10000 and late["truncatedStart"] and late["truncatedEnd"]
+    assert len(late["snippet"]) <= search_index.SNIPPET_CHARS
+    assert [late["snippet"][s:e] for s, e in late["highlights"]] == ["binary", "heap"]
+    assert index.search("binary heap", top_k=1) == results[:1]
+
+
+def test_phrases_must_match_in_order():
+    index = SearchIndex(NOTES)
+
+    assert parse_query('"heap property" root') == ([["heap", "property"]], ["root"])
+    results = index.search('"heap property" root')
+    assert [r["title"] for r in results] == ["Lecture.pdf"]
+    assert [results[0]["snippet"][s:e] for s, e in results[0]["highlights"]] == ["heap property", "root"]
+    assert index.search('"property heap"') == []
+    assert "**heap property**" in format_results("q", results)
+
+
+def test_index_is_built_once_per_notes_content(monkeypatch):
+    builds = []
+    monkeypatch.setattr(search_index, "_cache", search_index.OrderedDict())
+    monkeypatch.setattr(search_index, "SearchIndex", lambda notes: builds.append(notes) or SearchIndex(notes))
+
+    first = search_index.get_index(NOTES)
+    assert search_index.get_index("".join(list(NOTES))) is first
+    search_index.get_index(NOTES + "more")
+    assert len(builds) == 2
+
+
+def test_misspelled_words_match_within_a_bounded_edit_distance():
+    notes = "=== FastSHAP.pdf ===\nFastSHAP optimization techniques for Shapley values.\n=== Stroop.pdf ===\nStroop test."
+    index = SearchIndex(notes)
+
+    assert edit_distance("technqiues", "techniques", 2) == 1  # a transposition is one edit
+    assert edit_distance("heap", "graph", 1) == 2
+    assert [r["title"] for r in index.search("FastSHARP technqiues")] == ["FastSHAP.pdf"]
+    assert index.search('"optimisation technqiues"')[0]["title"] == "FastSHAP.pdf"
+    assert index.search("tset") == []  # short words must match exactly
+    exact, fuzzy = index.search("techniques")[0], index.search("technqiues")[0]
+    assert fuzzy["score"] < exact["score"] and fuzzy["highlights"] == exact["highlights"]
+
+    catalog = {"a.pdf": "FastSHAP Optimization techniques", "b.pdf": "Stroop test", "c.pdf": "Heaps"}
+    assert match_catalog(catalog, ["Shapley", "FastSHARP", "optimisation technqiues"]) == ["a.pdf"]
+    assert match_catalog(catalog, ["stroop"]) == ["b.pdf"]
+
+
+def test_fuzzy_lookup_stays_close_to_exact_cost():
+    rng = random.Random(7)
+    vocabulary = {"".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12))) for _ in range(50000)}
+    words = sorted(vocabulary)
+    trigram_index = TrigramIndex(words)
+    queries = rng.sample(words, 200)
+    typos = [w[:2] + w[3] + w[2] + w[4:] if len(w) > 4 else w for w in queries]
+
+    start = time.perf_counter()
+    found = [trigram_index.lookup(typo) for typo in typos]
+    per_query = (time.perf_counter() - start) / len(typos)
+
+    assert all(query in matches for query, matches in zip(queries, found))
+    assert per_query < 0.005
+
+
+def test_search_action_returns_top_k_results(monkeypatch):
+    monkeypatch.setattr(ai_app, "bedrock", NoBedrock())
+
+    with ai_app.app.test_client() as client:
+        response = client.post("/api", json={"action": "search", "prompt": "binary heap", "topK": 1,
+                                             "notesContent": NOTES, "yamlContent": "a: b"})
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [r["title"] for r in data["results"]] == ["Heaps.pdf"]
+    assert data["reply"].startswith("**Search Results for: binary heap**")
+    assert "[Content truncated" not in data["reply"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test the production entry point: readiness, liveness and graceful shutdown
+"""
+
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import app as ai_app
+import serve
+
+
+def test_readiness_follows_warm_up_and_drain(monkeypatch):
+    monkeypatch.setattr(ai_app, "service_state", {"started": time.time(), "ready": False, "draining": False})
+    ai_app.app.testing = True
+    with ai_app.app.test_client() as client:
+        assert client.get("/healthz").status_code == 200
+        assert client.get("/readyz").status_code == 503
+
+        ai_app.warm_up()
+        assert client.get("/readyz").get_json()["status"] == "ready"
+
+        ai_app.begin_drain()
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.get_json() == {"status": "draining"}
+        # Still alive while draining
+        assert client.get("/healthz").status_code == 200
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="pre-forking needs fork()")
+def test_prefork_server_serves_and_drains():
+    server = subprocess.Popen(
+        [sys.executable, "-u", "serve.py", "--workers", "2", "--port", "0", "--drain-grace", "1",
+         "--drain-timeout", "10"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    try:
+        port = None
+        for line in server.stdout:
+            match = re.search(r"Serving on http://[\d.]+:(\d+)", line)
+            if match:
+                port = int(match.group(1))
+                break
+        assert port, "server did not start"
+
+        url = f"http://127.0.0.1:{port}"
+        for _ in range(50):
+            try:
+                with urllib.request.urlopen(url + "/readyz", timeout=2) as response:
+                    assert json.load(response)["status"] == "ready"
+                    break
+            except urllib.error.URLError:
+                time.sleep(0.1)
+        else:
+            pytest.fail("workers never became ready")
+
+        with urllib.request.urlopen(url + "/healthz", timeout=2) as response:
+            assert json.load(response)["pid"] != server.pid
+
+        server.send_signal(signal.SIGTERM)
+        # Workers keep answering during the grace period, reporting draining
+        for _ in range(20):
+            try:
+                urllib.request.urlopen(url + "/readyz", timeout=2).close()
+                time.sleep(0.05)
+            except urllib.error.HTTPError as e:
+                assert e.code == 503 and json.load(e)["status"] == "draining"
+                break
+        else:
+            pytest.fail("/readyz never reported draining")
+
+        assert server.wait(timeout=15) == 0
+        assert server.stdout.read().count("drained") == 2
+    finally:
+        if server.poll() is None:
+            server.kill()
+        server.stdout.close()
+
+
+def test_workers_that_die_at_startup_are_respawned_with_backoff():
+    delays = [serve.respawn_backoff(0.1, 0.0)]
+    for _ in range(6):
+        delays.append(serve.respawn_backoff(0.1, delays[-1]))
+
+    assert delays == [1.0, 2.0, 4.0, 8.0, 16.0, 30.0, 30.0]
+    # A worker that ran for a while is replaced at once
+    assert serve.respawn_backoff(serve.RESPAWN_MIN_UPTIME, 30.0) == 0.0
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
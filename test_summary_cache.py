@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test per-document summary caching for multi-document study group notes
+"""
+
+from summary_cache import hierarchical_summary, split_documents
+
+
+def group_notes(count):
+    return "\n\n".join(f"=== Lecture {i} (PDF from CSE 332) ===\nContent of lecture {i}." for i in range(count))
+
+
+class Summarizer:
+    def __init__(self):
+        self.documents = []
+        self.merges = 0
+
+    def summarize(self, document):
+        self.documents.append(document)
+        return "summary of " + document.splitlines()[-1]
+
+    def combine(self, summaries):
+        self.merges += 1
+        return " | ".join(summary for _, summary in summaries)
+
+
+def test_split_documents_keeps_titles_and_bodies():
+    documents = split_documents("Loose intro\n=== A.pdf ===\nfirst\n\n=== B.txt ===\nsecond\n")
+
+    assert documents == [("", "Loose intro"), ("A.pdf", "first"), ("B.txt", "second")]
+
+
+def test_adding_a_document_costs_one_summary_and_one_merge(tmp_path):
+    summarizer = Summarizer()
+    cache_dir = str(tmp_path)
+
+    first, stats = hierarchical_summary(group_notes(30), summarizer.summarize, summarizer.combine,
+                                        query="exam", cache_dir=cache_dir)
+    assert len(summarizer.documents) == 30 and summarizer.merges == 1
+    assert stats == {"documents": 30, "cached_documents": 0, "combined_cached": False}
+
+    summarizer.documents.clear()
+    second, stats = hierarchical_summary(group_notes(31), summarizer.summarize, summarizer.combine,
+                                         query="exam", cache_dir=cache_dir)
+    assert summarizer.documents == ["Content of lecture 30."]
+    assert summarizer.merges == 2
+    assert stats["cached_documents"] == 30
+    assert second.startswith(first)
+
+    # The exact same set again is served entirely from the cache
+    third, stats = hierarchical_summary(group_notes(31), summarizer.summarize, summarizer.combine,
+                                        query="exam", cache_dir=cache_dir)
+    assert third == second and stats["combined_cached"] and summarizer.merges == 2
+
+    # A different topic must not reuse the summaries
+    hierarchical_summary(group_notes(2), summarizer.summarize, summarizer.combine,
+                         query="graphs", cache_dir=cache_dir)
+    assert len(summarizer.documents) == 3
+
+
+def test_documents_are_summarized_without_their_titles(tmp_path):
+    summarizer = Summarizer()
+    hierarchical_summary("=== Week 1.pdf ===\nHeaps.\n=== Week 2.pdf ===\nTries.", summarizer.summarize,
+                         summarizer.combine, cache_dir=str(tmp_path))
+    _, stats = hierarchical_summary("=== Heaps.pdf ===\nHeaps.\n=== Tries.pdf ===\nTries.",
+                                    summarizer.summarize, summarizer.combine, cache_dir=str(tmp_path))
+
+    # The summaries can't mention the old titles, so a rename reuses them;
+    # only the merge, which is shown the titles, is redone
+    assert summarizer.documents == ["Heaps.", "Tries."]
+    assert stats["cached_documents"] == 2 and not stats["combined_cached"] and summarizer.merges == 2
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test boilerplate stripping on extracted PDF text
+"""
+
+from text_normalizer import normalize_text
+
+
+def make_pages(bodies):
+    return "\n\n".join(
+        f"--- Page {i} ---\nCSE 332: Data Structures\n{body}\n{i}"
+        for i, body in enumerate(bodies, start=1)
+    )
+
+
+def test_running_headers_and_page_numbers_are_removed():
+    """Lines repeated at the edge of most pages and bare page numbers are dropped"""
+    text = make_pages(["Heaps are trees.", "Dijkstra uses a heap.", "Hash tables map keys.", "AVL trees balance."])
+
+    normalized, report = normalize_text(text)
+
+    assert "CSE 332" not in normalized
+    assert normalized.startswith("--- Page 1 ---\nHeaps are trees.")
+    assert "\n4\n" not in normalized + "\n"
+    assert report["boilerplate_lines"] == 8
+    assert report["chars_saved"] == len(text) - len(normalized) > 0
+    assert report["tokens_saved"] > 0
+
+
+def test_years_at_page_edges_are_kept_and_empty_pages_lose_their_marker():
+    """Only numbers that track the page index are page numbers"""
+    text = make_pages(["2019", "Dijkstra uses a heap.", "", "AVL trees balance.\n1962"])
+    # A book whose printed numbers run 10 ahead of the PDF's pages
+    topics = ["Heaps.", "Graphs.", "Tries.", "Sorting."]
+    book = "\n\n".join(f"--- Page {i} ---\n{topic}\n{i + 10}" for i, topic in enumerate(topics, start=1))
+
+    normalized, _ = normalize_text(text)
+
+    assert normalized.startswith("--- Page 1 ---\n2019\n\n--- Page 2 ---")
+    assert normalized.endswith("--- Page 4 ---\nAVL trees balance.\n1962")
+    assert "--- Page 3 ---" not in normalized
+    assert normalize_text(book)[0].split("\n")[:3] == ["--- Page 1 ---", "Heaps.", ""]
+
+
+def test_hyphenation_and_whitespace():
+    """Split words are rejoined; real compounds keep their hyphen"""
+    text = "An example of a golden-\nhaired exam-\nple   with\t\ttabs.\n\n\n\nDone."
+
+    normalized, _ = normalize_text(text)
+
+    assert normalized == "An example of a golden-haired\nexample\nwith tabs.\n\nDone."
+
+
+def test_documents_are_normalized_independently():
+    """A header repeated in one document is not stripped from the next"""
+    lecture = make_pages(["Shortest paths.", "Negative cycles.", "Topological sort."])
+    text = f"=== Lecture 12 ===\n{lecture}\n\n=== Syllabus ===\nCSE 332: Data Structures\n3"
+
+    normalized, _ = normalize_text(text)
+
+    assert normalized.count("CSE 332") == 1
+    assert normalized.endswith("=== Syllabus ===\nCSE 332: Data Structures\n3")
+
+
+def test_banners_are_stripped_only_at_page_edges_and_code_keeps_its_indentation():
+    filler = "\n".join(f"Paragraph {n} on attention." for n in range(4))
+    text = make_pages([
+        "arXiv:2107.07436v3 [cs.LG] 24 Mar 2022\nTransformers.",
+        f"{filler}\nAs shown in arXiv:1706.03762, attention works.\n{filler}",
+        f"{filler}\ndef relax(u, v):\n    if  dist[v] > dist[u] + w:\n\t\tdist[v] = dist[u] + w\n{filler}",
+    ])
+
+    normalized, _ = normalize_text(text)
+
+    assert "2107.07436" not in normalized
+    assert normalized.startswith("--- Page 1 ---\nTransformers.")
+    assert "As shown in arXiv:1706.03762, attention works." in normalized
+    assert "def relax(u, v):\n    if dist[v] > dist[u] + w:\n\t\tdist[v] = dist[u] + w" in normalized
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
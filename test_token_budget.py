@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test token estimation, budget enforcement and per-user cost accounting
+"""
+
+import io
+import json
+
+import pytest
+
+import app as ai_app
+import question_bank
+import summary_cache
+import token_budget
+from token_budget import estimate_tokens, output_token_budget, split_notes_to_budget
+
+
+class FakeBedrock:
+    """Stands in for the bedrock-runtime client and records every request body."""
+
+    def __init__(self, reply="A reply."):
+        self.reply = reply
+        self.requests = []
+
+    def invoke_model(self, **kwargs):
+        body = json.loads(kwargs["body"])
+        self.requests.append(body)
+        payload = {
+            "content": [{"type": "text", "text": self.reply}],
+            "usage": {"input_tokens": 1200, "output_tokens": 80},
+        }
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    fake = FakeBedrock()
+    monkeypatch.setattr(ai_app, "bedrock", fake)
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_DIR", str(tmp_path / "summary_cache"))
+    monkeypatch.setattr(ai_app, "bank", question_bank.QuestionBank(ai_app._refill_bank, bank_dir=str(tmp_path / "bank")))
+    monkeypatch.setattr(token_budget, "ledger", token_budget.UsageLedger())
+    ai_app.app.testing = True
+    with ai_app.app.test_client() as test_client:
+        test_client.fake_bedrock = fake
+        yield test_client
+    ai_app.bank.drain()
+
+
+def test_estimate_is_close_to_words():
+    """English prose estimates at roughly 1-1.5 tokens per word"""
+    text = "Dijkstra's algorithm finds shortest paths from a single source in a weighted graph. " * 50
+    words = len(text.split())
+
+    assert words <= estimate_tokens(text) <= words * 1.6
+
+
+def test_estimates_are_cached_without_keeping_the_text(monkeypatch):
+    """The estimate cache is keyed by length and digest, not by the notes string"""
+    monkeypatch.setattr(token_budget, "_estimates", token_budget.OrderedDict())
+    notes = "Heaps keep the smallest key at the root. " * 5000
+
+    assert estimate_tokens(notes) == estimate_tokens("".join(list(notes)))
+    assert len(token_budget._estimates) == 1
+    assert not any(isinstance(part, str) for key in token_budget._estimates for part in key)
+
+
+def test_split_keeps_document_headers_and_respects_budget():
+    notes = "\n".join(f"=== Doc {i} ===\n" + "word " * 300 for i in range(6))
+
+    chunks = split_notes_to_budget(notes, max_tokens=700)
+
+    assert len(chunks) == 3
+    assert all(chunk.startswith("=== Doc") for chunk in chunks)
+    assert all(estimate_tokens(chunk) <= 700 for chunk in chunks)
+
+
+def test_output_budget_scales_with_request():
+    assert output_token_budget("getFlashCards", count=5) < output_token_budget("getFlashCards", count=40)
+    assert output_token_budget("getSummary", input_tokens=100000) == token_budget.MAX_OUTPUT_TOKENS
+    assert output_token_budget("getSummary", input_tokens=10) == token_budget.MIN_OUTPUT_TOKENS
+
+
+def test_max_tokens_is_sized_and_usage_is_recorded_per_user(client):
+    response = client.post("/api", json={"action": "getQuestions", "notesContent": "Heaps are trees.",
+                                         "numQuestions": 3, "query": "heaps"},
+                           headers={"X-User-Id": "student-1"})
+
+    assert response.status_code == 200
+    assert client.fake_bedrock.requests[0]["max_tokens"] == output_token_budget("getQuestions", count=3)
+
+    usage = client.get("/api/usage?user=student-1").get_json()
+    assert usage["requests"] == 1
+    assert usage["input_tokens"] == 1200
+    assert usage["output_tokens"] == 80
+    assert usage["cost"] > 0
+
+
+def test_a_call_finishing_after_its_request_is_still_billed(monkeypatch):
+    monkeypatch.setattr(token_budget, "ledger", token_budget.UsageLedger())
+    token_budget.begin_request("student-2", "getSummary")
+    entry = token_budget.current_request()
+    token_budget.record_bedrock_call("claude-3-haiku", 900, 300, {"input_tokens": 1000, "output_tokens": 50})
+    token_budget.end_request()
+
+    # e.g. the hedged request that lost, finishing on a pool thread
+    token_budget.record_bedrock_call("claude-3-haiku", 900, 300, {"input_tokens": 1000, "output_tokens": 70},
+                                     entry=entry)
+
+    usage = token_budget.ledger.totals("student-2")
+    assert usage["requests"] == 1 and usage["bedrock_calls"] == 2
+    assert usage["output_tokens"] == 120
+
+
+def test_over_budget_notes_are_rejected_or_chunked(client, monkeypatch):
+    monkeypatch.setattr(token_budget, "MAX_INPUT_TOKENS", 500)
+    monkeypatch.setattr(token_budget, "CHUNK_INPUT_TOKENS", 400)
+    notes = "\n".join(f"=== Lecture {i} ===\nLecture {i} covers graphs.\n" + "graph " * 300 for i in range(3))
+
+    rejected = client.post("/api", json={"action": "checkAnswer", "notesContent": notes,
+                                         "question": "What is a graph?", "answer": "Nodes and edges"})
+    assert rejected.status_code == 413
+    assert client.fake_bedrock.requests == []
+
+    summary = client.post("/api", json={"action": "getSummary", "notesContent": notes, "query": "graphs"})
+    assert summary.status_code == 200
+    # One call per document-sized chunk plus one to combine the partial summaries
+    assert len(client.fake_bedrock.requests) == 4
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
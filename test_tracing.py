@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test per-stage tracing spans and the JSONL exporter
+"""
+
+import glob
+import io
+import json
+import os
+import threading
+
+import pytest
+
+import app as ai_app
+import summary_cache
+import tracing
+
+
+@pytest.fixture
+def trace_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(tracing, "TRACING", True)
+    monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+    return str(tmp_path)
+
+
+def test_spans_nest_carry_the_request_id_and_rotate(trace_dir, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_MAX_BYTES", 2000)
+    request_id = tracing.start_trace("req-1")
+
+    for _ in range(10):
+        with tracing.span("outer", bytes=10) as outer:
+            with tracing.span("inner"):
+                pass
+            outer.set(items=3)
+
+    def worker():
+        tracing.start_trace("req-2")
+        with tracing.span("thread"):
+            pass
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    spans = list(tracing.read_spans(trace_dir))
+    assert len(glob.glob(os.path.join(trace_dir, "spans-*.jsonl*"))) > 1  # rotated
+    assert len(spans) == 21
+    inner = [s for s in spans if s["name"] == "inner"]
+    outer = {s["span_id"]: s for s in spans if s["name"] == "outer"}
+    assert all(s["parent_id"] in outer and s["request_id"] == request_id for s in inner)
+    assert next(iter(outer.values()))["attrs"] == {"bytes": 10, "items": 3}
+    assert [s["request_id"] for s in spans if s["name"] == "thread"] == ["req-2"]
+
+    breakdown = tracing.stage_breakdown(spans, request_id)
+    assert breakdown["outer"]["count"] == 10 and "thread" not in breakdown
+    assert breakdown["outer"]["self_ms"] <= breakdown["outer"]["total_ms"]
+
+
+def test_request_stages_are_traced_end_to_end(trace_dir, monkeypatch, tmp_path):
+    class FakeBedrock:
+        def invoke_model(self, **kwargs):
+            payload = {"content": [{"type": "text", "text": "heap\ntree"}], "usage": {"output_tokens": 2}}
+            return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    monkeypatch.setattr(ai_app, "bedrock", FakeBedrock())
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_DIR", str(tmp_path / "summary_cache"))
+
+    with ai_app.app.test_client() as client:
+        response = client.post("/api", json={"action": "getKeywords", "prompt": "heaps"},
+                               headers={"X-Request-ID": "from-next"})
+        untagged = client.post("/api", json={"action": "getKeywords", "prompt": "trees"})
+
+    assert response.headers["X-Request-ID"] == "from-next"
+    assert len(untagged.headers["X-Request-ID"]) == 32
+
+    spans = {s["name"]: s for s in tracing.read_spans(trace_dir) if s["request_id"] == "from-next"}
+    assert set(spans) == {"request", "parse_body", "bedrock", "encode_response"}
+    assert spans["request"]["attrs"]["action"] == "getKeywords"
+    assert spans["request"]["attrs"]["status"] == 200
+    assert spans["bedrock"]["parent_id"] == spans["request"]["span_id"]
+    assert spans["bedrock"]["attrs"]["output_tokens"] == 2
+    assert spans["encode_response"]["attrs"]["bytes"] > 0
+
+
+def test_spans_are_not_written_when_tracing_is_off(monkeypatch, tmp_path):
+    monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+    monkeypatch.setattr(tracing, "TRACING", False)
+
+    with tracing.span("quiet") as quiet:
+        quiet.set(bytes=1)
+
+    assert list(tracing.read_spans(str(tmp_path))) == []
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,200 @@
+"""
+Post-extraction text normalization.
+
+Extracted PDF text repeats running headers, footers, page numbers and arXiv
+banners at the edges of its '--- Page N ---' blocks, and line-wrapped words
+come out hyphenated. All of that is billed as input tokens when the notes are sent to
+Bedrock. normalize_text removes it in a constant number of linear passes and
+reports how much was saved.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from token_budget import estimate_tokens
+
+PAGE_MARKER = re.compile(r"^--- Page \d+ ---$")
+DOCUMENT_HEADER = re.compile(r"^=== .* ===$")
+PAGE_NUMBER_LINE = re.compile(r"^(?:page\s*)?\d{1,4}(?:\s*(?:of|/)\s*\d{1,4})?$", re.IGNORECASE)
+ARXIV_BANNER = re.compile(r"arXiv:\d{4}\.\d{4,5}(?:v\d+)?(?:\s*\[[\w.\-]+\])?(?:\s+\d{1,2}\s+\w{3,9}\s+\d{4})?")
+HORIZONTAL_WHITESPACE = re.compile(r"[ \t \f\v]+")
+DIGITS = re.compile(r"\d+")
+WORD = re.compile(r"[^\W\d_]+")
+
+# Running headers and footers live in the first/last few lines of a page. An
+# edge line counts as boilerplate when it shows up at the edge of at least this
+# share of a document's pages (and of at least MIN_REPEAT_PAGES of them).
+PAGE_EDGE_LINES = 3
+REPEAT_THRESHOLD = 0.25
+MIN_REPEAT_PAGES = 3
+MAX_BOILERPLATE_LINE = 120
+
+
+def _line_key(line: str) -> str:
+    """Key used to spot repeats: case-folded, with numbers masked ('Page 3' == 'Page 4')."""
+    return DIGITS.sub("#", line.strip().lower())
+
+
+def _clean_line(line: str) -> str:
+    """Collapse whitespace runs and drop trailing whitespace, keeping the indentation (code)."""
+    content = line.lstrip()
+    if not content:
+        return ""
+    return line[:len(line) - len(content)] + HORIZONTAL_WHITESPACE.sub(" ", content.rstrip())
+
+
+def _split_pages(lines: List[str]) -> List[Tuple[str, List[str]]]:
+    """Split one document's lines into (marker, body lines) per '--- Page N ---' block."""
+    pages = [("", [])]
+    for line in lines:
+        if PAGE_MARKER.match(line.strip()):
+            pages.append((line.strip(), []))
+        else:
+            pages[-1][1].append(line)
+    if not pages[0][1]:
+        pages.pop(0)
+    return pages
+
+
+def _dehyphenate(lines: List[str], vocabulary: Set[str]) -> List[str]:
+    """
+    Repair words split across lines.
+
+    'exam-' + 'ple' becomes 'example' when 'example' occurs elsewhere in the
+    text; otherwise the hyphen is kept ('golden-' + 'haired' -> 'golden-haired')
+    so real compounds survive. Either way the line break is removed.
+    """
+    joined = []
+    for line in lines:
+        if (joined and joined[-1].endswith("-") and len(joined[-1]) > 1
+                and joined[-1][-2].isalpha() and line[:1].islower()):
+            head, _, rest = line.partition(" ")
+            prefix = joined[-1][:-1]
+            head_word = WORD.match(head)
+            fragment = WORD.findall(prefix)[-1] + head_word.group(0) if head_word else ""
+            if fragment.lower() in vocabulary:
+                joined[-1] = prefix + head
+            else:
+                joined[-1] = prefix + "-" + head
+            if rest:
+                joined.append(rest)
+        else:
+            joined.append(line)
+    return joined
+
+
+def _edge_lines(body: List[str]) -> List[int]:
+    """Indices of the first and last PAGE_EDGE_LINES non-empty lines of a page."""
+    content = [i for i, line in enumerate(body) if line]
+    return sorted(set(content[:PAGE_EDGE_LINES] + content[-PAGE_EDGE_LINES:]))
+
+
+def _page_number_offset(line: str, marker: str) -> Optional[int]:
+    """
+    For a bare number line on a page, the printed number minus the page index
+    (None for other lines). A printed page number keeps the same offset from
+    page to page; a year or other number at a page edge does not.
+    """
+    if not marker or not PAGE_NUMBER_LINE.match(line.strip()):
+        return None
+    return int(DIGITS.search(line).group(0)) - int(DIGITS.search(marker).group(0))
+
+
+def _normalize_document(lines: List[str], vocabulary: Set[str], stats: Dict[str, int]) -> List[str]:
+    pages = [(marker, body, _edge_lines(body) if marker else []) for marker, body in _split_pages(lines)]
+    page_count = sum(1 for marker, _, _ in pages if marker)
+    min_pages = max(MIN_REPEAT_PAGES, int(page_count * REPEAT_THRESHOLD))
+
+    # Bare numbers are matched by their offset from the page index instead,
+    # since their masked keys are all alike
+    repeated = set()
+    page_number_offsets = {0}  # a number equal to the page index is always a page number
+    if page_count >= MIN_REPEAT_PAGES:
+        seen_on_pages = Counter()
+        offsets_on_pages = Counter()
+        for marker, body, edges in pages:
+            seen_on_pages.update({_line_key(body[i]) for i in edges
+                                  if len(body[i]) <= MAX_BOILERPLATE_LINE and not PAGE_NUMBER_LINE.match(body[i].strip())})
+            offsets_on_pages.update({_page_number_offset(body[i], marker) for i in edges} - {None})
+        repeated = {key for key, count in seen_on_pages.items() if count >= min_pages}
+        page_number_offsets |= {offset for offset, count in offsets_on_pages.items() if count >= min_pages}
+
+    output = []
+    for marker, body, edges in pages:
+        edges = set(edges)
+        kept = []
+        for i, line in enumerate(body):
+            if i in edges:
+                if _line_key(line) in repeated or _page_number_offset(line, marker) in page_number_offsets:
+                    stats["boilerplate_lines"] += 1
+                    continue
+                # arXiv banners are only stripped from page edges: in the body
+                # the same identifier is a citation
+                without_banner = _clean_line(ARXIV_BANNER.sub("", line))
+                if without_banner != line:
+                    if not without_banner:
+                        stats["boilerplate_lines"] += 1
+                        continue
+                    line = without_banner
+            kept.append(line)
+        if marker and not any(kept):
+            continue  # nothing left on the page; drop its marker too
+        if marker:
+            output.append(marker)
+        output.extend(_dehyphenate(kept, vocabulary))
+    return output
+
+
+def normalize_text(text: str) -> Tuple[str, Dict[str, int]]:
+    """
+    Strip boilerplate from extracted text.
+
+    Removes lines repeated across most pages of a document (running headers
+    and footers), page numbers (bare numbers at a page edge that match the
+    page index, or keep one offset from it across pages), arXiv banners at
+    page edges, hyphenation line breaks, whitespace runs (leading indentation
+    is kept) and the markers of pages left empty. Documents separated by
+    '=== Title ===' headers are handled independently.
+
+    Args:
+        text: Extracted text, optionally with '--- Page N ---' markers
+
+    Returns:
+        (normalized text, report) where the report has chars_before,
+        chars_after, chars_saved, tokens_before, tokens_after, tokens_saved
+        (estimated, see token_budget) and boilerplate_lines
+    """
+    stats = {"boilerplate_lines": 0}
+
+    documents = [[]]
+    for raw_line in text.splitlines():
+        line = _clean_line(raw_line)
+        if DOCUMENT_HEADER.match(line.strip()):
+            documents.append([line.strip()])
+        else:
+            documents[-1].append(line)
+
+    vocabulary = {word.lower() for word in WORD.findall(text)}
+
+    lines = []
+    for document in documents:
+        if document and DOCUMENT_HEADER.match(document[0]):
+            lines.append(document[0])
+            document = document[1:]
+        lines.extend(_normalize_document(document, vocabulary, stats))
+
+    # Collapse runs of blank lines left behind by the removals
+    compacted = []
+    for line in lines:
+        if line or (compacted and compacted[-1]):
+            compacted.append(line)
+    normalized = "\n".join(compacted).strip("\n")
+
+    stats["chars_before"] = len(text)
+    stats["chars_after"] = len(normalized)
+    stats["chars_saved"] = len(text) - len(normalized)
+    stats["tokens_before"] = estimate_tokens(text)
+    stats["tokens_after"] = estimate_tokens(normalized)
+    stats["tokens_saved"] = stats["tokens_before"] - stats["tokens_after"]
+    return normalized, stats
@@ -0,0 +1,324 @@
+"""
+Local token estimation, budget enforcement and cost accounting for Bedrock calls.
+
+estimate_tokens approximates the Claude tokenizer without a network round
+trip: text is split into word/number/punctuation pieces and each distinct
+piece's cost is cached, so re-estimating large notes is mostly dictionary
+lookups. Whole-text estimates are cached by length and digest, so the cache
+does not keep a request's notes alive after it ends. It is deliberately a
+slight over-estimate; the usage ledger records estimated next to actual token
+counts so the error stays visible.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Input budget per Bedrock call. Claude 3 models accept 200k tokens; leave
+# room for the system prompt, instructions and the reply.
+MAX_INPUT_TOKENS = int(os.environ.get("MAX_INPUT_TOKENS", "150000"))
+# Size of each piece when over-budget notes are split and processed in chunks
+CHUNK_INPUT_TOKENS = int(os.environ.get("CHUNK_INPUT_TOKENS", "60000"))
+MAX_OUTPUT_TOKENS = int(os.environ.get("MAX_OUTPUT_TOKENS", "4096"))
+MIN_OUTPUT_TOKENS = 256
+# Expected reply tokens per item for actions that produce a list of items
+PER_ITEM_OUTPUT_TOKENS = {"getQuestions": 150, "getFlashCards": 50, "checkAnswers": 250}
+
+# USD per 1,000 tokens (input, output), matched by substring of the model ID
+MODEL_PRICING = {
+    "claude-3-haiku": (0.00025, 0.00125),
+    "claude-3-5-haiku": (0.0008, 0.004),
+    "claude-3-sonnet": (0.003, 0.015),
+    "claude-3-5-sonnet": (0.003, 0.015),
+    "claude-3-7-sonnet": (0.003, 0.015),
+    "claude-3-opus": (0.015, 0.075),
+}
+
+USAGE_LOG = os.environ.get("TOKEN_USAGE_LOG", "")
+
+_PIECES = re.compile(r"[^\W\d_]+|\d+|[^\w\s]+|\s+")
+
+
+class InputTooLargeError(Exception):
+    """Raised when notes exceed the input token budget and cannot be chunked."""
+
+    def __init__(self, estimated_tokens: int, budget: int):
+        self.estimated_tokens = estimated_tokens
+        self.budget = budget
+        super().__init__(
+            f"Input is too large: about {estimated_tokens} tokens, the limit is {budget}. "
+            "Select fewer documents or a narrower topic."
+        )
+
+
+# --- Token Estimation ---
+
+@lru_cache(maxsize=65536)
+def _piece_tokens(piece: str) -> int:
+    if piece.isspace():
+        # Single spaces merge into the next word; newline runs cost about one token
+        return 0 if piece == " " else 1
+    if piece.isascii():
+        if piece.isalpha():
+            return 1 if len(piece) <= 10 else math.ceil(len(piece) / 5)
+        if piece.isdigit():
+            return math.ceil(len(piece) / 3)
+        return math.ceil(len(piece) / 2)
+    # Accented and non-Latin text tokenizes much less efficiently
+    return math.ceil(len(piece.encode("utf-8")) / 2)
+
+
+_estimates: "OrderedDict[tuple, int]" = OrderedDict()
+_estimates_lock = threading.Lock()
+ESTIMATE_CACHE_SIZE = 64
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Claude token count of a string."""
+    if not text:
+        return 0
+    key = (len(text), hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest())
+    with _estimates_lock:
+        tokens = _estimates.get(key)
+        if tokens is not None:
+            _estimates.move_to_end(key)
+            return tokens
+    tokens = sum(_piece_tokens(piece) for piece in _PIECES.findall(text))
+    with _estimates_lock:
+        _estimates[key] = tokens
+        while len(_estimates) > ESTIMATE_CACHE_SIZE:
+            _estimates.popitem(last=False)
+    return tokens
+
+
+def _content_tokens(content) -> int:
+    # Content is a string or chunk_store.StoredNotes, which sums cached per-chunk estimates
+    return estimate_tokens(content) if isinstance(content, str) else content.estimated_tokens
+
+
+def estimate_message_tokens(messages: List[Dict], system: str = "") -> int:
+    """Approximate input tokens of a Bedrock messages payload."""
+    # A few tokens of framing per message on top of the content itself
+    return estimate_tokens(system) + sum(_content_tokens(m.get("content", "")) + 4 for m in messages)
+
+
+# --- Budgets ---
+
+def output_token_budget(action: str, input_tokens: int = 0, count: Optional[int] = None) -> int:
+    """
+    Size max_tokens to what the action is expected to produce.
+
+    Summaries are asked to be about 30% of the notes; question and flashcard
+    sets and graded answer batches scale with the number of items.
+    """
+    count = max(1, int(count or 1))
+    if action == "getSummary":
+        wanted = int(input_tokens * 0.3 * 1.2)
+    elif action in PER_ITEM_OUTPUT_TOKENS:
+        wanted = count * PER_ITEM_OUTPUT_TOKENS[action] + 100
+    elif action == "checkAnswer":
+        wanted = 700
+    elif action == "getKeywords":
+        wanted = 500
+    else:
+        wanted = 2048
+    return max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, wanted))
+
+
+def batch_capacity(action: str) -> int:
+    """How many items of a per-item action fit in one reply of MAX_OUTPUT_TOKENS."""
+    return max(1, (MAX_OUTPUT_TOKENS - 100) // PER_ITEM_OUTPUT_TOKENS[action])
+
+
+def _split_to_budget(text: str, max_tokens: int, separators: List[str]) -> List[str]:
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    if not separators:
+        # No natural boundary left: cut by characters (about 3.5 per token)
+        step = max(1, int(max_tokens * 3.5))
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    separator, rest = separators[0], separators[1:]
+    # Keep each separator with the part it introduces so headers survive the split
+    parts = text.split(separator)
+    parts = parts[:1] + [separator + part for part in parts[1:]]
+    chunks, current, current_tokens = [], [], 0
+    for part in parts:
+        part_tokens = estimate_tokens(part)
+        if part_tokens > max_tokens:
+            if current:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_to_budget(part, max_tokens, rest))
+            continue
+        if current and current_tokens + part_tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += part_tokens
+    if current:
+        chunks.append("".join(current))
+    return [chunk.strip("\n") for chunk in chunks if chunk.strip()]
+
+
+def split_notes_to_budget(notes_content: str, max_tokens: Optional[int] = None) -> List[str]:
+    """
+    Split notes into chunks of at most max_tokens (default CHUNK_INPUT_TOKENS),
+    preferring document ('=== Title ==='), then page, then paragraph boundaries.
+    """
+    return _split_to_budget(notes_content, max_tokens or CHUNK_INPUT_TOKENS, ["\n=== ", "\n--- Page ", "\n\n", "\n"])
+
+
+# --- Cost Accounting ---
+
+def model_pricing(model_id: str):
+    """(input, output) USD per 1,000 tokens for a model ID, (0, 0) if unknown."""
+    for name, price in sorted(MODEL_PRICING.items(), key=lambda item: -len(item[0])):
+        if name in model_id:
+            return price
+    return (0.0, 0.0)
+
+
+def token_cost(model_id: str, input_tokens: int, output_tokens: int) -> float:
+    input_price, output_price = model_pricing(model_id)
+    return input_tokens / 1000 * input_price + output_tokens / 1000 * output_price
+
+
+class UsageLedger:
+    """Thread-safe running totals of token usage and cost, overall and per user."""
+
+    def __init__(self, log_path: str = ""):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._users: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def _empty_totals() -> Dict[str, float]:
+        return {
+            "requests": 0,
+            "bedrock_calls": 0,
+            "estimated_input_tokens": 0,
+            "estimated_cost": 0.0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cost": 0.0,
+        }
+
+    def record(self, entry: Dict):
+        """Add one finished request (see begin_request), or a late call to one, to the totals."""
+        with self._lock:
+            totals = self._users.setdefault(entry["user"], self._empty_totals())
+            totals["requests"] += 0 if entry.get("late") else 1
+            for call in entry["calls"]:
+                totals["bedrock_calls"] += 1
+                totals["estimated_input_tokens"] += call["estimated_input_tokens"]
+                totals["estimated_cost"] += call["estimated_cost"]
+                totals["input_tokens"] += call["input_tokens"]
+                totals["output_tokens"] += call["output_tokens"]
+                totals["cost"] += call["cost"]
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    def totals(self, user: Optional[str] = None) -> Dict:
+        with self._lock:
+            if user is not None:
+                return dict(self._users.get(user, self._empty_totals()))
+            overall = self._empty_totals()
+            for totals in self._users.values():
+                for key, value in totals.items():
+                    overall[key] += value
+            return {"overall": overall, "users": {u: dict(t) for u, t in self._users.items()}}
+
+
+ledger = UsageLedger(USAGE_LOG)
+_current_request: ContextVar[Optional[Dict]] = ContextVar("token_usage_request", default=None)
+# Guards an entry's calls against a late call landing while end_request records it
+_entry_lock = threading.Lock()
+
+
+def begin_request(user: str, action: str):
+    """Start collecting Bedrock usage for the current request."""
+    _current_request.set({
+        "timestamp": time.time(),
+        "user": user or "anonymous",
+        "action": action,
+        "calls": [],
+    })
+
+
+def current_request() -> Optional[Dict]:
+    """The current request's entry, for recording calls that finish on another thread."""
+    return _current_request.get()
+
+
+def record_bedrock_call(model_id: str, estimated_input_tokens: int, max_tokens: int, usage: Optional[Dict],
+                        entry: Optional[Dict] = None):
+    """
+    Attach one Bedrock call to the current request (or to entry, from
+    current_request, for a call that finished elsewhere).
+
+    usage is the "usage" object from the Bedrock response; when it is missing
+    the estimates stand in for the actual counts. A call that finishes after
+    its request was recorded (a losing hedged request) goes in the ledger on
+    its own, under the same user and action.
+    """
+    entry = entry if entry is not None else _current_request.get()
+    if entry is None:
+        return
+    usage = usage or {}
+    input_tokens = usage.get("input_tokens", estimated_input_tokens)
+    output_tokens = usage.get("output_tokens", 0)
+    call = {
+        "model": model_id,
+        "estimated_input_tokens": estimated_input_tokens,
+        "max_tokens": max_tokens,
+        "estimated_cost": token_cost(model_id, estimated_input_tokens, max_tokens),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost": token_cost(model_id, input_tokens, output_tokens),
+    }
+    with _entry_lock:
+        late = entry.get("recorded", False)
+        if not late:
+            entry["calls"].append(call)
+    if late:
+        ledger.record({"timestamp": time.time(), "user": entry["user"], "action": entry["action"],
+                       "late": True, "calls": [call]})
+
+
+def detach_request() -> Optional[Dict]:
+    """
+    Take the current request's entry out of this context without recording it,
+    to be resumed with attach_request where the work continues (a streamed
+    response body runs after the request's teardown).
+    """
+    entry = _current_request.get()
+    _current_request.set(None)
+    return entry
+
+
+def attach_request(entry: Optional[Dict]):
+    """Continue collecting usage for an entry returned by detach_request."""
+    _current_request.set(entry)
+
+
+def end_request() -> Optional[Dict]:
+    """Finish the current request and add it to the ledger. Returns its entry."""
+    entry = _current_request.get()
+    _current_request.set(None)
+    if entry is None:
+        return None
+    with _entry_lock:
+        entry["recorded"] = True
+    if entry["calls"]:
+        ledger.record(entry)
+    return entry
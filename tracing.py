@@ -0,0 +1,251 @@
+"""
+Lightweight per-stage tracing with a local JSONL exporter.
+
+A request gets an ID (the caller's X-Request-ID, or TRACE_REQUEST_ID for the
+extractor CLI, or a new one) that every span recorded while serving it
+carries, including spans on worker threads started with a copied context.
+Spans nest: each records its parent, its duration and attributes such as
+sizes, so a slow request can be broken down into body parsing, section
+scans, Bedrock calls, extraction and response encoding.
+
+Set TRACING=true to export spans. Each process appends one JSON object per
+span to its own file under TRACE_DIR (spans-<pid>.jsonl, rotated at
+TRACE_MAX_BYTES), so pre-forked workers never interleave or rotate each
+other's files. When tracing is off, span() costs about a context manager and
+request IDs still flow.
+
+Per-stage breakdown of everything recorded:
+    python3 tracing.py [--request ID] [trace_dir]
+"""
+
+import argparse
+import contextvars
+import functools
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from logging.handlers import RotatingFileHandler
+from typing import Dict, Iterator, List, Optional
+
+TRACING = os.environ.get("TRACING", "false").lower() == "true"
+TRACE_DIR = os.environ.get(
+    "TRACE_DIR",
+    os.path.join(os.path.expanduser("~"), "Documents", ".ai_helper", "traces"),
+)
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = 5
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_request_id", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("trace_span", default=None)
+
+_exporter_lock = threading.Lock()
+_exporter: Optional[logging.Logger] = None
+_exporter_key = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def start_trace(request_id: Optional[str] = None) -> str:
+    """Begin a trace for the current request (in this context). Returns its request ID."""
+    request_id = request_id or new_request_id()
+    _request_id.set(request_id)
+    _current_span.set(None)
+    return request_id
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def _export(record: Dict):
+    global _exporter, _exporter_key
+    path = os.path.join(TRACE_DIR, f"spans-{os.getpid()}.jsonl")
+    with _exporter_lock:
+        # (Re)open after a fork or a change of TRACE_DIR
+        if _exporter_key != path:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT,
+                                          encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger(f"tracing.{os.getpid()}")
+            logger.handlers = [handler]
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            _exporter, _exporter_key = logger, path
+        _exporter.info(json.dumps(record, default=str))
+
+
+class Span:
+    """One timed stage. Use as a context manager, or open()/close() across hooks."""
+
+    __slots__ = ("name", "attrs", "span_id", "parent_id", "request_id", "_start", "_started_at", "_token")
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self._token = None
+
+    def set(self, **attrs):
+        """Add attributes (sizes, counts, ...) to the span."""
+        self.attrs.update(attrs)
+
+    def open(self) -> "Span":
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.request_id = _request_id.get()
+        self._token = _current_span.set(self)
+        self._started_at = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def close(self, error: Optional[BaseException] = None):
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:  # closed from another context (e.g. a teardown hook)
+                _current_span.set(None)
+            self._token = None
+        record = {
+            "request_id": self.request_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self._started_at, 6),
+            "duration_ms": round(duration_ms, 3),
+            "attrs": self.attrs,
+        }
+        if error is not None:
+            record["error"] = type(error).__name__
+        try:
+            _export(record)
+        except OSError as e:
+            print(f"⚠️ Could not write trace span: {e}")
+
+    def __enter__(self) -> "Span":
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(exc)
+
+
+class _NoopSpan:
+    """Stand-in for Span while tracing is off."""
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def open(self):
+        return self
+
+    def close(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """A span for a stage: `with span("bedrock", model=...) as s: ...; s.set(output_tokens=...)`."""
+    return Span(name, attrs) if TRACING else _NOOP
+
+
+def traced(name: Optional[str] = None):
+    """Decorator that records a span around every call of the function."""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACING:
+                return fn(*args, **kwargs)
+            with Span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Aggregation ---
+
+def read_spans(trace_dir: Optional[str] = None) -> Iterator[Dict]:
+    """Every span exported under trace_dir, including rotated files."""
+    for path in sorted(glob.glob(os.path.join(trace_dir or TRACE_DIR, "spans-*.jsonl*"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))]
+
+
+def stage_breakdown(spans: Iterator[Dict], request_id: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Per-stage statistics: for each span name, the count and the total, mean,
+    p50, p95 and max duration in milliseconds, plus its self time (duration
+    minus that of its child spans).
+    """
+    spans = [s for s in spans if request_id is None or s.get("request_id") == request_id]
+    child_ms: Dict[str, float] = {}
+    for s in spans:
+        if s.get("parent_id"):
+            child_ms[s["parent_id"]] = child_ms.get(s["parent_id"], 0.0) + s["duration_ms"]
+
+    stages: Dict[str, List] = {}
+    for s in spans:
+        durations, self_times = stages.setdefault(s["name"], ([], []))
+        durations.append(s["duration_ms"])
+        self_times.append(max(0.0, s["duration_ms"] - child_ms.get(s["span_id"], 0.0)))
+
+    breakdown = {}
+    for name, (durations, self_times) in stages.items():
+        durations.sort()
+        breakdown[name] = {
+            "count": len(durations),
+            "total_ms": round(sum(durations), 3),
+            "self_ms": round(sum(self_times), 3),
+            "mean_ms": round(sum(durations) / len(durations), 3),
+            "p50_ms": round(_percentile(durations, 50), 3),
+            "p95_ms": round(_percentile(durations, 95), 3),
+            "max_ms": round(durations[-1], 3),
+        }
+    return dict(sorted(breakdown.items(), key=lambda item: -item[1]["self_ms"]))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Per-stage breakdown of recorded trace spans")
+    parser.add_argument("trace_dir", nargs="?", default=None, help=f"directory of span files (default {TRACE_DIR})")
+    parser.add_argument("--request", help="only the spans of this request ID")
+    args = parser.parse_args(argv)
+
+    breakdown = stage_breakdown(read_spans(args.trace_dir), args.request)
+    if not breakdown:
+        print("No spans recorded (set TRACING=true to record them).")
+        return 1
+    print(f"{'stage':<28} {'count':>7} {'self ms':>11} {'total ms':>11} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9}")
+    for name, s in breakdown.items():
+        print(f"{name:<28} {s['count']:>7} {s['self_ms']:>11.1f} {s['total_ms']:>11.1f} "
+              f"{s['mean_ms']:>9.2f} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['max_ms']:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())